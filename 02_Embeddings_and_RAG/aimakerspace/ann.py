@@ -0,0 +1,250 @@
+import copy
+import time
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+
+def _assign(
+    vectors: np.ndarray, centroids: np.ndarray, spherical: bool = True, chunk_size: int = 65536
+) -> np.ndarray:
+    """Assigns each row to its most similar centroid, in chunks to bound memory."""
+    # argmin ||x - c||^2 == argmax (x.c - ||c||^2 / 2); the bias is zero for unit centroids.
+    bias = 0.0 if spherical else 0.5 * np.einsum("ij,ij->i", centroids, centroids)
+    assignments = np.empty(vectors.shape[0], dtype=np.int64)
+    for start in range(0, vectors.shape[0], chunk_size):
+        block = vectors[start : start + chunk_size]
+        assignments[start : start + chunk_size] = np.argmax(block @ centroids.T - bias, axis=1)
+    return assignments
+
+
+def kmeans(
+    vectors: np.ndarray, n_clusters: int, n_iter: int = 20, seed: int = 0, spherical: bool = True
+) -> np.ndarray:
+    """
+    Lloyd's k-means; spherical (cosine) by default, Euclidean otherwise.
+
+    :param vectors: (n, dim) float32 array (L2-normalized when ``spherical``)
+    :param n_clusters: Number of centroids to learn
+    :param n_iter: Number of Lloyd iterations
+    :param seed: Seed for centroid initialization
+    :param spherical: Normalize centroids to unit length after each update
+    :return: (n_clusters, dim) array of centroids
+    """
+    rng = np.random.default_rng(seed)
+    n_clusters = min(n_clusters, vectors.shape[0])
+    centroids = vectors[rng.choice(vectors.shape[0], n_clusters, replace=False)].astype(np.float32)
+
+    for _ in range(n_iter):
+        assignments = _assign(vectors, centroids, spherical)
+        order = np.argsort(assignments, kind="stable")
+        sorted_assignments = assignments[order]
+        present, starts, counts = np.unique(sorted_assignments, return_index=True, return_counts=True)
+        sums = np.add.reduceat(vectors[order], starts, axis=0)
+
+        updated = centroids.copy()
+        updated[present] = sums if spherical else sums / counts[:, None]
+        empty = np.setdiff1d(np.arange(n_clusters), present)
+        if empty.size:
+            # Re-seed empty clusters from random points so every list stays usable.
+            updated[empty] = vectors[rng.choice(vectors.shape[0], empty.size, replace=False)]
+        if spherical:
+            norms = np.linalg.norm(updated, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            updated = updated / norms
+        centroids = updated.astype(np.float32)
+
+    return centroids
+
+
+class IVFIndex:
+    def __init__(
+        self,
+        n_lists: int = 256,
+        nprobe: int = 8,
+        n_iter: int = 20,
+        max_train_size: Optional[int] = None,
+        seed: int = 0,
+    ):
+        """
+        Inverted-file index: rows are bucketed by their nearest k-means centroid and
+        a query only scans the ``nprobe`` buckets whose centroids score highest.
+
+        The index stores row ids only; vectors are read from the matrix owned by
+        the VectorDatabase. Raising ``nprobe`` improves recall at the cost of latency.
+
+        :param n_lists: Number of centroids / inverted lists
+        :param nprobe: Default number of lists scanned per query
+        :param n_iter: k-means iterations used by ``train``
+        :param max_train_size: Rows sampled for training (default: 64 per list)
+        :param seed: Seed for sampling and centroid initialization
+        """
+        self.n_lists = n_lists
+        self.nprobe = nprobe
+        self.n_iter = n_iter
+        self.max_train_size = max_train_size or 64 * n_lists
+        self.seed = seed
+        self.centroids: Optional[np.ndarray] = None
+        self._assignments = np.empty(0, dtype=np.int64)
+        self._order: Optional[np.ndarray] = None
+        self._offsets: Optional[np.ndarray] = None
+        self._shares_assignments = False
+
+    def fork(self) -> "IVFIndex":
+        """A copy that shares this index's arrays until it is first modified."""
+        other = copy.copy(self)
+        other._shares_assignments = True
+        return other
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def train(self, vectors: np.ndarray) -> None:
+        """Learns centroids from (a sample of) normalized vectors."""
+        if vectors.shape[0] > self.max_train_size:
+            rng = np.random.default_rng(self.seed)
+            vectors = vectors[rng.choice(vectors.shape[0], self.max_train_size, replace=False)]
+        self.centroids = kmeans(vectors, self.n_lists, self.n_iter, self.seed)
+        self._assignments = np.empty(0, dtype=np.int64)
+        self._order = None
+
+    def config(self) -> Dict[str, object]:
+        return {
+            "n_lists": self.n_lists,
+            "nprobe": self.nprobe,
+            "n_iter": self.n_iter,
+            "max_train_size": self.max_train_size,
+            "seed": self.seed,
+        }
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        return {"centroids": self.centroids, "assignments": self._assignments}
+
+    def set_arrays(self, centroids: np.ndarray, assignments: np.ndarray) -> None:
+        self.centroids = centroids
+        self._assignments = assignments
+        self._order = None
+
+    def add(self, rows: np.ndarray, vectors: np.ndarray) -> None:
+        """Assigns (or re-assigns) the given row ids to their nearest list."""
+        if not self.is_trained:
+            raise ValueError("IVFIndex must be trained before adding vectors")
+        rows = np.asarray(rows, dtype=np.int64)
+        if rows.size == 0:
+            return
+        needed = int(rows.max()) + 1
+        if needed > self._assignments.shape[0]:
+            grown = np.full(max(needed, 2 * self._assignments.shape[0]), -1, dtype=np.int64)
+            grown[: self._assignments.shape[0]] = self._assignments
+            self._assignments = grown
+        elif self._shares_assignments:
+            self._assignments = self._assignments.copy()
+        self._shares_assignments = False
+        self._assignments[rows] = _assign(vectors, self.centroids)
+        self._order = None
+
+    def compact(self, keep: np.ndarray) -> None:
+        """Renumbers rows after the database dropped every row not in ``keep``."""
+        assignments = np.full(keep.size, -1, dtype=np.int64)
+        known = keep < self._assignments.shape[0]
+        assignments[known] = self._assignments[keep[known]]
+        self._assignments = assignments
+        self._order = None
+
+    def _build_lists(self) -> None:
+        # Inverted lists are kept in CSR form and rebuilt lazily after inserts.
+        assigned = np.flatnonzero(self._assignments >= 0)
+        lists = self._assignments[assigned]
+        # A stable sort of 16-bit keys is a radix sort, linear in the number of rows.
+        keys = lists.astype(np.uint16) if self.centroids.shape[0] <= 2**16 else lists
+        order = np.argsort(keys, kind="stable")
+        # ``_order`` is assigned last: concurrent readers that see it also see matching offsets.
+        self._offsets = np.searchsorted(lists[order], np.arange(self.centroids.shape[0] + 1))
+        self._order = assigned[order]
+
+    def candidates(self, query: np.ndarray, nprobe: Optional[int] = None) -> np.ndarray:
+        """Returns the row ids stored in the ``nprobe`` lists closest to ``query``."""
+        if self._order is None:
+            self._build_lists()
+        nprobe = min(nprobe or self.nprobe, self.centroids.shape[0])
+        probed = np.argpartition(self.centroids @ query, -nprobe)[-nprobe:]
+        return np.concatenate([self._order[self._offsets[c] : self._offsets[c + 1]] for c in probed])
+
+    def search(
+        self, matrix: np.ndarray, query: np.ndarray, k: int, nprobe: Optional[int] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Approximate top-k search of a normalized query against ``matrix``.
+
+        :return: (row ids, scores), best first
+        """
+        rows = self.candidates(query, nprobe)
+        scores = matrix[rows] @ query
+        k = min(k, rows.shape[0])
+        if k == 0:
+            return rows, scores
+        best = np.argpartition(scores, -k)[-k:] if k < rows.shape[0] else np.arange(rows.shape[0])
+        best = best[np.argsort(scores[best])[::-1]]
+        return rows[best], scores[best]
+
+
+def recall_at_k(approximate: List[int], exact: List[int]) -> float:
+    """Fraction of the exact top-k that the approximate search also returned."""
+    if not exact:
+        return 1.0
+    return len(set(approximate) & set(exact)) / len(exact)
+
+
+def evaluate_recall(
+    index: IVFIndex,
+    matrix: np.ndarray,
+    queries: np.ndarray,
+    k: int = 10,
+    nprobe_values: Tuple[int, ...] = (1, 2, 4, 8, 16, 32),
+) -> List[Dict[str, float]]:
+    """
+    Measures recall@k and latency of ``index`` against a brute-force scan.
+
+    :param index: Trained index over the rows of ``matrix``
+    :param matrix: Normalized vectors the index was built from
+    :param queries: (n_queries, dim) normalized query vectors
+    :return: One dict per nprobe value with recall and mean latencies in milliseconds
+    """
+    start = time.perf_counter()
+    exact = []
+    for query in queries:
+        scores = matrix @ query
+        top = np.argpartition(scores, -k)[-k:]
+        exact.append(top.tolist())
+    exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    report = []
+    for nprobe in nprobe_values:
+        start = time.perf_counter()
+        approximate = [index.search(matrix, query, k, nprobe)[0].tolist() for query in queries]
+        elapsed_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        recall = float(np.mean([recall_at_k(a, e) for a, e in zip(approximate, exact)]))
+        report.append(
+            {
+                "nprobe": nprobe,
+                f"recall@{k}": recall,
+                "mean_latency_ms": elapsed_ms,
+                "exact_latency_ms": exact_ms,
+            }
+        )
+    return report
+
+
+if __name__ == "__main__":
+    from aimakerspace.vectordatabase import normalize_rows
+
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((200, 256))
+    data = normalize_rows(centers[rng.integers(0, 200, 100_000)] + 2.0 * rng.standard_normal((100_000, 256)))
+    queries = normalize_rows(centers[rng.integers(0, 200, 200)] + 2.0 * rng.standard_normal((200, 256)))
+
+    index = IVFIndex(n_lists=316)
+    index.train(data)
+    index.add(np.arange(data.shape[0]), data)
+    for row in evaluate_recall(index, data, queries, k=10):
+        print(row)
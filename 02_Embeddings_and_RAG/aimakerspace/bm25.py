@@ -0,0 +1,206 @@
+import copy
+import math
+import re
+from array import array
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"\w+(?:-\w+)*")
+MAX_TERM_FREQUENCY = 2**16 - 1
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased word tokens. Identifiers such as ``E1234`` stay one token, and a
+    hyphenated one such as ``gpt-4o`` is kept whole and also split into its
+    parts, so both ``gpt-4o`` and ``gpt`` match it.
+    """
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        tokens.append(token)
+        if "-" in token:
+            tokens.extend(token.split("-"))
+    return tokens
+
+
+class BM25Index:
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        """
+        In-process BM25 inverted index over the rows of a ``VectorDatabase``.
+
+        Each term's posting list is a pair of typed arrays, uint32 row ids and
+        uint16 term frequencies, so a posting costs 6 bytes instead of two Python
+        ints. Rows are appended in order; deleted rows stay in the statistics
+        until ``compact`` and are masked out at query time by the caller.
+
+        :param k1: Term-frequency saturation
+        :param b: Document-length normalization (0: none, 1: full)
+        """
+        self.k1 = k1
+        self.b = b
+        self.clear()
+
+    def clear(self) -> None:
+        self._vocabulary: Dict[str, int] = {}
+        self._rows: List[array] = []
+        self._frequencies: List[array] = []
+        self._lengths = array("I")
+        self._total_length = 0
+        # Term ids whose posting arrays this index may append to (None: all of them).
+        self._owned_terms: Optional[set] = None
+
+    def fork(self) -> "BM25Index":
+        """
+        A copy that shares this index's posting arrays and copies each one only
+        before adding to it, so forking costs the vocabulary and term tables,
+        not the postings. This index must not be modified afterwards.
+        """
+        other = copy.copy(self)
+        other._vocabulary = dict(self._vocabulary)
+        other._rows = list(self._rows)
+        other._frequencies = list(self._frequencies)
+        other._lengths = self._lengths[:]
+        other._owned_terms = set()
+        return other
+
+    @property
+    def n_rows(self) -> int:
+        return len(self._lengths)
+
+    @property
+    def n_terms(self) -> int:
+        return len(self._vocabulary)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the posting lists and document lengths."""
+        postings = sum(rows.itemsize * len(rows) for rows in self._rows)
+        postings += sum(frequencies.itemsize * len(frequencies) for frequencies in self._frequencies)
+        return postings + self._lengths.itemsize * len(self._lengths)
+
+    def add(self, first_row: int, texts: Sequence[str]) -> None:
+        """Indexes ``texts`` as rows ``first_row .. first_row + len(texts) - 1``."""
+        if first_row != self.n_rows:
+            raise ValueError(f"Rows must be added in order: expected row {self.n_rows}, got {first_row}")
+        for row, text in enumerate(texts, start=first_row):
+            counts = Counter(tokenize(text))
+            for term, count in counts.items():
+                term_id = self._vocabulary.get(term)
+                if term_id is None:
+                    term_id = self._vocabulary[term] = len(self._rows)
+                    self._rows.append(array("I"))
+                    self._frequencies.append(array("H"))
+                    if self._owned_terms is not None:
+                        self._owned_terms.add(term_id)
+                elif self._owned_terms is not None and term_id not in self._owned_terms:
+                    self._rows[term_id] = self._rows[term_id][:]
+                    self._frequencies[term_id] = self._frequencies[term_id][:]
+                    self._owned_terms.add(term_id)
+                self._rows[term_id].append(row)
+                self._frequencies[term_id].append(min(count, MAX_TERM_FREQUENCY))
+            length = sum(counts.values())
+            self._lengths.append(length)
+            self._total_length += length
+
+    def compact(self, keep: np.ndarray) -> None:
+        """Renumbers rows after the database dropped every row not in ``keep``."""
+        new_row = np.full(self.n_rows, -1, dtype=np.int64)
+        new_row[keep] = np.arange(keep.size)
+        for term_id, rows in enumerate(self._rows):
+            mapped = new_row[np.frombuffer(rows, dtype=np.uint32)]
+            kept = mapped >= 0
+            self._rows[term_id] = array("I", mapped[kept].astype(np.uint32).tobytes())
+            frequencies = np.frombuffer(self._frequencies[term_id], dtype=np.uint16)[kept]
+            self._frequencies[term_id] = array("H", frequencies.tobytes())
+        lengths = np.frombuffer(self._lengths, dtype=np.uint32)[keep]
+        self._lengths = array("I", lengths.tobytes())
+        self._total_length = int(lengths.sum())
+        self._owned_terms = None
+        # Terms that only occurred in dropped rows keep an empty posting list.
+
+    def idf(self, term: str) -> float:
+        term_id = self._vocabulary.get(term)
+        df = 0 if term_id is None else len(self._rows[term_id])
+        return math.log(1 + (self.n_rows - df + 0.5) / (df + 0.5))
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every row for ``query``; rows without a query term score 0."""
+        scores = np.zeros(self.n_rows, dtype=np.float32)
+        if not self.n_rows:
+            return scores
+        lengths = np.frombuffer(self._lengths, dtype=np.uint32)
+        average_length = max(self._total_length / self.n_rows, 1e-9)
+        for term in set(tokenize(query)):
+            term_id = self._vocabulary.get(term)
+            if term_id is None or not len(self._rows[term_id]):
+                continue
+            rows = np.frombuffer(self._rows[term_id], dtype=np.uint32)
+            frequencies = np.frombuffer(self._frequencies[term_id], dtype=np.uint16).astype(np.float32)
+            norm = self.k1 * (1 - self.b + self.b * lengths[rows] / average_length)
+            scores[rows] += self.idf(term) * frequencies * (self.k1 + 1) / (frequencies + norm)
+        return scores
+
+    def search(
+        self, query: str, k: int, mask: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-``k`` rows for ``query`` as ``(rows, scores)``, best first, restricted
+        to rows where ``mask`` is True. Rows matching no query term are never returned.
+        """
+        scores = self.scores(query)
+        if mask is not None:
+            scores[~mask[: self.n_rows]] = 0.0
+        matching = np.flatnonzero(scores > 0)
+        if matching.size > k:
+            matching = matching[np.argpartition(-scores[matching], k - 1)[:k]]
+        order = np.argsort(-scores[matching], kind="stable")
+        return matching[order], scores[matching[order]]
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[int]], k: int = 60, weights: Optional[Sequence[float]] = None
+) -> List[Tuple[int, float]]:
+    """
+    Fuses ranked lists of row ids: each list contributes ``weight / (k + rank)``
+    for every row it contains. Returns ``(row, fused score)`` pairs, best first.
+    """
+    weights = weights or [1.0] * len(rankings)
+    fused: Dict[int, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, row in enumerate(ranking, start=1):
+            fused[row] = fused.get(row, 0.0) + weight / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+def weighted_score_fusion(
+    results: Sequence[Tuple[Sequence[int], Sequence[float]]], weights: Sequence[float]
+) -> List[Tuple[int, float]]:
+    """
+    Fuses ``(rows, scores)`` lists by a weighted sum of min-max normalized
+    scores; a row missing from a list contributes 0 for it.
+    """
+    fused: Dict[int, float] = {}
+    for (rows, scores), weight in zip(results, weights):
+        if not len(rows):
+            continue
+        scores = np.asarray(scores, dtype=np.float64)
+        low, span = scores.min(), scores.max() - scores.min()
+        normalized = (scores - low) / span if span > 0 else np.ones_like(scores)
+        for row, score in zip(rows, normalized):
+            fused[int(row)] = fused.get(int(row), 0.0) + weight * float(score)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+if __name__ == "__main__":
+    from aimakerspace.text_utils import TextFileLoader, CharacterTextSplitter
+
+    loader = TextFileLoader("data/PMarcaBlogs.txt")
+    loader.load()
+    chunks = CharacterTextSplitter().split_texts(loader.documents)
+    index = BM25Index()
+    index.add(0, chunks)
+    print(f"{index.n_rows} chunks, {index.n_terms} terms, {index.nbytes / 1e3:.1f} kB of postings")
+    rows, scores = index.search("Michael Eisner weak executive", k=3)
+    for row, score in zip(rows, scores):
+        print(f"{score:.2f}", chunks[row][:100].replace("\n", " "))
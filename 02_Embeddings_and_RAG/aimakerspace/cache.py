@@ -0,0 +1,127 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+
+class LRUCache:
+    def __init__(
+        self,
+        maxsize: int = 10_000,
+        ttl: Optional[float] = None,
+        on_evict: Optional[Callable[[Hashable, Any], None]] = None,
+    ):
+        """
+        Thread-safe least-recently-used cache with an optional time-to-live.
+
+        :param maxsize: Maximum number of entries; the least recently used entry
+            is evicted first
+        :param ttl: Seconds after which an entry expires (None: never)
+        :param on_evict: Called with ``(key, value)`` for every entry dropped by
+            the size limit or found expired, after the cache lock is released
+        """
+        if maxsize <= 0:
+            raise ValueError("maxsize must be positive")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.on_evict = on_evict
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        dropped: List[Tuple[Hashable, Any]] = []
+        with self._lock:
+            present = self._live_entry(key, dropped) is not None
+        self._notify(dropped)
+        return present
+
+    def _live_entry(self, key: Hashable, dropped: List[Tuple[Hashable, Any]]) -> Optional[tuple]:
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] is not None and entry[1] < time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            dropped.append((key, entry[0]))
+            return None
+        return entry
+
+    def _notify(self, dropped: List[Tuple[Hashable, Any]]) -> None:
+        if self.on_evict is not None:
+            for key, value in dropped:
+                self.on_evict(key, value)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        dropped: List[Tuple[Hashable, Any]] = []
+        with self._lock:
+            entry = self._live_entry(key, dropped)
+            if entry is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        self._notify(dropped)
+        return default if entry is None else entry[0]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        expires_at = None if self.ttl is None else time.monotonic() + self.ttl
+        dropped: List[Tuple[Hashable, Any]] = []
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                dropped.append(self._entries.popitem(last=False))
+                self.evictions += 1
+        self._notify([(key, entry[0]) for key, entry in dropped])
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            return default if entry is None else entry[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class QueryCache:
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = 300.0, embedding_maxsize: Optional[int] = None):
+        """
+        Caches for repeated ``VectorDatabase.search_by_text`` queries: one for
+        query embeddings and one for top-k results.
+
+        Result keys include the database ``version``, so any upsert or delete
+        makes earlier results unreachable and they age out of the LRU. Embedding
+        keys only depend on the embedding model and the text, so a query that is
+        repeated after a write still skips the embedding call.
+
+        :param maxsize: Maximum number of cached result lists
+        :param ttl: Seconds after which an entry expires (None: never)
+        :param embedding_maxsize: Maximum number of cached query embeddings
+            (default: ``maxsize``)
+        """
+        self.embeddings = LRUCache(embedding_maxsize or maxsize, ttl)
+        self.results = LRUCache(maxsize, ttl)
+
+    def clear(self) -> None:
+        self.embeddings.clear()
+        self.results.clear()
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {"embeddings": self.embeddings.stats(), "results": self.results.stats()}
@@ -0,0 +1,246 @@
+import hashlib
+import threading
+import zlib
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+from aimakerspace.bm25 import tokenize
+from aimakerspace.openai_utils.batching import estimate_tokens
+
+# Multiplier for combining word hashes into a shingle hash (arithmetic wraps mod 2**64).
+_SHINGLE_PRIME = np.uint64(1099511628211)
+
+
+def _choose_bands(num_perm: int, threshold: float) -> int:
+    """
+    Number of LSH bands whose S-curve midpoint ``(1 / bands) ** (1 / rows)`` is
+    the highest one not above ``threshold``, so pairs at the threshold are
+    very likely to share a bucket.
+    """
+    best = num_perm
+    best_midpoint = 0.0
+    for bands in range(1, num_perm + 1):
+        if num_perm % bands:
+            continue
+        midpoint = (1.0 / bands) ** (bands / num_perm)
+        if best_midpoint < midpoint <= threshold:
+            best, best_midpoint = bands, midpoint
+    return best
+
+
+class NearDuplicateDetector:
+    def __init__(self, threshold: float = 0.85, num_perm: int = 128, shingle_size: int = 5, seed: int = 0):
+        """
+        Finds exact and near-duplicate texts before they are embedded.
+
+        Exact duplicates (identical after collapsing whitespace) are found with a
+        hash table. Near duplicates are found with MinHash signatures over word
+        shingles, bucketed by locality-sensitive hashing: candidates sharing a
+        band bucket are confirmed when their estimated Jaccard similarity is at
+        least ``threshold``. The first text seen is kept as the representative;
+        later duplicates are recorded as its aliases and should not be embedded.
+
+        :param threshold: Minimum estimated Jaccard similarity of word shingles
+        :param num_perm: MinHash permutations per signature
+        :param shingle_size: Words per shingle
+        :param seed: Seed of the MinHash permutations
+        """
+        if not 0.0 < threshold <= 1.0:
+            raise ValueError("threshold must be in (0, 1]")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.bands = _choose_bands(num_perm, threshold)
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 2**63, num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2**63, num_perm, dtype=np.uint64)
+        # Rows of unregistered representatives stay as None, so row numbers never change.
+        self._keys: List[Optional[str]] = []
+        self._signatures: List[Optional[np.ndarray]] = []
+        self._row_hashes: List[Optional[bytes]] = []
+        self._exact: Dict[bytes, int] = {}
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(self.bands)]
+        self._rows_by_key: Dict[str, int] = {}
+        self._hashes: Dict[str, bytes] = {}
+        self.aliases: Dict[str, List[str]] = {}
+        self.alias_of: Dict[str, str] = {}
+        self._promotions: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self.seen = 0
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+        self.tokens_saved = 0
+        self.text_bytes_saved = 0
+
+    def __len__(self) -> int:
+        """Number of representatives."""
+        return len(self._rows_by_key)
+
+    def signature(self, text: str) -> np.ndarray:
+        """MinHash signature (``num_perm`` uint64 values) of the text's word shingles."""
+        words = np.array([zlib.crc32(word.encode("utf-8")) for word in tokenize(text)], dtype=np.uint64)
+        if words.size == 0:
+            return np.full(self.num_perm, np.iinfo(np.uint64).max, dtype=np.uint64)
+        size = min(self.shingle_size, words.size)
+        shingles = words[: words.size - size + 1].copy()
+        for offset in range(1, size):
+            shingles = shingles * _SHINGLE_PRIME + words[offset : words.size - size + 1 + offset]
+        return (self._a[:, None] * shingles[None, :] + self._b[:, None]).min(axis=1)
+
+    @staticmethod
+    def similarity(signature_a: np.ndarray, signature_b: np.ndarray) -> float:
+        """Estimated Jaccard similarity of two signatures."""
+        return float(np.mean(signature_a == signature_b))
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [band.tobytes() for band in np.split(signature, self.bands)]
+
+    def _find(self, exact_key: bytes, signature: np.ndarray, band_keys: List[bytes]) -> Optional[int]:
+        row = self._exact.get(exact_key)
+        if row is not None:
+            return row
+        best, best_similarity = None, self.threshold
+        candidates = {row for buckets, key in zip(self._buckets, band_keys) for row in buckets.get(key, ())}
+        for row in candidates:
+            similarity = self.similarity(signature, self._signatures[row])
+            if similarity >= best_similarity:
+                best, best_similarity = row, similarity
+        return best
+
+    def add(self, key: str, text: str) -> Optional[str]:
+        """
+        Registers ``text`` under ``key``. Returns the representative's key when the
+        text duplicates one seen before (it is recorded as an alias and should be
+        skipped), or None when it is new and ``key`` becomes a representative.
+
+        Adding a key again with the same text returns the same answer. If its text
+        changed, the key is unregistered and checked again as new content. When
+        a representative with aliases changes, its first alias takes over the old
+        content; ``take_promotions`` tells the caller to copy the stored vector
+        to that alias before the changed one is overwritten.
+        """
+        exact_key = hashlib.blake2b(" ".join(text.split()).encode("utf-8"), digest_size=16).digest()
+        signature = self.signature(text)
+        band_keys = self._band_keys(signature)
+        with self._lock:
+            self.seen += 1
+            previous = self._hashes.get(key)
+            if previous == exact_key:
+                return self.alias_of.get(key)
+            if previous is not None:
+                self._unregister(key)
+            self._hashes[key] = exact_key
+            row = self._find(exact_key, signature, band_keys)
+            if row is None:
+                row = len(self._keys)
+                self._keys.append(key)
+                self._signatures.append(signature)
+                self._row_hashes.append(exact_key)
+                self._rows_by_key[key] = row
+                self._exact[exact_key] = row
+                for buckets, band_key in zip(self._buckets, band_keys):
+                    buckets.setdefault(band_key, []).append(row)
+                return None
+            representative = self._keys[row]
+            if self._exact.get(exact_key) == row:
+                self.exact_duplicates += 1
+            else:
+                self.near_duplicates += 1
+            self.aliases.setdefault(representative, []).append(key)
+            self.alias_of[key] = representative
+            self.tokens_saved += estimate_tokens(text)
+            self.text_bytes_saved += len(text.encode("utf-8"))
+            return representative
+
+    def _unregister(self, key: str) -> None:
+        representative = self.alias_of.pop(key, None)
+        if representative is not None:
+            self.aliases[representative].remove(key)
+            if not self.aliases[representative]:
+                del self.aliases[representative]
+        else:
+            row = self._rows_by_key.pop(key)
+            aliases = self.aliases.pop(key, [])
+            if aliases:
+                # The row still describes the old content, which the aliases share.
+                successor, others = aliases[0], aliases[1:]
+                self._keys[row] = successor
+                self._rows_by_key[successor] = row
+                del self.alias_of[successor]
+                for alias in others:
+                    self.alias_of[alias] = successor
+                if others:
+                    self.aliases[successor] = others
+                self._promotions[successor] = self._promotions.pop(key, key)
+            else:
+                for buckets, band_key in zip(self._buckets, self._band_keys(self._signatures[row])):
+                    buckets[band_key].remove(row)
+                    if not buckets[band_key]:
+                        del buckets[band_key]
+                del self._exact[self._row_hashes[row]]
+                self._keys[row] = self._signatures[row] = self._row_hashes[row] = None
+        del self._hashes[key]
+
+    def take_promotions(self) -> Dict[str, str]:
+        """
+        Aliases that became representatives since the last call, mapped to the
+        key whose stored vector holds their content (see ``add``).
+        """
+        with self._lock:
+            promotions, self._promotions = self._promotions, {}
+        return promotions
+
+    def keep(self, keys: Sequence[str], texts: Sequence[str]) -> List[int]:
+        """Positions of the texts that are not duplicates, registering all of them."""
+        return [i for i, (key, text) in enumerate(zip(keys, texts)) if self.add(key, text) is None]
+
+    def representative(self, key: str) -> str:
+        """The key whose row holds the vector for ``key`` (itself unless it is an alias)."""
+        return self.alias_of.get(key, key)
+
+    def report(self, dim: Optional[int] = None, batch_size: int = 1024) -> Dict[str, Any]:
+        """
+        Counts of what deduplication saved.
+
+        :param dim: Vector dimension, to report the float32 vector bytes saved
+        :param batch_size: Texts per embedding request, to report requests saved
+        """
+        duplicates = self.exact_duplicates + self.near_duplicates
+        return {
+            "texts_seen": self.seen,
+            "representatives": len(self),
+            "exact_duplicates": self.exact_duplicates,
+            "near_duplicates": self.near_duplicates,
+            "duplicate_rate": duplicates / self.seen if self.seen else 0.0,
+            "embedding_inputs_saved": duplicates,
+            "embedding_requests_saved": -(-self.seen // batch_size) - -(-(self.seen - duplicates) // batch_size),
+            "estimated_tokens_saved": self.tokens_saved,
+            "text_bytes_saved": self.text_bytes_saved,
+            "vector_bytes_saved": None if dim is None else duplicates * dim * 4,
+        }
+
+
+if __name__ == "__main__":
+    import random
+    import time
+    from aimakerspace.text_utils import CharacterTextSplitter, TextFileLoader
+
+    loader = TextFileLoader("data/PMarcaBlogs.txt")
+    loader.load()
+    chunks = CharacterTextSplitter().split_texts(loader.documents)
+    # Simulate a mirrored copy of the archive: every third chunk again, with a few words changed.
+    rng = random.Random(0)
+    mirrored = []
+    for chunk in chunks[::3]:
+        words = chunk.split(" ")
+        for _ in range(2):
+            words[rng.randrange(len(words))] = "edited"
+        mirrored.append(" ".join(words))
+    texts = chunks + chunks[::10] + mirrored
+    keys = [f"chunk-{i}" for i in range(len(texts))]
+
+    detector = NearDuplicateDetector(threshold=0.8)
+    start = time.perf_counter()
+    kept = detector.keep(keys, texts)
+    elapsed = time.perf_counter() - start
+    print(f"{len(texts)} chunks -> {len(kept)} to embed in {elapsed:.2f}s ({detector.bands} bands)")
+    print(detector.report(dim=1536))
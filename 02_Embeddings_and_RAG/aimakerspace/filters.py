@@ -0,0 +1,234 @@
+import copy
+import datetime
+import numpy as np
+from typing import Any, Dict, Hashable, List, Optional
+
+RANGE_OPERATORS = {"$gt", "$gte", "$lt", "$lte"}
+OPERATORS = RANGE_OPERATORS | {"$eq", "$ne", "$in", "$nin", "$exists"}
+_NO_ROWS = np.zeros(0, dtype=np.int64)
+
+
+def _as_number(value: Any) -> Optional[float]:
+    """Numbers and dates become floats so they can be range-filtered; others are None."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, datetime.datetime):
+        return value.timestamp()
+    if isinstance(value, datetime.date):
+        return datetime.datetime(value.year, value.month, value.day).timestamp()
+    return None
+
+
+class MetadataIndex:
+    def __init__(self):
+        """
+        Per-field indexes over row metadata, used to turn a filter expression into
+        a boolean row mask before any vector is scored.
+
+        Every field gets an inverted index (value -> row ids) for equality and
+        membership tests; numeric and date values also go into a dense column so
+        range tests are single vectorized comparisons.
+
+        Filters use a small MongoDB-style syntax::
+
+            {"source": "a.txt"}                              # equality
+            {"year": {"$gte": 2020, "$lt": 2024}}            # range
+            {"tenant": {"$in": ["acme", "globex"]}}          # membership
+            {"tags": ["x", "y"]}                             # same as {"$in": [...]}
+            {"$or": [{"source": "a.txt"}, {"$not": {"draft": True}}]}
+
+        Several fields in one dict are combined with AND.
+        """
+        self._postings: Dict[str, Dict[Hashable, List[int]]] = {}
+        self._posting_arrays: Dict[tuple, np.ndarray] = {}
+        self._columns: Dict[str, np.ndarray] = {}
+        self._n_rows = 0
+        # Postings dicts, posting lists and columns this index may modify in
+        # place, keyed ("field", f), ("value", f, v) and ("column", f) (None: all).
+        self._owned: Optional[set] = None
+
+    def fork(self) -> "MetadataIndex":
+        """
+        A copy that shares this index's posting lists and columns and copies
+        each one only before adding to it, so forking costs the field tables,
+        not the postings. This index must not be modified afterwards.
+        """
+        other = copy.copy(self)
+        other._postings = dict(self._postings)
+        other._posting_arrays = dict(self._posting_arrays)
+        other._columns = dict(self._columns)
+        other._owned = set()
+        return other
+
+    def _claim(self, key: tuple) -> bool:
+        """Marks ``key`` as owned by this index; True if it was shared and must be copied first."""
+        if self._owned is None or key in self._owned:
+            return False
+        self._owned.add(key)
+        return True
+
+    @property
+    def fields(self) -> List[str]:
+        return list(self._postings)
+
+    def add(self, first_row: int, metadatas: List[Optional[Dict[str, Any]]]) -> None:
+        """Indexes the metadata of rows ``first_row .. first_row + len(metadatas) - 1``."""
+        end = first_row + len(metadatas)
+        for column in list(self._columns):
+            grown = self._grow(self._columns[column], end)
+            if self._claim(("column", column)) and grown is self._columns[column]:
+                grown = grown.copy()
+            self._columns[column] = grown
+        for offset, metadata in enumerate(metadatas):
+            row = first_row + offset
+            for field, value in (metadata or {}).items():
+                if isinstance(value, (list, tuple, set)):
+                    values = value
+                else:
+                    values = [value]
+                if self._claim(("field", field)) and field in self._postings:
+                    self._postings[field] = dict(self._postings[field])
+                postings = self._postings.setdefault(field, {})
+                for item in values:
+                    if isinstance(item, Hashable):
+                        if self._claim(("value", field, item)) and item in postings:
+                            postings[item] = list(postings[item])
+                        postings.setdefault(item, []).append(row)
+                        self._posting_arrays.pop((field, item), None)
+                number = _as_number(value)
+                if number is not None:
+                    if field not in self._columns:
+                        self._columns[field] = self._grow(np.empty(0), end)
+                        self._claim(("column", field))
+                    self._columns[field][row] = number
+        self._n_rows = max(self._n_rows, end)
+
+    @staticmethod
+    def _grow(column: np.ndarray, size: int) -> np.ndarray:
+        if column.shape[0] >= size:
+            return column
+        grown = np.full(max(size, 2 * column.shape[0]), np.nan)
+        grown[: column.shape[0]] = column
+        return grown
+
+    def compact(self, keep: np.ndarray) -> None:
+        """Renumbers rows after the database dropped every row not in ``keep``."""
+        new_row = np.full(self._n_rows, -1, dtype=np.int64)
+        new_row[keep[keep < self._n_rows]] = np.arange(np.count_nonzero(keep < self._n_rows))
+        for field, postings in list(self._postings.items()):
+            compacted_postings = {}
+            for value, rows in postings.items():
+                rows = new_row[np.asarray(rows, dtype=np.int64)]
+                rows = rows[rows >= 0]
+                if rows.size:
+                    compacted_postings[value] = rows.tolist()
+            self._postings[field] = compacted_postings
+        for field, column in self._columns.items():
+            compacted = np.full(keep.size, np.nan)
+            known = keep < column.shape[0]
+            compacted[known] = column[keep[known]]
+            self._columns[field] = compacted
+        self._posting_arrays = {}
+        self._n_rows = keep.size
+        self._owned = None
+
+    def build_posting_arrays(self) -> None:
+        """
+        Converts every posting list to the array that filters read, which is
+        otherwise done lazily on first use; afterwards filtering does not modify
+        the index until rows are added.
+        """
+        for field, postings in self._postings.items():
+            for value in postings:
+                self._rows(field, value)
+
+    def _rows(self, field: str, value: Hashable) -> np.ndarray:
+        key = (field, value)
+        rows = self._posting_arrays.get(key)
+        if rows is None:
+            postings = self._postings.get(field, {})
+            if value not in postings:
+                return _NO_ROWS
+            rows = np.asarray(postings[value], dtype=np.int64)
+            self._posting_arrays[key] = rows
+        return rows
+
+    def _equals(self, field: str, values: List[Any], n_rows: int) -> np.ndarray:
+        mask = np.zeros(n_rows, dtype=bool)
+        for value in values:
+            if not isinstance(value, Hashable):
+                raise ValueError(f"Filter value for {field!r} must be hashable, got {value!r}")
+            rows = self._rows(field, value)
+            mask[rows[rows < n_rows]] = True
+        return mask
+
+    def _field_mask(self, field: str, condition: Any, n_rows: int) -> np.ndarray:
+        if isinstance(condition, (list, tuple, set)):
+            # List values are indexed item by item, so a list operand matches any of its items.
+            return self._equals(field, list(condition), n_rows)
+        if not isinstance(condition, dict):
+            return self._equals(field, [condition], n_rows)
+        unknown = set(condition) - OPERATORS
+        if unknown:
+            raise ValueError(f"Unsupported filter operators for {field!r}: {sorted(unknown)}")
+
+        mask = np.ones(n_rows, dtype=bool)
+        for operator, operand in condition.items():
+            if operator == "$eq":
+                mask &= self._equals(field, [operand], n_rows)
+            elif operator == "$ne":
+                mask &= ~self._equals(field, [operand], n_rows)
+            elif operator == "$in":
+                mask &= self._equals(field, list(operand), n_rows)
+            elif operator == "$nin":
+                mask &= ~self._equals(field, list(operand), n_rows)
+            elif operator == "$exists":
+                present = self._equals(field, list(self._postings.get(field, {})), n_rows)
+                if field in self._columns:
+                    present |= ~np.isnan(self._column(field, n_rows))
+                mask &= present if operand else ~present
+            else:
+                bound = _as_number(operand)
+                if bound is None:
+                    raise ValueError(f"Range filter on {field!r} needs a number or date, got {operand!r}")
+                column = self._column(field, n_rows)
+                with np.errstate(invalid="ignore"):
+                    if operator == "$gt":
+                        mask &= column > bound
+                    elif operator == "$gte":
+                        mask &= column >= bound
+                    elif operator == "$lt":
+                        mask &= column < bound
+                    else:
+                        mask &= column <= bound
+        return mask
+
+    def _column(self, field: str, n_rows: int) -> np.ndarray:
+        column = self._columns.get(field)
+        if column is None:
+            return np.full(n_rows, np.nan)
+        if column.shape[0] < n_rows:
+            column = self._grow(column, n_rows)
+        return column[:n_rows]
+
+    def mask(self, expression: Dict[str, Any], n_rows: int) -> np.ndarray:
+        """Evaluates a filter expression to a boolean mask over the first ``n_rows`` rows."""
+        mask = np.ones(n_rows, dtype=bool)
+        for key, condition in expression.items():
+            if key == "$and":
+                for clause in condition:
+                    mask &= self.mask(clause, n_rows)
+            elif key == "$or":
+                either = np.zeros(n_rows, dtype=bool)
+                for clause in condition:
+                    either |= self.mask(clause, n_rows)
+                mask &= either
+            elif key == "$not":
+                mask &= ~self.mask(condition, n_rows)
+            elif key.startswith("$"):
+                raise ValueError(f"Unsupported filter operator: {key}")
+            else:
+                mask &= self._field_mask(key, condition, n_rows)
+        return mask
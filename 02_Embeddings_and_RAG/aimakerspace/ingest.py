@@ -0,0 +1,220 @@
+import asyncio
+import itertools
+import threading
+import numpy as np
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from aimakerspace.dedup import NearDuplicateDetector
+from aimakerspace.text_utils import TextFileLoader, CharacterTextSplitter
+from aimakerspace.vectordatabase import VectorDatabase
+
+
+def iter_chunks(
+    documents: Iterable[Tuple[str, Dict[str, Any]]], splitter: CharacterTextSplitter
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Yields ``(chunk, metadata)`` for each chunk of each ``(text, metadata)`` document.
+    Chunk metadata extends the document's with the chunk's position and its
+    ``start``/``end`` character offsets in the document.
+    """
+    for text, metadata in documents:
+        for chunk_index, (start, end) in enumerate(splitter.iter_spans(text)):
+            yield text[start:end], {**metadata, "chunk_index": chunk_index, "start": start, "end": end}
+
+
+def chunk_id(metadata: Dict[str, Any]) -> str:
+    """Stable vector id of a chunk: its source path and position in the document."""
+    return f"{metadata['source']}#{metadata['chunk_index']}"
+
+
+def _record_aliases(vector_db: VectorDatabase, aliases: Dict[str, List[Dict[str, Any]]]) -> None:
+    """
+    Adds ``aliases`` (ids) and ``alias_sources`` to the metadata of each kept
+    chunk, so the sources of its skipped duplicates can be filtered on and the
+    mapping survives ``save``. The rows are re-upserted with their stored vectors.
+    """
+    ids, vectors, texts, metadatas = [], [], [], []
+    for key, duplicates in aliases.items():
+        vector = vector_db.retrieve_from_key(key)
+        if vector is None:
+            continue
+        metadata = dict(vector_db.get_metadata(key) or {})
+        alias_ids = list(metadata.get("aliases", []))
+        alias_sources = list(metadata.get("alias_sources", []))
+        for duplicate in duplicates:
+            if chunk_id(duplicate) not in alias_ids:
+                alias_ids.append(chunk_id(duplicate))
+            if duplicate["source"] not in alias_sources:
+                alias_sources.append(duplicate["source"])
+        ids.append(key)
+        vectors.append(vector)
+        texts.append(vector_db.get_text(key))
+        metadatas.append({**metadata, "aliases": alias_ids, "alias_sources": alias_sources})
+    if ids:
+        vector_db.upsert(ids, np.asarray(vectors, dtype=np.float32), texts, metadatas)
+
+
+def iter_batches(items: Iterable, batch_size: int) -> Iterator[List]:
+    iterator = iter(items)
+    while batch := list(itertools.islice(iterator, batch_size)):
+        yield batch
+
+
+async def astream_ingest(
+    loader: TextFileLoader,
+    splitter: CharacterTextSplitter,
+    vector_db: VectorDatabase,
+    batch_size: int = 256,
+    max_pending_batches: int = 4,
+    max_concurrent_batches: int = 2,
+    deduplicator: Optional[NearDuplicateDetector] = None,
+    delete_missing_sources: bool = False,
+) -> Dict[str, int]:
+    """
+    Streams documents from ``loader`` through ``splitter`` into ``vector_db``.
+
+    Reading and splitting run in a worker thread that feeds a bounded queue of
+    chunk batches, so file I/O overlaps with embedding requests and the producer
+    blocks whenever ``max_pending_batches`` batches are waiting. At most
+    ``max_pending_batches + max_concurrent_batches`` batches (plus the file being
+    split) are held in memory, however large the corpus is.
+
+    Chunk ids are ``<source>#<chunk_index>`` (see ``chunk_id``), so ingesting a
+    corpus again replaces its chunks in place. Once every batch is stored, chunks
+    of an ingested source that were not produced this time (the document got
+    shorter, or a chunk is now a duplicate) are deleted.
+
+    :param batch_size: Chunks per embedding request
+    :param max_pending_batches: Queue bound between the reader and the embedders
+    :param max_concurrent_batches: Embedding requests in flight at once
+    :param deduplicator: Drops exact and near-duplicate chunks before they are
+        embedded. The kept chunk's metadata lists their ids under ``aliases`` and
+        their sources under ``alias_sources``; filter on
+        ``{"$or": [{"source": path}, {"alias_sources": path}]}`` to also match
+        content that ``path`` shares with another document
+    :param delete_missing_sources: Also delete chunks whose ``source`` was not
+        read by ``loader`` (e.g. removed files); only use it when ``loader``
+        covers every source in ``vector_db``
+    :return: Counts of documents, chunks, skipped duplicates, batches ingested,
+        stale chunks deleted and duplicates promoted to keep a changed chunk's old content
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending_batches)
+    stats = {"documents": 0, "chunks": 0, "duplicates": 0, "batches": 0, "deleted": 0, "promoted": 0}
+    # Ids stored in this run, by source: every other id of these sources is stale afterwards.
+    stored: Dict[str, set] = {}
+    aliases: Dict[str, List[Dict[str, Any]]] = {}
+    # Set when ingestion fails, so the reader stops instead of working through the corpus.
+    stop = threading.Event()
+
+    def count_documents(documents):
+        for document in documents:
+            stats["documents"] += 1
+            stored.setdefault(document[1]["source"], set())
+            yield document
+
+    async def adopt(promotions: Dict[str, str]) -> None:
+        # An alias took over the old content of a chunk whose text changed; give it
+        # that chunk's vector before the chunk is overwritten by its new text.
+        ids, metadatas = [], []
+        for key, previous in promotions.items():
+            duplicates = aliases.pop(previous, [])
+            own = [metadata for metadata in duplicates if chunk_id(metadata) == key]
+            others = [metadata for metadata in duplicates if chunk_id(metadata) != key]
+            if others:
+                aliases.setdefault(key, []).extend(others)
+            if own:
+                metadata = own[0]
+            else:
+                source, chunk_index = key.rsplit("#", 1)
+                metadata = {"source": source, "chunk_index": int(chunk_index)}
+            if metadata["source"] in stored:
+                stored[metadata["source"]].add(key)
+            ids.append(key)
+            metadatas.append(metadata)
+        stats["promoted"] += vector_db.copy_rows(ids, list(promotions.values()), metadatas)
+
+    def skip_duplicates(chunks):
+        for chunk, metadata in chunks:
+            representative = deduplicator.add(chunk_id(metadata), chunk)
+            promotions = deduplicator.take_promotions()
+            if promotions:
+                asyncio.run_coroutine_threadsafe(adopt(promotions), loop).result()
+            if representative is None:
+                yield chunk, metadata
+            else:
+                aliases.setdefault(representative, []).append(metadata)
+                stats["duplicates"] += 1
+
+    def produce() -> None:
+        try:
+            chunks = iter_chunks(count_documents(loader.iter_documents()), splitter)
+            if deduplicator is not None:
+                # MinHash runs here, in the reader thread, overlapping the embedding requests.
+                chunks = skip_duplicates(chunks)
+            for batch in iter_batches(chunks, batch_size):
+                if stop.is_set():
+                    return
+                # Blocks this thread while the queue is full: that is the backpressure.
+                asyncio.run_coroutine_threadsafe(queue.put(batch), loop).result()
+        finally:
+            if not stop.is_set():
+                for _ in range(max_concurrent_batches):
+                    asyncio.run_coroutine_threadsafe(queue.put(None), loop).result()
+
+    async def consume() -> None:
+        while (batch := await queue.get()) is not None:
+            texts = [chunk for chunk, _ in batch]
+            embeddings = await vector_db.embedding_model.async_get_embeddings(texts)
+            metadatas = [metadata for _, metadata in batch]
+            ids = [chunk_id(metadata) for metadata in metadatas]
+            vector_db.upsert(ids, np.asarray(embeddings, dtype=np.float32), texts, metadatas)
+            for key, metadata in zip(ids, metadatas):
+                stored[metadata["source"]].add(key)
+            stats["chunks"] += len(batch)
+            stats["batches"] += 1
+
+    consumers = [asyncio.create_task(consume()) for _ in range(max_concurrent_batches)]
+    producer = loop.run_in_executor(None, produce)
+    try:
+        await asyncio.gather(producer, *consumers)
+    except BaseException:
+        stop.set()
+        for consumer in consumers:
+            consumer.cancel()
+        # Unblock a producer waiting on a full queue so its thread can exit; with
+        # ``stop`` set it puts at most the batch it was already holding.
+        while not producer.done():
+            while not queue.empty():
+                queue.get_nowait()
+            await asyncio.sleep(0.01)
+        raise
+    # One filter pass over all ingested sources, not one per source.
+    stale = [
+        key
+        for key in vector_db.ids_matching({"source": {"$in": list(stored)}})
+        if key not in stored[vector_db.get_metadata(key)["source"]]
+    ]
+    if delete_missing_sources:
+        stale += vector_db.ids_matching({"source": {"$exists": True, "$nin": list(stored)}})
+    stats["deleted"] = vector_db.delete(stale)
+    _record_aliases(vector_db, aliases)
+    vector_db.train_pending()
+    return stats
+
+
+if __name__ == "__main__":
+    vector_db = VectorDatabase()
+    deduplicator = NearDuplicateDetector()
+    stats = asyncio.run(
+        astream_ingest(TextFileLoader("data"), CharacterTextSplitter(), vector_db, deduplicator=deduplicator)
+    )
+    print(stats)
+    print(deduplicator.report(dim=vector_db.dim))
+    print(vector_db.search_by_text("What is the Michael Eisner Memorial Weak Executive Problem?", k=3))
+    print(
+        vector_db.search_by_text(
+            "What is the Michael Eisner Memorial Weak Executive Problem?",
+            k=3,
+            filter={"source": {"$in": ["data/PMarcaBlogs.txt"]}},
+        )
+    )
@@ -0,0 +1,243 @@
+import contextlib
+import contextvars
+import json
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class Collector:
+    """
+    Receives measurements from the instrumented code paths. Subclass it to
+    forward them elsewhere (e.g. to OpenTelemetry); every method is a no-op here.
+    """
+
+    def record_span(self, name: str, seconds: float, labels: Dict[str, Any], parent: Optional[str]) -> None:
+        pass
+
+    def increment(self, name: str, amount: float, labels: Dict[str, Any]) -> None:
+        pass
+
+    def observe(self, name: str, value: float, labels: Dict[str, Any]) -> None:
+        pass
+
+
+_collector: Optional[Collector] = None
+_current_span: contextvars.ContextVar = contextvars.ContextVar("aimakerspace_current_span", default=None)
+
+
+def set_collector(collector: Optional[Collector]) -> Optional[Collector]:
+    """Installs ``collector`` process-wide (None disables metrics) and returns the previous one."""
+    global _collector
+    previous, _collector = _collector, collector
+    return previous
+
+
+def get_collector() -> Optional[Collector]:
+    return _collector
+
+
+@contextlib.contextmanager
+def collecting(collector: Optional[Collector] = None) -> Iterator[Collector]:
+    """Enables metrics for the duration of a ``with`` block, then restores the previous collector."""
+    collector = collector if collector is not None else InMemoryCollector()
+    previous = set_collector(collector)
+    try:
+        yield collector
+    finally:
+        set_collector(previous)
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        return None
+
+    def set(self, key: str, value: Any) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    __slots__ = ("collector", "name", "labels", "start", "seconds", "_token")
+
+    def __init__(self, collector: Collector, name: str, labels: Dict[str, Any]):
+        self.collector = collector
+        self.name = name
+        self.labels = labels
+        self.seconds: Optional[float] = None
+
+    def __enter__(self) -> "Span":
+        self._token = _current_span.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.seconds = time.perf_counter() - self.start
+        _current_span.reset(self._token)
+        parent = _current_span.get()
+        if exc_type is not None:
+            self.labels["error"] = exc_type.__name__
+        self.collector.record_span(self.name, self.seconds, self.labels, parent.name if parent else None)
+
+    def set(self, key: str, value: Any) -> None:
+        """Adds a label to the span, e.g. a value only known once the work is done."""
+        self.labels[key] = value
+
+
+def span(name: str, **labels: Any):
+    """
+    Times a ``with`` block as span ``name``. With no collector installed this
+    returns a shared no-op object, so disabled instrumentation costs one
+    global lookup.
+    """
+    collector = _collector
+    if collector is None:
+        return _NULL_SPAN
+    return Span(collector, name, labels)
+
+
+def increment(name: str, amount: float = 1, **labels: Any) -> None:
+    """Adds ``amount`` to counter ``name`` (e.g. tokens used, cache hits)."""
+    collector = _collector
+    if collector is not None:
+        collector.increment(name, amount, labels)
+
+
+def observe(name: str, value: float, **labels: Any) -> None:
+    """Records one observation of ``name`` (e.g. a batch size)."""
+    collector = _collector
+    if collector is not None:
+        collector.observe(name, value, labels)
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+class InMemoryCollector(Collector):
+    def __init__(self, max_spans: int = 10_000, prefix: str = "aimakerspace"):
+        """
+        Thread-safe collector that aggregates counters and summaries (count,
+        sum, min, max) per metric and label set, and keeps the most recent
+        spans for inspection.
+
+        :param max_spans: Number of recent spans kept in ``spans``
+        :param prefix: Prefix of the exported Prometheus metric names
+        """
+        self.prefix = prefix
+        self.counters: Dict[str, Dict[LabelKey, float]] = {}
+        self.summaries: Dict[str, Dict[LabelKey, List[float]]] = {}
+        self.spans: deque = deque(maxlen=max_spans)
+        self._lock = threading.Lock()
+
+    def _summarize(self, name: str, value: float, labels: Dict[str, Any]) -> None:
+        series = self.summaries.setdefault(name, {})
+        key = _label_key(labels)
+        summary = series.get(key)
+        if summary is None:
+            series[key] = [1, value, value, value]
+        else:
+            summary[0] += 1
+            summary[1] += value
+            summary[2] = min(summary[2], value)
+            summary[3] = max(summary[3], value)
+
+    def record_span(self, name: str, seconds: float, labels: Dict[str, Any], parent: Optional[str]) -> None:
+        with self._lock:
+            self._summarize(f"{name}.seconds", seconds, labels)
+            self.spans.append({"name": name, "seconds": seconds, "parent": parent, "labels": dict(labels)})
+
+    def increment(self, name: str, amount: float, labels: Dict[str, Any]) -> None:
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            key = _label_key(labels)
+            series[key] = series.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, labels: Dict[str, Any]) -> None:
+        with self._lock:
+            self._summarize(name, value, labels)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.counters.clear()
+            self.summaries.clear()
+            self.spans.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """All metrics as plain JSON-serializable data."""
+        with self._lock:
+            counters = {
+                name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                for name, series in self.counters.items()
+            }
+            summaries = {
+                name: [
+                    {"labels": dict(key), "count": s[0], "sum": s[1], "min": s[2], "max": s[3], "mean": s[1] / s[0]}
+                    for key, s in series.items()
+                ]
+                for name, series in self.summaries.items()
+            }
+            spans = list(self.spans)
+        return {"counters": counters, "summaries": summaries, "spans": spans}
+
+    def to_json(self, include_spans: bool = False, **kwargs) -> str:
+        snapshot = self.snapshot()
+        if not include_spans:
+            del snapshot["spans"]
+        return json.dumps(snapshot, **kwargs)
+
+    def _metric_name(self, name: str) -> str:
+        name = "".join(c if c.isalnum() else "_" for c in name)
+        return f"{self.prefix}_{name}" if self.prefix else name
+
+    @staticmethod
+    def _labels(key: LabelKey) -> str:
+        if not key:
+            return ""
+        escape = lambda value: value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        return "{" + ",".join(f'{label}="{escape(value)}"' for label, value in key) + "}"
+
+    def to_prometheus(self) -> str:
+        """Counters and summaries in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self.counters.items()):
+                metric = self._metric_name(name) + "_total"
+                lines.append(f"# TYPE {metric} counter")
+                for key, value in series.items():
+                    lines.append(f"{metric}{self._labels(key)} {value}")
+            for name, series in sorted(self.summaries.items()):
+                metric = self._metric_name(name)
+                lines.append(f"# TYPE {metric} summary")
+                for key, (count, total, _, _) in series.items():
+                    lines.append(f"{metric}_count{self._labels(key)} {count}")
+                    lines.append(f"{metric}_sum{self._labels(key)} {total}")
+                lines.append(f"# TYPE {metric}_max gauge")
+                for key, (_, _, _, maximum) in series.items():
+                    lines.append(f"{metric}_max{self._labels(key)} {maximum}")
+        return "\n".join(lines) + "\n"
+
+
+if __name__ == "__main__":
+    import timeit
+
+    def work() -> None:
+        with span("demo.work", kind="unit"):
+            observe("demo.batch_size", 32)
+            increment("demo.items", 32)
+
+    disabled = min(timeit.repeat(work, number=100_000, repeat=3)) / 100_000
+    with collecting() as collector:
+        enabled = min(timeit.repeat(work, number=100_000, repeat=3)) / 100_000
+    print(f"span + observe + increment: {disabled * 1e9:.0f} ns disabled, {enabled * 1e9:.0f} ns enabled")
+    print(collector.to_prometheus())
@@ -0,0 +1,156 @@
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, List, Optional, Sequence, TypeVar
+
+T = TypeVar("T")
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (about four characters per token for English text)."""
+    return len(text) // 4 + 1
+
+
+def pack_batches(texts: Sequence[str], max_items: int, max_tokens: int) -> List[range]:
+    """
+    Splits ``texts`` into contiguous batches holding at most ``max_items`` texts
+    and about ``max_tokens`` estimated tokens. A single oversized text still gets
+    a batch of its own.
+    """
+    batches = []
+    start, tokens = 0, 0
+    for i, text in enumerate(texts):
+        cost = estimate_tokens(text)
+        if i > start and (i - start >= max_items or tokens + cost > max_tokens):
+            batches.append(range(start, i))
+            start, tokens = i, 0
+        tokens += cost
+    if start < len(texts):
+        batches.append(range(start, len(texts)))
+    return batches
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Rate limits, timeouts, connection errors and 5xx responses are worth retrying."""
+    status_code = getattr(error, "status_code", None)
+    if status_code is not None:
+        return status_code in RETRYABLE_STATUS_CODES
+    return type(error).__name__ in {"APIConnectionError", "APITimeoutError"} or isinstance(
+        error, (ConnectionError, TimeoutError)
+    )
+
+
+class EmbeddingBatchScheduler:
+    def __init__(
+        self,
+        max_concurrency: int = 8,
+        max_batch_items: int = 1024,
+        max_batch_tokens: int = 100_000,
+        max_retries: int = 5,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+    ):
+        """
+        Packs texts into size-bounded batches and runs them with a bounded number
+        in flight, retrying retryable failures with exponential backoff and full
+        jitter. Results are reassembled in input order.
+
+        :param max_concurrency: Maximum number of batches in flight
+        :param max_batch_items: Maximum texts per request
+        :param max_batch_tokens: Approximate token budget per request
+        :param max_retries: Retries per batch before its error is raised
+        :param base_delay: First backoff ceiling in seconds; doubles each attempt
+        :param max_delay: Upper bound on a single backoff in seconds
+        """
+        self.max_concurrency = max_concurrency
+        self.max_batch_items = max_batch_items
+        self.max_batch_tokens = max_batch_tokens
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def _count_retry(self) -> None:
+        # ``run`` retries from several worker threads at once.
+        with self._lock:
+            self.retries += 1
+
+    @staticmethod
+    def _store(results: List[Optional[T]], batch: range, embeddings: List[T]) -> None:
+        if len(embeddings) != len(batch):
+            raise ValueError(f"Embedding batch returned {len(embeddings)} results for {len(batch)} texts")
+        results[batch.start : batch.stop] = embeddings
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+    def batches(self, texts: Sequence[str]) -> List[range]:
+        return pack_batches(texts, self.max_batch_items, self.max_batch_tokens)
+
+    async def arun(
+        self, texts: Sequence[str], embed_batch: Callable[[List[str]], Awaitable[List[T]]]
+    ) -> List[T]:
+        """Embeds ``texts`` with the coroutine ``embed_batch``, preserving order."""
+        results: List[Optional[T]] = [None] * len(texts)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run_batch(batch: range) -> None:
+            payload = [texts[i] for i in batch]
+            async with semaphore:
+                for attempt in range(self.max_retries + 1):
+                    try:
+                        embeddings = await embed_batch(payload)
+                        break
+                    except Exception as error:
+                        if attempt == self.max_retries or not is_retryable(error):
+                            raise
+                        self._count_retry()
+                        await asyncio.sleep(self.backoff(attempt))
+            self._store(results, batch, embeddings)
+
+        # A TaskGroup cancels the remaining batches as soon as one fails for good.
+        try:
+            async with asyncio.TaskGroup() as group:
+                for batch in self.batches(texts):
+                    group.create_task(run_batch(batch))
+        except BaseExceptionGroup as errors:
+            raise errors.exceptions[0] from None
+        return results
+
+    def run(self, texts: Sequence[str], embed_batch: Callable[[List[str]], List[T]]) -> List[T]:
+        """Thread-pooled equivalent of ``arun`` for a blocking ``embed_batch``."""
+        results: List[Optional[T]] = [None] * len(texts)
+
+        def run_batch(batch: range) -> None:
+            payload = [texts[i] for i in batch]
+            for attempt in range(self.max_retries + 1):
+                try:
+                    embeddings = embed_batch(payload)
+                    break
+                except Exception as error:
+                    if attempt == self.max_retries or not is_retryable(error):
+                        raise
+                    self._count_retry()
+                    time.sleep(self.backoff(attempt))
+            self._store(results, batch, embeddings)
+
+        batches = self.batches(texts)
+        if len(batches) <= 1:
+            for batch in batches:
+                run_batch(batch)
+            return results
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            futures = [executor.submit(run_batch, batch) for batch in batches]
+            try:
+                for future in futures:
+                    future.result()
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+        return results
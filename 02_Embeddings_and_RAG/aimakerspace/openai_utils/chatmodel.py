@@ -1,27 +1,254 @@
-from openai import OpenAI
-from dotenv import load_dotenv
-import os
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, Iterator, List, Optional, Union
+from aimakerspace import metrics
+from aimakerspace.openai_utils.clients import LazyClient, async_openai_client, get_api_key, openai_client
 
-load_dotenv()
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI, OpenAI
+
+Messages = List[Dict[str, Any]]
+
+
+class ChatStream:
+    def __init__(self, chunks: Union[Iterator, AsyncIterator], started: float, model_name: Optional[str] = None):
+        """
+        Streamed chat response. Iterate it (``for`` for ``ChatOpenAI.stream``,
+        ``async for`` for ``ChatOpenAI.astream``) to receive content deltas as
+        they arrive; timing is recorded along the way.
+
+        Timing is recorded and the response released when iteration ends, also
+        when it stops early (``break`` or an exception). To release a stream
+        that is never iterated, use it as a (async) context manager or call
+        ``close``/``aclose``.
+
+        :param chunks: Chunk iterator returned by ``chat.completions.create(stream=True)``
+        :param started: ``time.perf_counter()`` value when the request was sent
+        :param model_name: Model label attached to the recorded metrics
+        """
+        self._chunks = chunks
+        self.started = started
+        self.model_name = model_name
+        self.time_to_first_token: Optional[float] = None
+        self.total_time: Optional[float] = None
+        self.parts: List[str] = []
+
+    @property
+    def text(self) -> str:
+        """Content received so far."""
+        return "".join(self.parts)
+
+    def _record(self, chunk) -> Optional[str]:
+        if not chunk.choices:
+            return None
+        token = chunk.choices[0].delta.content
+        if token:
+            if self.time_to_first_token is None:
+                self.time_to_first_token = time.perf_counter() - self.started
+            self.parts.append(token)
+        return token
+
+    def _finish(self) -> None:
+        if self.total_time is not None:
+            return
+        self.total_time = time.perf_counter() - self.started
+        if self.time_to_first_token is not None:
+            metrics.observe("chat.stream.time_to_first_token", self.time_to_first_token, model=self.model_name)
+        metrics.observe("chat.stream.seconds", self.total_time, model=self.model_name)
+
+    def close(self) -> None:
+        """Records timing and closes the underlying response."""
+        self._finish()
+        close = getattr(self._chunks, "close", None)
+        if close is not None:
+            close()
+
+    async def aclose(self) -> None:
+        """Async variant of ``close`` for streams from ``ChatOpenAI.astream``."""
+        self._finish()
+        # openai's AsyncStream has an async ``close``; async generators have ``aclose``.
+        close = getattr(self._chunks, "aclose", None) or getattr(self._chunks, "close", None)
+        if close is not None:
+            await close()
+
+    def __enter__(self) -> "ChatStream":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    async def __aenter__(self) -> "ChatStream":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    def __iter__(self) -> Iterator[str]:
+        try:
+            for chunk in self._chunks:
+                token = self._record(chunk)
+                if token:
+                    yield token
+        finally:
+            self.close()
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        try:
+            async for chunk in self._chunks:
+                token = self._record(chunk)
+                if token:
+                    yield token
+        finally:
+            await self.aclose()
 
 
 class ChatOpenAI:
-    def __init__(self, model_name: str = "gpt-4.1-mini"):
+    client = LazyClient(lambda self: openai_client(self.openai_api_key, self.base_url))
+    async_client = LazyClient(
+        lambda self: async_openai_client(self.openai_api_key, self.base_url), per_loop=True
+    )
+
+    def __init__(
+        self,
+        model_name: str = "gpt-4.1-mini",
+        max_concurrency: int = 8,
+        client: Optional["OpenAI"] = None,
+        async_client: Optional["AsyncOpenAI"] = None,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+    ):
+        """
+        Chat completions with one pooled sync client and one pooled async client
+        per instance, so consecutive requests reuse open connections. Clients
+        that are not passed in are created on first use.
+
+        :param model_name: OpenAI chat model to call
+        :param max_concurrency: Conversations in flight at once in ``run_many`` and
+            ``arun_many``
+        :param client: OpenAI-compatible sync client (e.g. a fake for tests)
+        :param async_client: OpenAI-compatible async client
+        :param api_key: API key (defaults to ``OPENAI_API_KEY``)
+        :param base_url: API base URL, e.g. a local OpenAI-compatible server
+        """
         self.model_name = model_name
-        self.openai_api_key = os.getenv("OPENAI_API_KEY")
-        if self.openai_api_key is None:
+        self.max_concurrency = max_concurrency
+        self.openai_api_key = get_api_key(api_key) if client is None or async_client is None else api_key
+        if self.openai_api_key is None and (client is None or async_client is None):
             raise ValueError("OPENAI_API_KEY is not set")
+        self.base_url = base_url
+        self.client = client
+        self.async_client = async_client
 
-    def run(self, messages, text_only: bool = True, **kwargs):
+    @staticmethod
+    def _check(messages: Messages) -> None:
         if not isinstance(messages, list):
             raise ValueError("messages must be a list")
 
-        client = OpenAI()
-        response = client.chat.completions.create(
-            model=self.model_name, messages=messages, **kwargs
-        )
+    def _record_usage(self, response) -> None:
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            metrics.increment("chat.prompt_tokens", getattr(usage, "prompt_tokens", 0) or 0, model=self.model_name)
+            metrics.increment(
+                "chat.completion_tokens", getattr(usage, "completion_tokens", 0) or 0, model=self.model_name
+            )
+
+    def run(self, messages, text_only: bool = True, **kwargs):
+        self._check(messages)
+        with metrics.span("chat.run", model=self.model_name):
+            response = self.client.chat.completions.create(
+                model=self.model_name, messages=messages, **kwargs
+            )
+        self._record_usage(response)
 
         if text_only:
             return response.choices[0].message.content
 
         return response
+
+    async def arun(self, messages, text_only: bool = True, **kwargs):
+        self._check(messages)
+        with metrics.span("chat.arun", model=self.model_name):
+            response = await self.async_client.chat.completions.create(
+                model=self.model_name, messages=messages, **kwargs
+            )
+        self._record_usage(response)
+
+        if text_only:
+            return response.choices[0].message.content
+
+        return response
+
+    def run_many(self, list_of_messages: List[Messages], text_only: bool = True, **kwargs) -> List[Any]:
+        """Runs conversations on a thread pool, ``max_concurrency`` at a time, in input order."""
+        for messages in list_of_messages:
+            self._check(messages)
+        if len(list_of_messages) <= 1:
+            return [self.run(messages, text_only, **kwargs) for messages in list_of_messages]
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(list_of_messages))) as executor:
+            futures = [executor.submit(self.run, messages, text_only, **kwargs) for messages in list_of_messages]
+            try:
+                return [future.result() for future in futures]
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+
+    async def arun_many(self, list_of_messages: List[Messages], text_only: bool = True, **kwargs) -> List[Any]:
+        """Runs conversations concurrently, ``max_concurrency`` at a time, in input order."""
+        for messages in list_of_messages:
+            self._check(messages)
+        results: List[Any] = [None] * len(list_of_messages)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run_one(i: int, messages: Messages) -> None:
+            async with semaphore:
+                results[i] = await self.arun(messages, text_only, **kwargs)
+
+        # A TaskGroup cancels the remaining conversations as soon as one fails.
+        try:
+            async with asyncio.TaskGroup() as group:
+                for i, messages in enumerate(list_of_messages):
+                    group.create_task(run_one(i, messages))
+        except BaseExceptionGroup as errors:
+            raise errors.exceptions[0] from None
+        return results
+
+    def stream(self, messages, **kwargs) -> ChatStream:
+        """
+        Starts a streaming completion; iterate the returned ``ChatStream`` for
+        content deltas, then read ``time_to_first_token`` and ``total_time``.
+        """
+        self._check(messages)
+        started = time.perf_counter()
+        chunks = self.client.chat.completions.create(
+            model=self.model_name, messages=messages, stream=True, **kwargs
+        )
+        return ChatStream(chunks, started, self.model_name)
+
+    async def astream(self, messages, **kwargs) -> ChatStream:
+        """Async variant of ``stream``: ``async for token in await chat.astream(messages)``."""
+        self._check(messages)
+        started = time.perf_counter()
+        chunks = await self.async_client.chat.completions.create(
+            model=self.model_name, messages=messages, stream=True, **kwargs
+        )
+        return ChatStream(chunks, started, self.model_name)
+
+
+if __name__ == "__main__":
+    from aimakerspace.openai_utils.fakes import FakeOpenAIServer
+
+    with FakeOpenAIServer(latency=0.05, token_latency=0.01) as server:
+        chat = ChatOpenAI(api_key="fake", base_url=server.url)
+        conversations = [[{"role": "user", "content": f"Question {i}?"}] for i in range(32)]
+
+        start = time.perf_counter()
+        answers = asyncio.run(chat.arun_many(conversations))
+        print(f"{len(answers)} answers in {time.perf_counter() - start:.2f}s:", answers[:2])
+
+        stream = chat.stream([{"role": "user", "content": "Stream this answer, please."}])
+        for token in stream:
+            print(token, end="", flush=True)
+        print(f"\ntime to first token {stream.time_to_first_token * 1000:.0f} ms, total {stream.total_time * 1000:.0f} ms")
+        print(f"{server.requests} requests over {server.connections} connections")
@@ -0,0 +1,122 @@
+import asyncio
+import os
+import threading
+import weakref
+from typing import Any, AsyncIterator, Callable, Optional
+
+_lock = threading.Lock()
+_environment_loaded = False
+
+
+def load_environment() -> None:
+    """Reads ``.env`` into ``os.environ`` the first time it is needed in this process."""
+    global _environment_loaded
+    if _environment_loaded:
+        return
+    with _lock:
+        if not _environment_loaded:
+            from dotenv import load_dotenv
+
+            load_dotenv()
+            _environment_loaded = True
+
+
+def get_api_key(api_key: Optional[str] = None) -> Optional[str]:
+    """``api_key`` if given, else ``OPENAI_API_KEY`` from the environment or ``.env``."""
+    if api_key:
+        return api_key
+    if os.getenv("OPENAI_API_KEY") is None:
+        load_environment()
+    return os.getenv("OPENAI_API_KEY")
+
+
+def openai_client(api_key: Optional[str], base_url: Optional[str] = None):
+    from openai import OpenAI
+
+    return OpenAI(api_key=api_key, base_url=base_url)
+
+
+def async_openai_client(api_key: Optional[str], base_url: Optional[str] = None):
+    from openai import AsyncOpenAI
+
+    return AsyncOpenAI(api_key=api_key, base_url=base_url)
+
+
+async def _close_with_loop(client: Any) -> AsyncIterator[None]:
+    # ``asyncio.run`` finalizes unfinished async generators before it closes its
+    # loop, so this closes the client's connections while that is still possible.
+    try:
+        yield
+    finally:
+        await client.close()
+
+
+class LazyClient:
+    """
+    Client attribute that is built by ``factory(instance)`` on first access.
+    Importing ``openai`` and setting up its HTTP pool is deferred until a request
+    is actually made; assigning a client (or None to reset) works as usual.
+
+    With ``per_loop`` the built client is tied to the event loop that was running
+    when it was built, because async HTTP pools cannot outlive their loop; code
+    that calls ``asyncio.run`` repeatedly (e.g. once per notebook cell) gets a
+    fresh client in each new loop, and the old one is closed when its loop shuts
+    down. Assigned clients are always used as given.
+    """
+
+    def __init__(self, factory: Callable[[Any], Any], per_loop: bool = False):
+        self.factory = factory
+        self.per_loop = per_loop
+
+    def __set_name__(self, owner: type, name: str) -> None:
+        self.attribute = f"_{name}"
+        self.loop_attribute = f"_{name}_loop"
+        self.closer_attribute = f"_{name}_closer"
+
+    @staticmethod
+    def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+        try:
+            return asyncio.get_running_loop()
+        except RuntimeError:
+            return None
+
+    def _is_current(self, instance: Any, client: Any) -> bool:
+        if client is None:
+            return False
+        if not self.per_loop:
+            return True
+        if self.loop_attribute not in instance.__dict__:
+            return True  # Assigned by the caller.
+        built_for = instance.__dict__[self.loop_attribute]
+        return (None if built_for is None else built_for()) is self._running_loop()
+
+    def __get__(self, instance: Any, owner: type = None) -> Any:
+        if instance is None:
+            return self
+        client = instance.__dict__.get(self.attribute)
+        if not self._is_current(instance, client):
+            with _lock:
+                client = instance.__dict__.get(self.attribute)
+                if not self._is_current(instance, client):
+                    client = self.factory(instance)
+                    instance.__dict__[self.attribute] = client
+                    if self.per_loop:
+                        self._bind(instance, client)
+        return client
+
+    def _bind(self, instance: Any, client: Any) -> None:
+        loop = self._running_loop()
+        instance.__dict__[self.loop_attribute] = None if loop is None else weakref.ref(loop)
+        if loop is not None:
+            # The loop only holds async generators weakly, so the instance keeps it alive.
+            closer = _close_with_loop(client)
+            asyncio.ensure_future(closer.__anext__())
+            instance.__dict__[self.closer_attribute] = closer
+        else:
+            instance.__dict__.pop(self.closer_attribute, None)
+
+    def __set__(self, instance: Any, client: Any) -> None:
+        instance.__dict__[self.attribute] = client
+        if self.per_loop:
+            instance.__dict__.pop(self.loop_attribute, None)
+            instance.__dict__.pop(self.closer_attribute, None)
@@ -1,58 +1,157 @@
-from dotenv import load_dotenv
-from openai import AsyncOpenAI, OpenAI
-import openai
-from typing import List
-import os
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+import numpy as np
 import asyncio
+from aimakerspace import metrics
+from aimakerspace.openai_utils.batching import EmbeddingBatchScheduler
+from aimakerspace.openai_utils.clients import LazyClient, async_openai_client, get_api_key, openai_client
+from aimakerspace.openai_utils.embedding_cache import EmbeddingCache, embedding_cache_key
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI, OpenAI
 
 
 class EmbeddingModel:
-    def __init__(self, embeddings_model_name: str = "text-embedding-3-small", batch_size: int = 1024):
-        load_dotenv()
-        self.openai_api_key = os.getenv("OPENAI_API_KEY")
-        self.async_client = AsyncOpenAI()
-        self.client = OpenAI()
+    client = LazyClient(lambda self: openai_client(self.openai_api_key, self.base_url))
+    async_client = LazyClient(
+        lambda self: async_openai_client(self.openai_api_key, self.base_url), per_loop=True
+    )
+
+    def __init__(
+        self,
+        embeddings_model_name: str = "text-embedding-3-small",
+        batch_size: int = 1024,
+        cache: Optional[EmbeddingCache] = None,
+        scheduler: Optional[EmbeddingBatchScheduler] = None,
+        client: Optional["OpenAI"] = None,
+        async_client: Optional["AsyncOpenAI"] = None,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        dimensions: Optional[int] = None,
+    ):
+        """
+        :param embeddings_model_name: OpenAI embedding model to call
+        :param batch_size: Maximum number of texts sent per request
+        :param cache: Optional ``EmbeddingCache``; only cache misses reach the API
+        :param scheduler: Batching, concurrency and retry policy for list requests;
+            defaults to ``EmbeddingBatchScheduler(max_batch_items=batch_size)``
+        :param client: OpenAI-compatible sync client (e.g. a fake for tests)
+        :param async_client: OpenAI-compatible async client
+        :param api_key: API key (defaults to ``OPENAI_API_KEY``)
+        :param base_url: API base URL, e.g. a local OpenAI-compatible server
+        :param dimensions: Request embeddings shortened to this many dimensions
+            (text-embedding-3 models only); None keeps the model's full size
 
-        if self.openai_api_key is None:
+        Clients that are not passed in are created on first use.
+        """
+        self.openai_api_key = get_api_key(api_key) if client is None or async_client is None else api_key
+        if self.openai_api_key is None and (client is None or async_client is None):
             raise ValueError(
                 "OPENAI_API_KEY environment variable is not set. Please set it to your OpenAI API key."
             )
+        self.base_url = base_url
+        self.async_client = async_client
+        self.client = client
+
+        if dimensions is not None and dimensions < 1:
+            raise ValueError("dimensions must be a positive integer")
         self.embeddings_model_name = embeddings_model_name
+        self.dimensions = dimensions
+        # Older models reject the parameter, so it is only sent when set.
+        self._options = {} if dimensions is None else {"dimensions": dimensions}
         self.batch_size = batch_size
+        self.cache = cache
+        self.scheduler = scheduler or EmbeddingBatchScheduler(max_batch_items=batch_size)
+
+    def _record_response(self, response, batch_size: int) -> None:
+        metrics.observe("embedding.batch_size", batch_size, model=self.embeddings_model_name)
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            metrics.increment("embedding.tokens", usage.total_tokens, model=self.embeddings_model_name)
+
+    def _cache_key(self, text: str) -> str:
+        return embedding_cache_key(self.embeddings_model_name, self.dimensions, text)
+
+    def _split_cached(self, list_of_text: List[str]) -> Tuple[List[str], Dict[str, np.ndarray], List[str]]:
+        """Returns (cache keys, cached vectors by key, distinct texts that missed)."""
+        keys = [self._cache_key(text) for text in list_of_text]
+        cached = self.cache.get_many(list(dict.fromkeys(keys)))
+        missing = list(dict.fromkeys(text for text, key in zip(list_of_text, keys) if key not in cached))
+        metrics.increment("embedding.cache_hits", len(keys) - len(missing), model=self.embeddings_model_name)
+        metrics.increment("embedding.cache_misses", len(missing), model=self.embeddings_model_name)
+        return keys, cached, missing
+
+    def _merge_cached(
+        self,
+        keys: List[str],
+        cached: Dict[str, np.ndarray],
+        missing: List[str],
+        embeddings: List[List[float]],
+    ) -> List[List[float]]:
+        fresh = {
+            self._cache_key(text): np.asarray(embedding, dtype=np.float32)
+            for text, embedding in zip(missing, embeddings)
+        }
+        self.cache.put_many(fresh)
+        cached.update(fresh)
+        return [cached[key].tolist() for key in keys]
 
     async def async_get_embeddings(self, list_of_text: List[str]) -> List[List[float]]:
-        batches = [list_of_text[i:i + self.batch_size] for i in range(0, len(list_of_text), self.batch_size)]
-        
-        async def process_batch(batch):
-            embedding_response = await self.async_client.embeddings.create(
-                input=batch, model=self.embeddings_model_name
-            )
+        with metrics.span("embedding.get_embeddings", model=self.embeddings_model_name):
+            if self.cache is None:
+                return await self._async_embed(list_of_text)
+            keys, cached, missing = self._split_cached(list_of_text)
+            embeddings = await self._async_embed(missing) if missing else []
+            return self._merge_cached(keys, cached, missing, embeddings)
+
+    async def _async_embed(self, list_of_text: List[str]) -> List[List[float]]:
+        async def process_batch(batch: List[str]) -> List[List[float]]:
+            with metrics.span("embedding.request", model=self.embeddings_model_name):
+                embedding_response = await self.async_client.embeddings.create(
+                    input=batch, model=self.embeddings_model_name, **self._options
+                )
+            self._record_response(embedding_response, len(batch))
             return [embeddings.embedding for embeddings in embedding_response.data]
-        
-        # Use asyncio.gather to process all batches concurrently
-        results = await asyncio.gather(*[process_batch(batch) for batch in batches])
-        
-        # Flatten the results
-        return [embedding for batch_result in results for embedding in batch_result]
+
+        return await self.scheduler.arun(list_of_text, process_batch)
 
     async def async_get_embedding(self, text: str) -> List[float]:
-        embedding = await self.async_client.embeddings.create(
-            input=text, model=self.embeddings_model_name
-        )
+        if self.cache is not None:
+            return (await self.async_get_embeddings([text]))[0]
+        with metrics.span("embedding.request", model=self.embeddings_model_name):
+            embedding = await self.async_client.embeddings.create(
+                input=text, model=self.embeddings_model_name, **self._options
+            )
+        self._record_response(embedding, 1)
 
         return embedding.data[0].embedding
 
     def get_embeddings(self, list_of_text: List[str]) -> List[List[float]]:
-        embedding_response = self.client.embeddings.create(
-            input=list_of_text, model=self.embeddings_model_name
-        )
+        with metrics.span("embedding.get_embeddings", model=self.embeddings_model_name):
+            if self.cache is None:
+                return self._embed(list_of_text)
+            keys, cached, missing = self._split_cached(list_of_text)
+            embeddings = self._embed(missing) if missing else []
+            return self._merge_cached(keys, cached, missing, embeddings)
 
-        return [embeddings.embedding for embeddings in embedding_response.data]
+    def _embed(self, list_of_text: List[str]) -> List[List[float]]:
+        def process_batch(batch: List[str]) -> List[List[float]]:
+            with metrics.span("embedding.request", model=self.embeddings_model_name):
+                embedding_response = self.client.embeddings.create(
+                    input=batch, model=self.embeddings_model_name, **self._options
+                )
+            self._record_response(embedding_response, len(batch))
+            return [embeddings.embedding for embeddings in embedding_response.data]
+
+        return self.scheduler.run(list_of_text, process_batch)
 
     def get_embedding(self, text: str) -> List[float]:
-        embedding = self.client.embeddings.create(
-            input=text, model=self.embeddings_model_name
-        )
+        if self.cache is not None:
+            return self.get_embeddings([text])[0]
+        with metrics.span("embedding.request", model=self.embeddings_model_name):
+            embedding = self.client.embeddings.create(
+                input=text, model=self.embeddings_model_name, **self._options
+            )
+        self._record_response(embedding, 1)
 
         return embedding.data[0].embedding
 
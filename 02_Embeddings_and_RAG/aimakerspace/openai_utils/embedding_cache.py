@@ -0,0 +1,177 @@
+import hashlib
+import sqlite3
+import threading
+import time
+import numpy as np
+from typing import Dict, Iterable, List, Optional
+from aimakerspace.cache import LRUCache
+
+
+def embedding_cache_key(model_name: str, dimensions: Optional[int], text: str) -> str:
+    """Content address of an embedding: a hash of (model name, dimensions, text)."""
+    digest = hashlib.sha256()
+    digest.update(f"{model_name}\0{dimensions}\0".encode("utf-8"))
+    digest.update(text.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class SQLiteEmbeddingStore:
+    def __init__(self, path: str, max_bytes: Optional[int] = None, access_flush_interval: float = 60.0):
+        """
+        Persistent embedding store backed by a single SQLite file.
+
+        Vectors are stored as float32 blobs. When ``max_bytes`` is set, the least
+        recently accessed embeddings are deleted after each write that exceeds it.
+        Reads do not write: access times are kept in memory and written with the
+        next ``put_many``, on ``close``, or once ``access_flush_interval`` seconds
+        have passed since the last flush.
+
+        :param path: SQLite database file (created if missing)
+        :param max_bytes: Upper bound on the total size of stored vectors
+        :param access_flush_interval: Longest time (seconds) read access times
+            stay in memory only; 0 writes them on every read
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.access_flush_interval = access_flush_interval
+        self._lock = threading.Lock()
+        self._accessed: Dict[str, float] = {}
+        self._last_flush = time.monotonic()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, "
+            "nbytes INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings (last_access)"
+        )
+        self._connection.commit()
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        found = {}
+        with self._lock:
+            # SQLite limits the number of bound parameters per statement.
+            for start in range(0, len(keys), 500):
+                chunk = keys[start : start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._connection.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                found.update({key: np.frombuffer(blob, dtype=np.float32) for key, blob in rows})
+            if found:
+                now = time.time()
+                self._accessed.update(dict.fromkeys(found, now))
+                if time.monotonic() - self._last_flush >= self.access_flush_interval:
+                    self._flush_accesses()
+                    self._connection.commit()
+        return found
+
+    def _flush_accesses(self) -> None:
+        """Writes the buffered access times; the caller commits."""
+        if self._accessed:
+            self._connection.executemany(
+                "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                [(accessed, key) for key, accessed in self._accessed.items()],
+            )
+            self._accessed = {}
+        self._last_flush = time.monotonic()
+
+    def put_many(self, items: Dict[str, np.ndarray]) -> None:
+        now = time.time()
+        rows = []
+        for key, vector in items.items():
+            blob = np.asarray(vector, dtype=np.float32).tobytes()
+            rows.append((key, blob, len(blob), now))
+        with self._lock:
+            # Eviction below must see current access times.
+            for key in items:
+                self._accessed.pop(key, None)
+            self._flush_accesses()
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, nbytes, last_access) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            if self.max_bytes is not None:
+                self._evict()
+            self._connection.commit()
+
+    def _evict(self) -> None:
+        total = self._connection.execute("SELECT COALESCE(SUM(nbytes), 0) FROM embeddings").fetchone()[0]
+        excess = total - self.max_bytes
+        if excess <= 0:
+            return
+        doomed, freed = [], 0
+        for key, nbytes in self._connection.execute(
+            "SELECT key, nbytes FROM embeddings ORDER BY last_access"
+        ):
+            doomed.append((key,))
+            freed += nbytes
+            if freed >= excess:
+                break
+        self._connection.executemany("DELETE FROM embeddings WHERE key = ?", doomed)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush_accesses()
+            self._connection.commit()
+            self._connection.close()
+
+
+class EmbeddingCache:
+    def __init__(self, max_memory_items: int = 100_000, store: Optional[SQLiteEmbeddingStore] = None):
+        """
+        Two-tier embedding cache: an in-memory LRU in front of an optional
+        persistent store. Entries found on disk are promoted into memory.
+
+        :param max_memory_items: Capacity of the in-memory LRU tier
+        :param store: Optional persistent store, e.g. ``SQLiteEmbeddingStore``
+        """
+        self.memory = LRUCache(max_memory_items)
+        self.store = store
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, np.ndarray]:
+        found = {}
+        missing = []
+        for key in keys:
+            vector = self.memory.get(key)
+            if vector is None:
+                missing.append(key)
+            else:
+                found[key] = vector
+        self.memory_hits += len(found)
+        if missing and self.store is not None:
+            from_disk = self.store.get_many(missing)
+            for key, vector in from_disk.items():
+                self.memory.put(key, vector)
+            found.update(from_disk)
+            self.disk_hits += len(from_disk)
+            self.misses += len(missing) - len(from_disk)
+        else:
+            self.misses += len(missing)
+        return found
+
+    def put_many(self, items: Dict[str, np.ndarray]) -> None:
+        items = {key: np.asarray(vector, dtype=np.float32) for key, vector in items.items()}
+        for key, vector in items.items():
+            self.memory.put(key, vector)
+        if self.store is not None and items:
+            self.store.put_many(items)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "memory_size": len(self.memory),
+            "memory_evictions": self.memory.evictions,
+        }
@@ -0,0 +1,352 @@
+import asyncio
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Union
+import numpy as np
+
+
+class FakeAPIError(Exception):
+    """Stand-in for an OpenAI HTTP error; carries the same ``status_code`` attribute."""
+
+    def __init__(self, status_code: int, message: str = ""):
+        super().__init__(message or f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def fake_embedding(text: str, dimensions: int = 1536) -> List[float]:
+    """Deterministic unit vector derived from a hash of ``text``."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimensions)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def fake_chat_reply(messages: List[Dict[str, Any]]) -> str:
+    """Deterministic assistant reply that quotes the last user message."""
+    question = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "")
+    return f"Fake answer to: {question[:200]}"
+
+
+def split_tokens(text: str) -> List[str]:
+    """Splits a reply into word-sized stream deltas that join back to ``text``."""
+    return re.findall(r"\S+\s*|\s+", text)
+
+
+def _completion_usage(messages: List[Dict[str, Any]], reply: str) -> Dict[str, int]:
+    prompt_tokens = sum(len(str(m.get("content", ""))) // 4 + 1 for m in messages)
+    completion_tokens = len(split_tokens(reply))
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+def _completion(model: str, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+    reply = fake_chat_reply(messages)
+    return {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [
+            {"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}
+        ],
+        "usage": _completion_usage(messages, reply),
+    }
+
+
+def _completion_chunks(model: str, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    chunks = [{"role": "assistant", "content": token} for token in split_tokens(fake_chat_reply(messages))]
+    chunks.append({})
+    return [
+        {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": None if delta else "stop"}],
+        }
+        for delta in chunks
+    ]
+
+
+def _namespace(value: Any) -> Any:
+    """Attribute access over the JSON-shaped dicts, like the SDK's response models."""
+    if isinstance(value, dict):
+        return SimpleNamespace(**{key: _namespace(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return [_namespace(item) for item in value]
+    return value
+
+
+def _chunk(chunk: Dict[str, Any]) -> SimpleNamespace:
+    chunk = _namespace(chunk)
+    for choice in chunk.choices:
+        choice.delta.content = getattr(choice.delta, "content", None)
+    return chunk
+
+
+class _FakeChatCompletions:
+    def __init__(self, owner: "FakeOpenAIClient"):
+        self._owner = owner
+
+    def _stream(self, model: str, messages: List[Dict[str, Any]]):
+        for i, chunk in enumerate(_completion_chunks(model, messages)):
+            if i:
+                time.sleep(self._owner.token_latency)
+            yield _chunk(chunk)
+
+    def create(self, model: str, messages: List[Dict[str, Any]], stream: bool = False, **kwargs):
+        self._owner._before_request(messages)
+        try:
+            time.sleep(self._owner.latency)
+        finally:
+            self._owner._after_request()
+        if stream:
+            return self._stream(model, messages)
+        return _namespace(_completion(model, messages))
+
+
+class _FakeAsyncChatCompletions(_FakeChatCompletions):
+    async def _astream(self, model: str, messages: List[Dict[str, Any]]):
+        for i, chunk in enumerate(_completion_chunks(model, messages)):
+            if i:
+                await asyncio.sleep(self._owner.token_latency)
+            yield _chunk(chunk)
+
+    async def create(self, model: str, messages: List[Dict[str, Any]], stream: bool = False, **kwargs):
+        self._owner._before_request(messages)
+        try:
+            await asyncio.sleep(self._owner.latency)
+        finally:
+            self._owner._after_request()
+        if stream:
+            return self._astream(model, messages)
+        return _namespace(_completion(model, messages))
+
+
+class _FakeEmbeddings:
+    def __init__(self, owner: "FakeOpenAIClient"):
+        self._owner = owner
+
+    def _respond(self, input: Union[str, List[str]], model: str, dimensions: Optional[int]):
+        texts = [input] if isinstance(input, str) else list(input)
+        dimensions = dimensions or self._owner.dimensions
+        data = [
+            SimpleNamespace(index=i, embedding=fake_embedding(text, dimensions), object="embedding")
+            for i, text in enumerate(texts)
+        ]
+        tokens = sum(len(text) // 4 + 1 for text in texts)
+        return SimpleNamespace(
+            data=data, model=model, usage=SimpleNamespace(prompt_tokens=tokens, total_tokens=tokens)
+        )
+
+    def create(self, input, model: str, dimensions: Optional[int] = None, **kwargs):
+        self._owner._before_request(input)
+        try:
+            time.sleep(self._owner.latency)
+        finally:
+            self._owner._after_request()
+        return self._respond(input, model, dimensions)
+
+
+class _FakeAsyncEmbeddings(_FakeEmbeddings):
+    async def create(self, input, model: str, dimensions: Optional[int] = None, **kwargs):
+        self._owner._before_request(input)
+        try:
+            await asyncio.sleep(self._owner.latency)
+        finally:
+            self._owner._after_request()
+        return self._respond(input, model, dimensions)
+
+
+class FakeOpenAIClient:
+    def __init__(
+        self,
+        dimensions: int = 1536,
+        latency: float = 0.0,
+        rate_limit_probability: float = 0.0,
+        seed: int = 0,
+        token_latency: float = 0.0,
+    ):
+        """
+        In-process replacement for ``OpenAI().embeddings`` and
+        ``OpenAI().chat.completions`` with deterministic hash-based embeddings,
+        canned chat replies, injectable latency and random HTTP 429 failures.
+
+        :param dimensions: Default embedding dimension
+        :param latency: Seconds each request takes (time to first token for streams)
+        :param rate_limit_probability: Chance that a request fails with HTTP 429
+        :param seed: Seed for the failure injection
+        :param token_latency: Seconds between streamed chat deltas
+        """
+        self.dimensions = dimensions
+        self.latency = latency
+        self.token_latency = token_latency
+        self.rate_limit_probability = rate_limit_probability
+        self.requests = 0
+        self.rate_limited = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.embeddings = _FakeEmbeddings(self)
+        self.chat = SimpleNamespace(completions=_FakeChatCompletions(self))
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _before_request(self, input) -> None:
+        with self._lock:
+            self.requests += 1
+            if self._random.random() < self.rate_limit_probability:
+                self.rate_limited += 1
+                raise FakeAPIError(429, "Rate limit reached")
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def _after_request(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+
+class FakeAsyncOpenAIClient(FakeOpenAIClient):
+    """Async counterpart of ``FakeOpenAIClient`` (``AsyncOpenAI().embeddings``)."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.embeddings = _FakeAsyncEmbeddings(self)
+        self.chat = SimpleNamespace(completions=_FakeAsyncChatCompletions(self))
+
+
+class _FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "ThreadingHTTPServer"
+
+    def setup(self) -> None:
+        super().setup()
+        # One handler instance serves one TCP connection, for all its requests.
+        self.server.fake._count("connections")
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+    def _send_json(self, status: int, body: Dict[str, Any]) -> None:
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_stream(self, chunks: List[Dict[str, Any]]) -> None:
+        fake = self.server.fake
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        events = [f"data: {json.dumps(chunk)}\n\n" for chunk in chunks] + ["data: [DONE]\n\n"]
+        try:
+            for i, event in enumerate(events):
+                if i and fake.token_latency:
+                    time.sleep(fake.token_latency)
+                data = event.encode("utf-8")
+                self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client closed the stream before the end, as a real client may.
+            self.close_connection = True
+
+    def do_POST(self) -> None:
+        fake = self.server.fake
+        fake._count("requests")
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if fake.latency:
+            time.sleep(fake.latency)
+        if self.path.endswith("/chat/completions"):
+            if body.get("stream"):
+                self._send_stream(_completion_chunks(body["model"], body["messages"]))
+            else:
+                self._send_json(200, _completion(body["model"], body["messages"]))
+        elif self.path.endswith("/embeddings"):
+            texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+            dimensions = body.get("dimensions") or fake.dimensions
+            data = [
+                {"object": "embedding", "index": i, "embedding": fake_embedding(text, dimensions)}
+                for i, text in enumerate(texts)
+            ]
+            tokens = sum(len(text) // 4 + 1 for text in texts)
+            self._send_json(
+                200,
+                {
+                    "object": "list",
+                    "data": data,
+                    "model": body["model"],
+                    "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+                },
+            )
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "not_found"}})
+
+
+class FakeOpenAIServer:
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        token_latency: float = 0.0,
+        dimensions: int = 1536,
+    ):
+        """
+        Local OpenAI-compatible HTTP server for ``/v1/chat/completions`` (including
+        server-sent-event streaming) and ``/v1/embeddings``, so real SDK clients
+        can be exercised end to end with ``base_url=server.url``.
+
+        Use it as a context manager, or call ``start`` and ``stop``.
+
+        :param port: Port to listen on (0 picks a free one)
+        :param latency: Seconds before each response starts
+        :param token_latency: Seconds between streamed chat deltas
+        :param dimensions: Default embedding dimension
+        """
+        self.latency = latency
+        self.token_latency = token_latency
+        self.dimensions = dimensions
+        self.requests = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), _FakeOpenAIHandler)
+        self._server.daemon_threads = True
+        self._server.fake = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def start(self) -> "FakeOpenAIServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "FakeOpenAIServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
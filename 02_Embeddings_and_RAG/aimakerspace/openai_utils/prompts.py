@@ -1,5 +1,6 @@
+import operator
 import re
-from typing import Dict, List, Any, Optional, Union, Callable
+from typing import Dict, Iterable, List, Any, Optional, Tuple, Union, Callable
 from abc import ABC, abstractmethod
 
 
@@ -8,6 +9,69 @@ class PromptValidationError(Exception):
     pass
 
 
+VARIABLE_PATTERN = re.compile(r'\{([^{}]+)\}')
+CONDITIONAL_PATTERN = re.compile(r'\{if\s+([^}]+)\}(.*?)(?:\{else\}(.*?))?\{/if\}', re.DOTALL)
+COMPARISONS = {
+    '>=': operator.ge,
+    '<=': operator.le,
+    '!=': operator.ne,
+    '>': operator.gt,
+    '<': operator.lt,
+}
+
+
+def _split_variables(text: str) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    """Splits text into literals and variable names: literal, variable, literal, ..."""
+    pieces = VARIABLE_PATTERN.split(text)
+    return tuple(pieces[0::2]), tuple(pieces[1::2])
+
+
+def _render(literals: Tuple[str, ...], variables: Tuple[str, ...], context: Dict[str, Any], out: List[str]) -> None:
+    out.append(literals[0])
+    for variable, literal in zip(variables, literals[1:]):
+        out.append(str(context.get(variable, "")))
+        out.append(literal)
+
+
+def compile_condition(condition: str) -> Callable[[Dict[str, Any]], bool]:
+    """
+    Compiles a ``{if ...}`` condition into a function of the template context.
+
+    Supported forms are a bare variable (truthiness), ``var == value`` (string
+    comparison) and ``var > 5``-style numeric comparisons with ``>``, ``<``,
+    ``>=``, ``<=`` and ``!=``. A context key equal to the whole condition wins.
+    """
+    def evaluate(test: Callable[[Dict[str, Any]], bool]) -> Callable[[Dict[str, Any]], bool]:
+        def evaluator(context: Dict[str, Any]) -> bool:
+            if condition in context:
+                return bool(context[condition])
+            try:
+                return test(context)
+            except Exception:
+                return False
+        return evaluator
+
+    if '==' in condition:
+        parts = condition.split('==')
+        if len(parts) == 2:
+            left = parts[0].strip()
+            right = parts[1].strip().strip('"').strip("'")
+            return evaluate(lambda context: str(context.get(left, "")) == right)
+
+    for symbol, compare in COMPARISONS.items():
+        if symbol in condition:
+            parts = condition.split(symbol)
+            if len(parts) == 2:
+                left = parts[0].strip()
+                try:
+                    right = float(parts[1].strip())
+                except ValueError:
+                    return evaluate(lambda context: False)
+                return evaluate(lambda context: compare(float(context.get(left, 0)), right))
+
+    return evaluate(lambda context: bool(context.get(condition, False)))
+
+
 class ConditionalPrompt:
     """Enhanced prompt with conditional logic support"""
     
@@ -19,6 +83,10 @@ class ConditionalPrompt:
         - {if condition}content{/if}
         - {if condition}content{else}alternative{/if}
         - Standard variables: {variable_name}
+
+        The template is parsed once into literal text, variables and conditional
+        blocks with precompiled condition evaluators, so formatting is a single
+        pass that never re-scans substituted values.
         
         :param prompt: Template string with conditional logic
         :param strict: If True, raises error when required variables are missing
@@ -27,83 +95,79 @@ class ConditionalPrompt:
         self.prompt = prompt
         self.strict = strict
         self.defaults = defaults or {}
-        self._var_pattern = re.compile(r'\{([^{}]+)\}')
-        self._conditional_pattern = re.compile(r'\{if\s+([^}]+)\}(.*?)(?:\{else\}(.*?))?\{/if\}', re.DOTALL)
-        
-    def format_prompt(self, **kwargs) -> str:
-        """Format prompt with conditional logic evaluation"""
-        merged_kwargs = {**self.defaults, **kwargs}
-        
-        # Process conditional statements
-        result = self._process_conditionals(self.prompt, merged_kwargs)
-        
-        # Process regular variables
-        variables = self._var_pattern.findall(result)
-        
+        self._var_pattern = VARIABLE_PATTERN
+        self._conditional_pattern = CONDITIONAL_PATTERN
+
+    @property
+    def prompt(self) -> str:
+        return self._prompt
+
+    @prompt.setter
+    def prompt(self, prompt: str) -> None:
+        self._prompt = prompt
+        self._segments = self._compile(prompt)
+
+    @staticmethod
+    def _compile(prompt: str) -> List[tuple]:
+        """Parses the template into ``(literals, variables)`` and conditional segments."""
+        segments = []
+        position = 0
+        for match in CONDITIONAL_PATTERN.finditer(prompt):
+            segments.append(_split_variables(prompt[position:match.start()]))
+            true_content = match.group(2).strip()
+            false_content = match.group(3).strip() if match.group(3) else ""
+            segments.append((
+                compile_condition(match.group(1).strip()),
+                _split_variables(true_content),
+                _split_variables(false_content),
+            ))
+            position = match.end()
+        segments.append(_split_variables(prompt[position:]))
+        return segments
+
+    def _format(self, context: Dict[str, Any]) -> str:
+        out: List[str] = []
+        used: List[str] = []
+        for segment in self._segments:
+            if len(segment) == 3:
+                condition, true_parts, false_parts = segment
+                segment = true_parts if condition(context) else false_parts
+            _render(segment[0], segment[1], context, out)
+            if self.strict:
+                used.extend(segment[1])
         if self.strict:
-            missing_vars = set(variables) - set(merged_kwargs.keys())
+            missing_vars = set(used) - set(context.keys())
             if missing_vars:
                 raise PromptValidationError(f"Missing required variables: {missing_vars}")
+        return "".join(out)
         
-        # Format remaining variables
-        for var in variables:
-            value = merged_kwargs.get(var, "")
-            result = result.replace(f"{{{var}}}", str(value))
-            
-        return result
+    def format_prompt(self, **kwargs) -> str:
+        """Format prompt with conditional logic evaluation"""
+        return self._format({**self.defaults, **kwargs})
+
+    def format_many(self, contexts: Iterable[Dict[str, Any]]) -> List[str]:
+        """
+        Formats the template once per context dict.
+
+        :param contexts: Variable values for each prompt
+        :return: The formatted prompts, in order
+        """
+        defaults = self.defaults
+        return [self._format({**defaults, **context}) for context in contexts]
     
     def _process_conditionals(self, text: str, context: Dict[str, Any]) -> str:
         """Process conditional statements in the text"""
         def replace_conditional(match):
-            condition = match.group(1).strip()
+            condition = compile_condition(match.group(1).strip())
             true_content = match.group(2).strip()
             false_content = match.group(3).strip() if match.group(3) else ""
-            
-            # Evaluate condition
-            try:
-                # Simple evaluation - check if variable exists and is truthy
-                if condition in context:
-                    condition_result = bool(context[condition])
-                else:
-                    # Try to evaluate as a simple expression
-                    condition_result = self._evaluate_condition(condition, context)
-                
-                return true_content if condition_result else false_content
-            except Exception:
-                return false_content
+            return true_content if condition(context) else false_content
         
-        return self._conditional_pattern.sub(replace_conditional, text)
+        return CONDITIONAL_PATTERN.sub(replace_conditional, text)
     
     def _evaluate_condition(self, condition: str, context: Dict[str, Any]) -> bool:
         """Evaluate simple conditions like 'var > 5' or 'var == "value"'"""
-        # Simple equality check
-        if '==' in condition:
-            parts = condition.split('==')
-            if len(parts) == 2:
-                left = parts[0].strip()
-                right = parts[1].strip().strip('"').strip("'")
-                return str(context.get(left, "")) == right
-        
-        # Simple comparison
-        for op in ['>', '<', '>=', '<=', '!=']:
-            if op in condition:
-                parts = condition.split(op)
-                if len(parts) == 2:
-                    left = parts[0].strip()
-                    right = parts[1].strip()
-                    try:
-                        left_val = float(context.get(left, 0))
-                        right_val = float(right)
-                        if op == '>': return left_val > right_val
-                        elif op == '<': return left_val < right_val
-                        elif op == '>=': return left_val >= right_val
-                        elif op == '<=': return left_val <= right_val
-                        elif op == '!=': return left_val != right_val
-                    except (ValueError, TypeError):
-                        return False
-        
-        # Default: check if variable exists and is truthy
-        return bool(context.get(condition, False))
+        return compile_condition(condition)(context)
 
 
 class BasePrompt:
@@ -111,55 +175,79 @@ class BasePrompt:
         """
         Initializes the BasePrompt object with a prompt template.
 
+        The input variables are extracted once, when the template is set.
+
         :param prompt: A string that can contain placeholders within curly braces
         :param strict: If True, raises error when required variables are missing
         :param defaults: Default values for template variables
         """
+        self._pattern = re.compile(r"\{([^}]+)\}")
         self.prompt = prompt
         self.strict = strict
         self.defaults = defaults or {}
-        self._pattern = re.compile(r"\{([^}]+)\}")
         self._validate_template()
 
+    @property
+    def prompt(self) -> str:
+        return self._prompt
+
+    @prompt.setter
+    def prompt(self, prompt: str) -> None:
+        self._prompt = prompt
+        self._variables = self._pattern.findall(prompt)
+        self._unique_variables = tuple(dict.fromkeys(self._variables))
+        self._required = frozenset(self._variables)
+
     def _validate_template(self) -> None:
         """Validates the template syntax"""
         try:
-            test_vars = {var: "test" for var in self.get_input_variables()}
+            test_vars = {var: "test" for var in self._unique_variables}
             self.prompt.format(**test_vars)
         except (KeyError, ValueError) as e:
             raise PromptValidationError(f"Invalid template syntax: {e}")
 
-    def format_prompt(self, **kwargs) -> str:
-        """
-        Formats the prompt string using the keyword arguments provided.
-
-        :param kwargs: The values to substitute into the prompt string
-        :return: The formatted prompt string
-        :raises PromptValidationError: If strict mode and required variables are missing
-        """
-        variables = self.get_input_variables()
-        merged_kwargs = {**self.defaults, **kwargs}
-        
+    def _format(self, merged_kwargs: Dict[str, Any]) -> str:
         if self.strict:
-            missing_vars = set(variables) - set(merged_kwargs.keys())
+            missing_vars = self._required - merged_kwargs.keys()
             if missing_vars:
-                raise PromptValidationError(f"Missing required variables: {missing_vars}")
+                raise PromptValidationError(f"Missing required variables: {set(missing_vars)}")
         
         # Use defaults for missing variables
-        format_dict = {var: merged_kwargs.get(var, self.defaults.get(var, "")) for var in variables}
+        format_dict = {var: merged_kwargs.get(var, "") for var in self._unique_variables}
         
         try:
-            return self.prompt.format(**format_dict)
+            return self._prompt.format_map(format_dict)
         except (KeyError, ValueError) as e:
             raise PromptValidationError(f"Error formatting prompt: {e}")
 
+    def format_prompt(self, **kwargs) -> str:
+        """
+        Formats the prompt string using the keyword arguments provided.
+
+        :param kwargs: The values to substitute into the prompt string
+        :return: The formatted prompt string
+        :raises PromptValidationError: If strict mode and required variables are missing
+        """
+        return self._format({**self.defaults, **kwargs})
+
+    def format_many(self, contexts: Iterable[Dict[str, Any]]) -> List[str]:
+        """
+        Formats the prompt once per context dict, e.g. one per retrieved context.
+
+        :param contexts: Variable values for each prompt
+        :return: The formatted prompt strings, in order
+        :raises PromptValidationError: If strict mode and required variables are missing
+        """
+        defaults = self.defaults
+        return [self._format({**defaults, **context}) for context in contexts]
+
     def get_input_variables(self) -> List[str]:
         """
         Gets the list of input variable names from the prompt string.
 
         :return: List of input variable names
         """
-        return self._pattern.findall(self.prompt)
+        return list(self._variables)
     
     def validate_inputs(self, **kwargs) -> Dict[str, List[str]]:
         """
@@ -168,7 +256,7 @@ class BasePrompt:
         :param kwargs: Variables to validate
         :return: Dict with 'missing' and 'extra' keys containing respective variable names
         """
-        required_vars = set(self.get_input_variables())
+        required_vars = set(self._required)
         provided_vars = set(kwargs.keys())
         
         return {
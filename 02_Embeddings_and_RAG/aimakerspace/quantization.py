@@ -0,0 +1,316 @@
+import numpy as np
+from typing import Dict, List, Optional
+from aimakerspace.ann import kmeans, recall_at_k
+
+
+class ScalarQuantizer:
+    """Per-dimension int8 codes: 1 byte per dimension instead of 4."""
+
+    def __init__(self):
+        self.offset: Optional[np.ndarray] = None
+        self.scale: Optional[np.ndarray] = None
+
+    @property
+    def is_trained(self) -> bool:
+        return self.scale is not None
+
+    @property
+    def nbytes(self) -> int:
+        return 0 if not self.is_trained else self.offset.nbytes + self.scale.nbytes
+
+    def code_size(self, dim: int) -> int:
+        return dim
+
+    def config(self) -> Dict[str, object]:
+        return {"kind": "int8"}
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        return {"offset": self.offset, "scale": self.scale}
+
+    def set_arrays(self, offset: np.ndarray, scale: np.ndarray) -> None:
+        self.offset, self.scale = offset, scale
+
+    def train(self, vectors: np.ndarray) -> None:
+        low = vectors.min(axis=0)
+        high = vectors.max(axis=0)
+        self.scale = np.maximum(high - low, 1e-12).astype(np.float32) / 255.0
+        self.offset = (low + 128.0 * self.scale).astype(np.float32)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        codes = np.rint((vectors - self.offset) / self.scale)
+        return np.clip(codes, -128, 127).astype(np.int8)
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return codes.astype(np.float32) * self.scale + self.offset
+
+    def scores(self, query: np.ndarray, codes: np.ndarray, chunk_size: int = 65536) -> np.ndarray:
+        """Asymmetric inner products: the float query against int8 codes."""
+        weighted = query * self.scale
+        bias = float(query @ self.offset)
+        scores = np.empty(codes.shape[0], dtype=np.float32)
+        for start in range(0, codes.shape[0], chunk_size):
+            block = codes[start : start + chunk_size].astype(np.float32)
+            scores[start : start + chunk_size] = block @ weighted + bias
+        return scores
+
+
+class ProductQuantizer:
+    def __init__(self, n_subvectors: int = 16, n_centroids: int = 256, n_iter: int = 20, seed: int = 0):
+        """
+        Splits each vector into ``n_subvectors`` slices and stores the id of the
+        nearest of ``n_centroids`` per-slice centroids, so a vector costs
+        ``n_subvectors`` bytes.
+
+        :param n_subvectors: Number of slices; must divide the vector dimension
+        :param n_centroids: Centroids per slice (at most 256, codes are uint8)
+        :param n_iter: k-means iterations per slice
+        :param seed: Seed for k-means initialization
+        """
+        if not 1 <= n_centroids <= 256:
+            raise ValueError("n_centroids must be between 1 and 256")
+        self.n_subvectors = n_subvectors
+        self.n_centroids = n_centroids
+        self.n_iter = n_iter
+        self.seed = seed
+        self.codebooks: Optional[np.ndarray] = None
+
+    @property
+    def is_trained(self) -> bool:
+        return self.codebooks is not None
+
+    @property
+    def nbytes(self) -> int:
+        return 0 if not self.is_trained else self.codebooks.nbytes
+
+    def code_size(self, dim: int) -> int:
+        return self.n_subvectors
+
+    def config(self) -> Dict[str, object]:
+        return {
+            "kind": "pq",
+            "n_subvectors": self.n_subvectors,
+            "n_centroids": self.n_centroids,
+            "n_iter": self.n_iter,
+            "seed": self.seed,
+        }
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        return {"codebooks": self.codebooks}
+
+    def set_arrays(self, codebooks: np.ndarray) -> None:
+        self.codebooks = codebooks
+
+    def _split(self, vectors: np.ndarray) -> np.ndarray:
+        n, dim = vectors.shape
+        if dim % self.n_subvectors:
+            raise ValueError(f"Dimension {dim} is not divisible by n_subvectors={self.n_subvectors}")
+        return vectors.reshape(n, self.n_subvectors, dim // self.n_subvectors)
+
+    def train(self, vectors: np.ndarray) -> None:
+        slices = self._split(np.asarray(vectors, dtype=np.float32))
+        codebooks = [
+            kmeans(np.ascontiguousarray(slices[:, m]), self.n_centroids, self.n_iter, self.seed, spherical=False)
+            for m in range(self.n_subvectors)
+        ]
+        # Pad so every slice has exactly n_centroids entries even for tiny training sets.
+        size = max(codebook.shape[0] for codebook in codebooks)
+        self.codebooks = np.stack([np.resize(codebook, (size, codebook.shape[1])) for codebook in codebooks])
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        slices = self._split(np.asarray(vectors, dtype=np.float32))
+        codes = np.empty((slices.shape[0], self.n_subvectors), dtype=np.uint8)
+        for m in range(self.n_subvectors):
+            codebook = self.codebooks[m]
+            distances = (
+                np.einsum("ij,ij->i", codebook, codebook)[None, :] - 2.0 * slices[:, m] @ codebook.T
+            )
+            codes[:, m] = np.argmin(distances, axis=1)
+        return codes
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        parts = self.codebooks[np.arange(self.n_subvectors), codes.astype(np.int64)]
+        return parts.reshape(codes.shape[0], -1)
+
+    def scores(self, query: np.ndarray, codes: np.ndarray, chunk_size: int = 65536) -> np.ndarray:
+        """Asymmetric distance computation via a per-query lookup table."""
+        lookup = np.einsum("mcd,md->mc", self.codebooks, query.reshape(self.n_subvectors, -1))
+        subvectors = np.arange(self.n_subvectors)
+        scores = np.empty(codes.shape[0], dtype=np.float32)
+        for start in range(0, codes.shape[0], chunk_size):
+            block = codes[start : start + chunk_size]
+            scores[start : start + chunk_size] = lookup[subvectors, block].sum(axis=1)
+        return scores
+
+
+class TruncatedQuantizer:
+    def __init__(self, dim: int = 256, dtype: str = "float32", input_dim: Optional[int] = None):
+        """
+        Matryoshka-style coarse vectors: the first ``dim`` components of each
+        vector, renormalized. Models trained with Matryoshka representation
+        learning (e.g. OpenAI text-embedding-3) keep most of their ranking quality
+        in their prefixes, so a prefix scan finds the candidates that the full
+        vectors then rescore. Needs no training.
+
+        :param dim: Number of leading dimensions kept
+        :param dtype: Storage type of the prefixes, ``"float32"`` or ``"float16"``
+        :param input_dim: Dimension of the full vectors (recorded on first encode)
+        """
+        if dim < 1:
+            raise ValueError("dim must be a positive integer")
+        if np.dtype(dtype) not in (np.float32, np.float16):
+            raise ValueError("dtype must be float32 or float16")
+        self.dim = dim
+        self.dtype = np.dtype(dtype).name
+        self.input_dim = input_dim
+
+    @property
+    def is_trained(self) -> bool:
+        return True
+
+    @property
+    def nbytes(self) -> int:
+        return 0
+
+    def code_size(self, dim: int) -> int:
+        return min(self.dim, dim) * np.dtype(self.dtype).itemsize
+
+    def config(self) -> Dict[str, object]:
+        return {"kind": "truncate", "dim": self.dim, "dtype": self.dtype, "input_dim": self.input_dim}
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        return {}
+
+    def set_arrays(self) -> None:
+        pass
+
+    def train(self, vectors: np.ndarray) -> None:
+        self.input_dim = vectors.shape[1]
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self.input_dim = vectors.shape[1]
+        prefixes = vectors[:, : self.dim]
+        norms = np.linalg.norm(prefixes, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (prefixes / norms).astype(self.dtype)
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        """Prefixes zero-padded back to the input dimension (an approximation)."""
+        decoded = np.zeros((codes.shape[0], self.input_dim or codes.shape[1]), dtype=np.float32)
+        decoded[:, : codes.shape[1]] = codes
+        return decoded
+
+    def scores(self, query: np.ndarray, codes: np.ndarray, chunk_size: int = 65536) -> np.ndarray:
+        """Cosine similarities between the query prefix and the stored prefixes."""
+        prefix = np.asarray(query[: self.dim], dtype=np.float32)
+        norm = np.linalg.norm(prefix)
+        prefix = prefix / norm if norm else prefix
+        if codes.dtype == np.float32:
+            return codes @ prefix
+        scores = np.empty(codes.shape[0], dtype=np.float32)
+        for start in range(0, codes.shape[0], chunk_size):
+            scores[start : start + chunk_size] = codes[start : start + chunk_size].astype(np.float32) @ prefix
+        return scores
+
+
+def quantizer_from_config(config: Dict[str, object]):
+    """Rebuilds an untrained quantizer from the output of its ``config()``."""
+    params = dict(config)
+    kind = params.pop("kind")
+    if kind == "int8":
+        return ScalarQuantizer(**params)
+    if kind == "pq":
+        return ProductQuantizer(**params)
+    if kind == "truncate":
+        return TruncatedQuantizer(**params)
+    raise ValueError(f"Unknown quantizer kind: {kind}")
+
+
+def evaluate_quantizers(
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    quantizers: Dict[str, object],
+    k: int = 10,
+    rescore_factor: int = 4,
+) -> List[Dict[str, float]]:
+    """
+    Reports bytes per vector and recall@k for each quantizer, with and without
+    exact float rescoring of the top ``k * rescore_factor`` candidates.
+
+    :param vectors: (n, dim) normalized float32 vectors
+    :param queries: (n_queries, dim) normalized float32 queries
+    :param quantizers: Mapping of a display name to an untrained quantizer
+    """
+    n_candidates = min(k * rescore_factor, vectors.shape[0])
+    exact = [np.argpartition(vectors @ query, -k)[-k:].tolist() for query in queries]
+    report = [{"mode": "float32", "bytes_per_vector": vectors.shape[1] * 4, f"recall@{k}": 1.0}]
+
+    for name, quantizer in quantizers.items():
+        quantizer.train(vectors)
+        codes = quantizer.encode(vectors)
+        approximate, rescored = [], []
+        for query in queries:
+            scores = quantizer.scores(query, codes)
+            approximate.append(np.argpartition(scores, -k)[-k:].tolist())
+            candidates = np.argpartition(scores, -n_candidates)[-n_candidates:]
+            exact_scores = vectors[candidates] @ query
+            rescored.append(candidates[np.argpartition(exact_scores, -k)[-k:]].tolist())
+        report.append(
+            {
+                "mode": name,
+                "bytes_per_vector": quantizer.code_size(vectors.shape[1]),
+                f"recall@{k}": float(np.mean([recall_at_k(a, e) for a, e in zip(approximate, exact)])),
+                f"recall@{k}_rescored": float(np.mean([recall_at_k(r, e) for r, e in zip(rescored, exact)])),
+            }
+        )
+    return report
+
+
+if __name__ == "__main__":
+    from aimakerspace.vectordatabase import normalize_rows
+
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((200, 256))
+    data = normalize_rows(centers[rng.integers(0, 200, 20_000)] + 2.0 * rng.standard_normal((20_000, 256)))
+    queries = normalize_rows(centers[rng.integers(0, 200, 100)] + 2.0 * rng.standard_normal((100, 256)))
+
+    modes = {"int8": ScalarQuantizer(), "pq16": ProductQuantizer(16), "pq32": ProductQuantizer(32)}
+    for row in evaluate_quantizers(data, queries, modes, k=10):
+        print(row)
+
+    # Matryoshka embeddings concentrate information in their leading dimensions;
+    # a decaying per-dimension scale mimics that for 1536-dimensional vectors.
+    import time
+    from aimakerspace.openai_utils.fakes import FakeAsyncOpenAIClient, FakeOpenAIClient
+    from aimakerspace.openai_utils.embedding import EmbeddingModel
+    from aimakerspace.vectordatabase import VectorDatabase
+
+    n, dim, k = 50_000, 1536, 10
+    scale = 1.0 / np.sqrt(1.0 + np.arange(dim) / 16.0)
+    centers = rng.standard_normal((500, dim)) * scale
+    data = normalize_rows(centers[rng.integers(0, 500, n)] + 1.5 * rng.standard_normal((n, dim)) * scale)
+    queries = normalize_rows(centers[rng.integers(0, 500, 100)] + 1.5 * rng.standard_normal((100, dim)) * scale)
+    modes = {f"truncate{d}": TruncatedQuantizer(d) for d in (64, 128, 256, 512)}
+    for row in evaluate_quantizers(data, queries, modes, k=k, rescore_factor=10):
+        print(row)
+
+    embedding_model = EmbeddingModel(client=FakeOpenAIClient(), async_client=FakeAsyncOpenAIClient())
+    databases = {
+        "full": VectorDatabase(embedding_model),
+        "truncate128": VectorDatabase(embedding_model, quantizer=TruncatedQuantizer(128), rescore_factor=10),
+        "truncate256": VectorDatabase(embedding_model, quantizer=TruncatedQuantizer(256), rescore_factor=10),
+        "truncate256_only": VectorDatabase(
+            embedding_model, quantizer=TruncatedQuantizer(256), keep_full_vectors=False
+        ),
+    }
+    ids = [str(i) for i in range(n)]
+    exact = None
+    for name, database in databases.items():
+        database.insert_many(ids, data)
+        start = time.perf_counter()
+        results = [[key for key, _ in database.search(query, k, return_ids=True)] for query in queries]
+        elapsed = (time.perf_counter() - start) / len(queries)
+        exact = exact or results
+        recall = np.mean([recall_at_k(result, expected) for result, expected in zip(results, exact)])
+        megabytes = database.memory_usage()["total"] / 1e6
+        print(f"{name:>16}: {elapsed * 1e3:6.2f} ms/query, recall@{k} {recall:.3f}, {megabytes:.0f} MB")
@@ -0,0 +1,227 @@
+import asyncio
+import time
+from typing import Dict, List, Optional, Set, Tuple
+import numpy as np
+from aimakerspace import metrics
+from aimakerspace.openai_utils.chatmodel import ChatOpenAI
+from aimakerspace.openai_utils.prompts import SystemRolePrompt, UserRolePrompt
+from aimakerspace.vectordatabase import VectorDatabase
+
+RAG_SYSTEM_TEMPLATE = """You are a knowledgeable assistant that answers questions based strictly on provided context.
+
+Instructions:
+- Only answer questions using information from the provided context
+- If the context doesn't contain relevant information, respond with "I don't know"
+- Be accurate and cite specific parts of the context when possible
+- Keep responses {response_style} and {response_length}
+- Only use the provided context. Do not use external knowledge.
+- Only provide answers when you are confident the context supports your response."""
+
+RAG_USER_TEMPLATE = """Context Information:
+{context}
+
+Number of relevant sources found: {context_count}
+{similarity_scores}
+
+Question: {user_query}
+
+Please provide your answer based solely on the context above."""
+
+rag_system_prompt = SystemRolePrompt(
+    RAG_SYSTEM_TEMPLATE,
+    strict=True,
+    defaults={"response_style": "concise", "response_length": "brief"},
+)
+
+rag_user_prompt = UserRolePrompt(
+    RAG_USER_TEMPLATE,
+    strict=True,
+    defaults={"context_count": "", "similarity_scores": ""},
+)
+
+Contexts = List[Tuple[str, float]]
+
+
+class QueryBatcher:
+    def __init__(self, vector_db: VectorDatabase, batch_window: float = 0.005, max_batch_size: int = 64):
+        """
+        Coalesces concurrent retrievals into batches. Queries arriving within
+        ``batch_window`` seconds of the first pending one are embedded with one
+        ``async_get_embeddings`` call and scored with one ``search_many``, so the
+        number of embedding requests grows with elapsed time, not with load.
+
+        :param vector_db: Database to search
+        :param batch_window: Seconds to wait for more queries after the first one
+        :param max_batch_size: A batch is sent as soon as it holds this many queries
+        """
+        if batch_window < 0:
+            raise ValueError("batch_window must be non-negative")
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.vector_db = vector_db
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self._pending: List[Tuple[str, int, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.queries = 0
+
+    @property
+    def mean_batch_size(self) -> float:
+        return self.queries / self.batches if self.batches else 0.0
+
+    async def search(self, query: str, k: int) -> Contexts:
+        """The ``k`` best ``(text, score)`` pairs for ``query``, fetched in a batch."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((query, k, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.batch_window, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            # Keep a reference so the task is not garbage collected mid-flight.
+            task = asyncio.get_running_loop().create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[str, int, asyncio.Future]]) -> None:
+        self.batches += 1
+        self.queries += len(batch)
+        metrics.observe("rag.retrieval_batch_size", len(batch))
+        try:
+            with metrics.span("rag.retrieve_batch"):
+                queries = [query for query, _, _ in batch]
+                vectors = await self.vector_db.embedding_model.async_get_embeddings(queries)
+                results = self.vector_db.search_many(np.asarray(vectors), max(k for _, k, _ in batch))
+        except Exception as error:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        for (_, k, future), contexts in zip(batch, results):
+            if not future.done():
+                future.set_result(contexts[:k])
+
+
+class RetrievalAugmentedQAPipeline:
+    def __init__(
+        self,
+        llm: ChatOpenAI,
+        vector_db_retriever: VectorDatabase,
+        response_style: str = "detailed",
+        include_scores: bool = False,
+        batch_window: float = 0.005,
+        max_batch_size: int = 64,
+    ) -> None:
+        """
+        Retrieves context for a question, formats the RAG prompts and asks the LLM.
+
+        ``arun_pipeline`` is safe to call from many concurrent tasks: their
+        retrievals share batches (see ``QueryBatcher``) and each request then
+        makes its own LLM call.
+
+        :param llm: Chat model that writes the answer
+        :param vector_db_retriever: Database the context is retrieved from
+        :param response_style: Value of ``{response_style}`` in the system prompt
+        :param include_scores: Show similarity scores to the LLM and in the result
+        :param batch_window: Seconds concurrent retrievals wait to share a batch
+        :param max_batch_size: Maximum retrievals per batch
+        """
+        self.llm = llm
+        self.vector_db_retriever = vector_db_retriever
+        self.response_style = response_style
+        self.include_scores = include_scores
+        self.batcher = QueryBatcher(vector_db_retriever, batch_window, max_batch_size)
+
+    def _messages(self, user_query: str, context_list: Contexts, **system_kwargs) -> Tuple[Dict, Dict, List[str]]:
+        context_prompt = "\n\n".join(f"[Source {i}]: {context}" for i, (context, _) in enumerate(context_list, 1))
+        similarity_scores = [f"Source {i}: {score:.3f}" for i, (_, score) in enumerate(context_list, 1)]
+        system_message = rag_system_prompt.create_message(
+            response_style=self.response_style,
+            response_length=system_kwargs.get("response_length", "detailed"),
+        )
+        user_message = rag_user_prompt.create_message(
+            user_query=user_query,
+            context=context_prompt,
+            context_count=len(context_list),
+            similarity_scores=f"Relevance scores: {', '.join(similarity_scores)}" if self.include_scores else "",
+        )
+        return system_message, user_message, similarity_scores
+
+    def _result(self, response: str, context_list: Contexts, messages: Tuple[Dict, Dict, List[str]]) -> dict:
+        system_message, user_message, similarity_scores = messages
+        return {
+            "response": response,
+            "context": context_list,
+            "context_count": len(context_list),
+            "similarity_scores": similarity_scores if self.include_scores else None,
+            "prompts_used": {"system": system_message, "user": user_message},
+        }
+
+    def run_pipeline(self, user_query: str, k: int = 4, **system_kwargs) -> dict:
+        context_list = self.vector_db_retriever.search_by_text(user_query, k=k)
+        messages = self._messages(user_query, context_list, **system_kwargs)
+        return self._result(self.llm.run(list(messages[:2])), context_list, messages)
+
+    async def arun_pipeline(self, user_query: str, k: int = 4, **system_kwargs) -> dict:
+        """Async ``run_pipeline``; concurrent calls batch their retrievals."""
+        with metrics.span("rag.pipeline"):
+            context_list = await self.batcher.search(user_query, k)
+            messages = self._messages(user_query, context_list, **system_kwargs)
+            response = await self.llm.arun(list(messages[:2]))
+        return self._result(response, context_list, messages)
+
+    async def arun_many(self, user_queries: List[str], k: int = 4, **system_kwargs) -> List[dict]:
+        """Runs all queries concurrently and returns their results in input order."""
+        try:
+            async with asyncio.TaskGroup() as group:
+                tasks = [
+                    group.create_task(self.arun_pipeline(user_query, k, **system_kwargs))
+                    for user_query in user_queries
+                ]
+        except BaseExceptionGroup as errors:
+            raise errors.exceptions[0] from None
+        return [task.result() for task in tasks]
+
+
+if __name__ == "__main__":
+    from aimakerspace.openai_utils.embedding import EmbeddingModel
+    from aimakerspace.openai_utils.fakes import FakeAsyncOpenAIClient, FakeOpenAIClient
+    from aimakerspace.text_utils import CharacterTextSplitter, TextFileLoader
+
+    latency = 0.05
+    embedding_model = EmbeddingModel(
+        client=FakeOpenAIClient(dimensions=256, latency=latency),
+        async_client=FakeAsyncOpenAIClient(dimensions=256, latency=latency),
+    )
+    llm = ChatOpenAI(
+        max_concurrency=256,
+        client=FakeOpenAIClient(latency=latency),
+        async_client=FakeAsyncOpenAIClient(latency=latency),
+    )
+    loader = TextFileLoader("data/PMarcaBlogs.txt")
+    loader.load()
+    chunks = CharacterTextSplitter().split_texts(loader.documents)
+    vector_db = asyncio.run(VectorDatabase(embedding_model).abuild_from_list(chunks))
+
+    questions = [chunks[i][:120] for i in range(0, len(chunks), max(1, len(chunks) // 200))][:200]
+    # max_batch_size=1 sends every retrieval on its own, as before batching.
+    for window, max_batch_size in ((0.0, 1), (0.0, 256), (0.005, 256), (0.02, 256)):
+        pipeline = RetrievalAugmentedQAPipeline(llm, vector_db, batch_window=window, max_batch_size=max_batch_size)
+        start = time.perf_counter()
+        results = asyncio.run(pipeline.arun_many(questions, k=3))
+        elapsed = time.perf_counter() - start
+        print(
+            f"window {window * 1000:4.0f} ms, max batch {max_batch_size:3d}: {len(results) / elapsed:7.1f} queries/s, "
+            f"{pipeline.batcher.batches} embedding calls, mean batch {pipeline.batcher.mean_batch_size:.1f}"
+        )
+    print(results[0]["response"][:100])
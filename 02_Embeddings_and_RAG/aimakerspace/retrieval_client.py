@@ -0,0 +1,182 @@
+import itertools
+import json
+import socket
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# The server and client exchange one JSON object per line:
+#   request:  {"id": 1, "method": "search_by_text", "params": {...}}
+#   response: {"id": 1, "result": ...} or {"id": 1, "error": {"type": ..., "message": ...}}
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+
+class RetrievalServerError(Exception):
+    """Raised when the retrieval server reports an error for a request."""
+
+    def __init__(self, type_name: str, message: str):
+        super().__init__(f"{type_name}: {message}")
+        self.type_name = type_name
+
+
+class RetrievalClient:
+    def __init__(
+        self,
+        host: str = DEFAULT_HOST,
+        port: int = DEFAULT_PORT,
+        path: Optional[str] = None,
+        timeout: Optional[float] = 30.0,
+    ):
+        """
+        Thin blocking client for a ``RetrievalServer``. It only imports the
+        standard library, so a job that queries an already-warm index starts
+        with a socket connect instead of loading the index and embedding model.
+
+        One connection is opened lazily and reused; calls from several threads
+        are serialized on it.
+
+        :param host: Server host for TCP
+        :param port: Server port for TCP
+        :param path: Unix socket path; used instead of ``host``/``port`` when set
+        :param timeout: Socket timeout in seconds (None: block forever)
+        """
+        self.host = host
+        self.port = port
+        self.path = path
+        self.timeout = timeout
+        self._socket: Optional[socket.socket] = None
+        self._file = None
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "RetrievalClient":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def _connect(self) -> None:
+        if self.path is not None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.path)
+        else:
+            sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._socket = sock
+        self._file = sock.makefile("rwb")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._socket is not None:
+                self._file.close()
+                self._socket.close()
+                self._socket = self._file = None
+
+    def call(self, method: str, **params: Any) -> Any:
+        """Sends one request and returns its decoded result."""
+        request_id = next(self._ids)
+        payload = json.dumps({"id": request_id, "method": method, "params": params}).encode("utf-8") + b"\n"
+        with self._lock:
+            if self._socket is None:
+                self._connect()
+            try:
+                self._file.write(payload)
+                self._file.flush()
+                line = self._file.readline()
+            except OSError:
+                # Drop the connection so the next call reconnects.
+                self._file.close()
+                self._socket.close()
+                self._socket = self._file = None
+                raise
+        if not line:
+            self.close()
+            raise ConnectionError("retrieval server closed the connection")
+        response = json.loads(line)
+        if "error" in response:
+            raise RetrievalServerError(response["error"]["type"], response["error"]["message"])
+        return response["result"]
+
+    @staticmethod
+    def _pairs(results: List[List[Any]]) -> List[Tuple[str, float]]:
+        return [(label, score) for label, score in results]
+
+    def ping(self) -> Dict[str, Any]:
+        """Size, dimension and version of the served index."""
+        return self.call("ping")
+
+    def search(
+        self,
+        query_vector: Sequence[float],
+        k: int,
+        return_ids: bool = False,
+        filter: Optional[Dict[str, Any]] = None,
+    ) -> List[Tuple[str, float]]:
+        vector = query_vector.tolist() if hasattr(query_vector, "tolist") else list(query_vector)
+        return self._pairs(self.call("search", query_vector=vector, k=k, return_ids=return_ids, filter=filter))
+
+    def search_by_text(
+        self,
+        query_text: str,
+        k: int,
+        return_as_text: bool = False,
+        return_ids: bool = False,
+        filter: Optional[Dict[str, Any]] = None,
+    ) -> List[Tuple[str, float]]:
+        results = self._pairs(
+            self.call("search_by_text", query_text=query_text, k=k, return_ids=return_ids, filter=filter)
+        )
+        return [result[0] for result in results] if return_as_text else results
+
+    def search_by_texts(
+        self,
+        query_texts: List[str],
+        k: int,
+        return_as_text: bool = False,
+        return_ids: bool = False,
+        filter: Optional[Dict[str, Any]] = None,
+    ) -> List[List[Tuple[str, float]]]:
+        results = [
+            self._pairs(per_query)
+            for per_query in self.call(
+                "search_by_texts", query_texts=query_texts, k=k, return_ids=return_ids, filter=filter
+            )
+        ]
+        return [[result[0] for result in per_query] for per_query in results] if return_as_text else results
+
+    def lexical_search(
+        self, query_text: str, k: int, return_ids: bool = False, filter: Optional[Dict[str, Any]] = None
+    ) -> List[Tuple[str, float]]:
+        return self._pairs(
+            self.call("lexical_search", query_text=query_text, k=k, return_ids=return_ids, filter=filter)
+        )
+
+    def hybrid_search(
+        self, query_text: str, k: int, return_ids: bool = False, filter: Optional[Dict[str, Any]] = None, **kwargs
+    ) -> List[Tuple[str, float]]:
+        """Remote ``VectorDatabase.hybrid_search``; ``kwargs`` are its fusion options."""
+        return self._pairs(
+            self.call("hybrid_search", query_text=query_text, k=k, return_ids=return_ids, filter=filter, **kwargs)
+        )
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Query a running aimakerspace retrieval server.")
+    parser.add_argument("query", help="Query text")
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--unix", help="Unix socket path of the server")
+    parser.add_argument("--lexical", action="store_true", help="BM25 search; needs no embedding call")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    with RetrievalClient(args.host, args.port, args.unix) as client:
+        search = client.lexical_search if args.lexical else client.search_by_text
+        for text, score in search(args.query, args.k):
+            print(f"{score:.3f}  {text[:100]!r}")
+    print(f"connect + query: {(time.perf_counter() - start) * 1000:.1f} ms")
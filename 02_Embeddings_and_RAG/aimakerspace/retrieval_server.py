@@ -0,0 +1,185 @@
+"""
+Long-lived retrieval server: loads a saved ``VectorDatabase`` once and answers
+search requests from any number of processes over TCP or a Unix socket.
+
+    python -m aimakerspace.retrieval_server --index path/to/index --port 8765
+
+Clients use ``aimakerspace.retrieval_client.RetrievalClient``.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import numpy as np
+from aimakerspace.cache import QueryCache
+from aimakerspace.retrieval_client import DEFAULT_HOST, DEFAULT_PORT
+from aimakerspace.vectordatabase import VectorDatabase
+
+# Requests are single JSON lines; this bounds one line (e.g. a large vector batch).
+MAX_LINE_BYTES = 64 * 1024 * 1024
+
+
+def _pairs(results: List[Tuple[str, float]]) -> List[List[Any]]:
+    return [[label, float(score)] for label, score in results]
+
+
+class RetrievalServer:
+    def __init__(
+        self,
+        database: VectorDatabase,
+        host: str = DEFAULT_HOST,
+        port: int = DEFAULT_PORT,
+        path: Optional[str] = None,
+    ):
+        """
+        Serves ``database`` on ``host:port`` (port 0 picks a free one) or on the
+        Unix socket ``path``. Each connection sends newline-delimited JSON
+        requests (see ``retrieval_client``) and gets one response line per
+        request. Query embeddings use the database's async embedding client and
+        scans run in worker threads, so requests from different connections
+        overlap while waiting on the API and a long scan does not stall the others.
+
+        :param database: The warm index to serve
+        :param host: TCP host to bind
+        :param port: TCP port to bind
+        :param path: Unix socket path; used instead of ``host``/``port`` when set
+        """
+        if isinstance(database, VectorDatabase):
+            # Searches run concurrently in worker threads and must not build lazy state.
+            database.prepare_for_reads()
+        self.database = database
+        self.host = host
+        self.port = port
+        self.path = path
+        self.requests = 0
+        self.connections = 0
+        self.started = time.time()
+        self._server: Optional[asyncio.base_events.Server] = None
+        self._methods: Dict[str, Callable[..., Awaitable[Any]]] = {
+            "ping": self._ping,
+            "search": self._search,
+            "search_by_text": self._search_by_text,
+            "search_by_texts": self._search_by_texts,
+            "lexical_search": self._lexical_search,
+            "hybrid_search": self._hybrid_search,
+        }
+
+    @property
+    def address(self) -> Any:
+        """The bound ``(host, port)``, or the socket path."""
+        if self.path is not None:
+            return self.path
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def start(self) -> None:
+        if self.path is not None:
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+            self._server = await asyncio.start_unix_server(self._handle, self.path, limit=MAX_LINE_BYTES)
+        else:
+            self._server = await asyncio.start_server(self._handle, self.host, self.port, limit=MAX_LINE_BYTES)
+
+    async def serve_forever(self) -> None:
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        try:
+            while line := await reader.readline():
+                response = await self._respond(line)
+                writer.write(json.dumps(response).encode("utf-8") + b"\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            # The client went away or sent an oversized line; drop the connection.
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, line: bytes) -> Dict[str, Any]:
+        self.requests += 1
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get("id")
+            method = self._methods.get(request.get("method"))
+            if method is None:
+                raise ValueError(f"Unknown method: {request.get('method')!r}")
+            return {"id": request_id, "result": await method(**request.get("params", {}))}
+        except Exception as error:
+            return {"id": request_id, "error": {"type": type(error).__name__, "message": str(error)}}
+
+    async def _ping(self) -> Dict[str, Any]:
+        query_cache = getattr(self.database, "query_cache", None)
+        return {
+            "size": len(self.database),
+            "dim": self.database.dim,
+            "version": self.database.version,
+            "requests": self.requests,
+            "uptime": time.time() - self.started,
+            "query_cache": None if query_cache is None else query_cache.stats(),
+        }
+
+    async def _search(self, query_vector: List[float], k: int, return_ids: bool = False, filter=None):
+        results = await asyncio.to_thread(
+            self.database.search, np.asarray(query_vector), k, return_ids=return_ids, filter=filter
+        )
+        return _pairs(results)
+
+    async def _search_by_text(self, query_text: str, k: int, return_ids: bool = False, filter=None):
+        # Goes through the database so its query cache (if configured) applies.
+        return _pairs(await self.database.asearch_by_text(query_text, k, return_ids=return_ids, filter=filter))
+
+    async def _search_by_texts(self, query_texts: List[str], k: int, return_ids: bool = False, filter=None):
+        results = await self.database.asearch_by_texts(query_texts, k, return_ids=return_ids, filter=filter)
+        return [_pairs(per_query) for per_query in results]
+
+    async def _lexical_search(self, query_text: str, k: int, return_ids: bool = False, filter=None):
+        results = await asyncio.to_thread(
+            self.database.lexical_search, query_text, k, return_ids=return_ids, filter=filter
+        )
+        return _pairs(results)
+
+    async def _hybrid_search(self, query_text: str, k: int, **kwargs):
+        return _pairs(await self.database.ahybrid_search(query_text, k, **kwargs))
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index", required=True, help="Directory written by VectorDatabase.save")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--unix", help="Serve on this Unix socket path instead of TCP")
+    parser.add_argument("--no-mmap", action="store_true", help="Read the vectors into memory instead of mapping them")
+    parser.add_argument("--query-cache-size", type=int, default=1024, help="Cached search_by_text results (0: off)")
+    parser.add_argument("--query-cache-ttl", type=float, default=300.0, help="Seconds a cached result stays valid")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    query_cache = QueryCache(args.query_cache_size, args.query_cache_ttl) if args.query_cache_size > 0 else None
+    database = VectorDatabase.load(args.index, mmap=not args.no_mmap, query_cache=query_cache)
+    server = RetrievalServer(database, args.host, args.port, args.unix)
+
+    async def serve() -> None:
+        await server.start()
+        print(f"Serving {len(database)} vectors on {server.address} (loaded in {time.perf_counter() - start:.2f}s)")
+        await server.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+import asyncio
+import hashlib
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+import numpy as np
+from aimakerspace import metrics
+from aimakerspace.cache import LRUCache
+from aimakerspace.openai_utils.embedding import EmbeddingModel
+from aimakerspace.vectordatabase import VectorDatabase
+
+
+class SemanticCache:
+    def __init__(
+        self,
+        embedding_model: EmbeddingModel = None,
+        threshold: float = 0.92,
+        max_entries: int = 10_000,
+        ttl: Optional[float] = None,
+        document_index: Optional[VectorDatabase] = None,
+        candidates: int = 4,
+    ):
+        """
+        Answer cache keyed on query meaning rather than exact text.
+
+        Incoming queries are embedded and looked up in a dedicated
+        ``VectorDatabase`` of past queries; when the closest one has a cosine
+        similarity of at least ``threshold``, its stored answer is returned and
+        the LLM call is skipped.
+
+        :param embedding_model: Model used to embed queries
+        :param threshold: Minimum cosine similarity for a hit
+        :param max_entries: Entries kept; the least recently used is evicted first
+        :param ttl: Seconds after which an answer expires (None: never)
+        :param document_index: The ``VectorDatabase`` the answers were grounded in;
+            when its ``version`` changes, every cached answer is dropped
+        :param candidates: Nearest past queries checked per lookup; the closest
+            one above ``threshold`` whose answer has not expired is used
+        """
+        # Evicted queries are tombstoned; compacting at half keeps the index bounded.
+        self.queries = VectorDatabase(embedding_model, compact_threshold=0.5)
+        self.embedding_model = self.queries.embedding_model
+        self.threshold = threshold
+        self.candidates = candidates
+        self.document_index = document_index
+        self._entries = LRUCache(max_entries, ttl, on_evict=self._forget)
+        self._document_version = None if document_index is None else document_index.version
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.latency_saved = 0.0
+        self.lookup_time = 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _entry_id(query: str) -> str:
+        return hashlib.sha256(query.encode("utf-8")).hexdigest()
+
+    def _forget(self, entry_id: Hashable, entry: Tuple[str, Any, float]) -> None:
+        with self._lock:
+            self.queries.delete([entry_id])
+
+    def invalidate(self) -> None:
+        """Drops every cached answer."""
+        with self._lock:
+            self._entries.clear()
+            self.queries = VectorDatabase(self.embedding_model, compact_threshold=0.5)
+            self.invalidations += 1
+            if self.document_index is not None:
+                self._document_version = self.document_index.version
+
+    def _check_documents(self) -> None:
+        if self.document_index is not None and self.document_index.version != self._document_version:
+            self.invalidate()
+
+    def lookup(self, query: str, query_vector: Optional[np.ndarray] = None) -> Optional[Any]:
+        """
+        Returns the cached answer for the closest past query above the threshold,
+        or None. Pass ``query_vector`` when the query is already embedded.
+        """
+        start = time.perf_counter()
+        if query_vector is None:
+            query_vector = self.embedding_model.get_embedding(query)
+        entry = self._lookup(query_vector)
+        self.lookup_time += time.perf_counter() - start
+        return None if entry is None else entry[1]
+
+    def _lookup(self, query_vector) -> Optional[Tuple[str, Any, float]]:
+        """The ``(query, answer, latency)`` entry of the closest live past query, or None."""
+        with self._lock:
+            self._check_documents()
+            entry = None
+            for entry_id, score in self.queries.search(query_vector, k=self.candidates, return_ids=True):
+                if score < self.threshold:
+                    break
+                # Expired entries are dropped here; a farther neighbour may still hit.
+                entry = self._entries.get(entry_id)
+                if entry is not None:
+                    break
+            if entry is None:
+                self.misses += 1
+                metrics.increment("semantic_cache.misses")
+            else:
+                self.hits += 1
+                metrics.increment("semantic_cache.hits")
+                self.latency_saved += entry[2]
+            return entry
+
+    def store(self, query: str, answer: Any, latency: float = 0.0, query_vector: Optional[np.ndarray] = None) -> None:
+        """Caches ``answer`` for ``query``; ``latency`` is what a later hit saves."""
+        if query_vector is None:
+            query_vector = self.embedding_model.get_embedding(query)
+        entry_id = self._entry_id(query)
+        with self._lock:
+            self._check_documents()
+            self.queries.upsert([entry_id], np.asarray(query_vector, dtype=np.float32)[None, :], [query])
+            self._entries.put(entry_id, (query, answer, latency))
+
+    def get_or_run(self, query: str, run: Callable[[], Any]) -> Any:
+        """Returns a cached answer for ``query`` or calls ``run()`` and caches its result."""
+        start = time.perf_counter()
+        query_vector = self.embedding_model.get_embedding(query)
+        entry = self._lookup(query_vector)
+        self.lookup_time += time.perf_counter() - start
+        if entry is not None:
+            return entry[1]
+        start = time.perf_counter()
+        answer = run()
+        self.store(query, answer, time.perf_counter() - start, query_vector)
+        return answer
+
+    async def aget_or_run(self, query: str, run: Callable[[], Awaitable[Any]]) -> Any:
+        """Async variant of ``get_or_run`` for a coroutine function ``run``."""
+        start = time.perf_counter()
+        query_vector = await self.embedding_model.async_get_embedding(query)
+        entry = self._lookup(query_vector)
+        self.lookup_time += time.perf_counter() - start
+        if entry is not None:
+            return entry[1]
+        start = time.perf_counter()
+        answer = await run()
+        self.store(query, answer, time.perf_counter() - start, query_vector)
+        return answer
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "latency_saved": self.latency_saved,
+            "lookup_time": self.lookup_time,
+            "evictions": self._entries.evictions,
+            "expirations": self._entries.expirations,
+            "invalidations": self.invalidations,
+        }
+
+
+if __name__ == "__main__":
+    from aimakerspace.openai_utils.chatmodel import ChatOpenAI
+
+    chat = ChatOpenAI()
+    cache = SemanticCache(threshold=0.9)
+    questions: List[str] = [
+        "What is the Michael Eisner Memorial Weak Executive Problem?",
+        "What's the Michael Eisner memorial weak executive problem?",
+        "Explain the Michael Eisner Memorial Weak Executive Problem.",
+    ]
+    for question in questions:
+        start = time.perf_counter()
+        answer = asyncio.run(
+            cache.aget_or_run(question, lambda: chat.arun([{"role": "user", "content": question}]))
+        )
+        print(f"{time.perf_counter() - start:.2f}s  {question}\n  {answer[:100]}")
+    print(cache.stats())
@@ -0,0 +1,227 @@
+import multiprocessing
+import os
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from aimakerspace import metrics
+from aimakerspace.filters import MetadataIndex
+from aimakerspace.openai_utils.embedding import EmbeddingModel
+from aimakerspace.vectordatabase import VectorDatabase, normalize_rows, top_k_indices_2d
+
+# (shared memory name, rows, dim) of one shard.
+ShardSpec = Tuple[str, int, int]
+
+# Shards attached by this worker process, by shared memory name.
+_attached: Dict[str, Tuple[SharedMemory, np.ndarray]] = {}
+
+
+def _attach(spec: ShardSpec) -> np.ndarray:
+    """Maps a shard into this process once; later calls reuse the mapping."""
+    name, rows, dim = spec
+    entry = _attached.get(name)
+    if entry is None:
+        shm = SharedMemory(name=name)
+        entry = (shm, np.ndarray((rows, dim), dtype=np.float32, buffer=shm.buf))
+        _attached[name] = entry
+    return entry[1]
+
+
+def _warm_up(spec: ShardSpec) -> int:
+    return os.getpid() if _attach(spec) is not None else 0
+
+
+def _search_shard(
+    spec: ShardSpec, queries: np.ndarray, k: int, rows: Optional[np.ndarray], query_batch_size: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Top-k of one shard for a batch of normalized queries, run in a worker.
+    Returns shard-local row numbers and scores, both shaped (queries, k).
+    """
+    candidates = _attach(spec)
+    if rows is not None:
+        candidates = candidates[rows]
+    k = min(k, candidates.shape[0])
+    best = np.empty((queries.shape[0], k), dtype=np.int64)
+    best_scores = np.empty((queries.shape[0], k), dtype=np.float32)
+    for start in range(0, queries.shape[0], query_batch_size):
+        scores = queries[start : start + query_batch_size] @ candidates.T
+        top = top_k_indices_2d(scores, k)
+        best[start : start + query_batch_size] = top if rows is None else rows[top]
+        best_scores[start : start + query_batch_size] = np.take_along_axis(scores, top, axis=1)
+    return best, best_scores
+
+
+def _release(shared: List[SharedMemory], pool: ProcessPoolExecutor) -> None:
+    pool.shutdown(wait=True, cancel_futures=True)
+    for shm in shared:
+        shm.close()
+        shm.unlink()
+
+
+class ShardedVectorDatabase:
+    def __init__(
+        self,
+        database: VectorDatabase,
+        n_shards: Optional[int] = None,
+        mp_context: Optional[multiprocessing.context.BaseContext] = None,
+    ):
+        """
+        Read-only snapshot of a ``VectorDatabase`` partitioned across a pool of
+        worker processes for cosine search.
+
+        The live rows are split into ``n_shards`` contiguous shards, each copied
+        once into its own ``multiprocessing.shared_memory`` block. Workers map the
+        blocks instead of receiving copies, so a query only ships the query
+        vectors to the pool and the per-shard top-k back. Every query is scattered
+        to all shards and their results are merged in this process.
+
+        Writes to ``database`` after the snapshot is taken are not seen; build a
+        new ``ShardedVectorDatabase`` to pick them up. Call ``close`` (or use it as
+        a context manager) to stop the workers and free the shared memory.
+
+        :param database: Database to snapshot
+        :param n_shards: Number of shards and worker processes (default: CPU count)
+        :param mp_context: ``multiprocessing`` context for the workers
+        """
+        self.embedding_model: EmbeddingModel = database.embedding_model
+        self.n_shards = max(1, n_shards or os.cpu_count() or 1)
+
+        live = np.arange(database._n_rows)
+        deleted = database._deleted_rows()
+        if deleted is not None:
+            live = live[~deleted]
+        self._ids = [database._ids[row] for row in live]
+        self._texts = [database._texts[row] for row in live]
+        self.metadata_index = MetadataIndex()
+        self.metadata_index.add(0, [database._metadata[row] for row in live])
+        self.dim = database.dim or 0
+
+        matrix = database.matrix
+        bounds = np.linspace(0, len(live), self.n_shards + 1).astype(np.int64)
+        self._offsets = bounds[:-1]
+        self._specs: List[ShardSpec] = []
+        self._shared: List[SharedMemory] = []
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            rows = int(end - start)
+            shm = SharedMemory(create=True, size=max(1, rows * self.dim * 4))
+            self._shared.append(shm)
+            shard = np.ndarray((rows, self.dim), dtype=np.float32, buffer=shm.buf)
+            shard[:] = matrix[live[start:end]]
+            self._specs.append((shm.name, rows, self.dim))
+
+        self._pool = ProcessPoolExecutor(max_workers=self.n_shards, mp_context=mp_context)
+        self._finalizer = weakref.finalize(self, _release, self._shared, self._pool)
+        # Start the workers and map the shards now, not on the first query.
+        list(self._pool.map(_warm_up, self._specs))
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __enter__(self) -> "ShardedVectorDatabase":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Stops the worker processes and unlinks the shared memory blocks."""
+        self._finalizer()
+
+    def _shard_rows(self, filter: Optional[Dict[str, Any]]) -> List[Optional[np.ndarray]]:
+        """Per shard, the local rows matching ``filter`` (None: all rows)."""
+        if filter is None:
+            return [None] * self.n_shards
+        allowed = self.metadata_index.mask(filter, len(self))
+        return [
+            np.flatnonzero(allowed[offset : offset + rows])
+            for offset, (_, rows, _) in zip(self._offsets, self._specs)
+        ]
+
+    def search_many(
+        self,
+        query_vectors: np.ndarray,
+        k: int,
+        return_ids: bool = False,
+        filter: Optional[Dict[str, Any]] = None,
+        query_batch_size: int = 256,
+    ) -> List[List[Tuple[str, float]]]:
+        """Cosine top-k ``(text, score)`` (or ``(id, score)``) lists, one per query."""
+        queries = normalize_rows(np.atleast_2d(np.asarray(query_vectors)))
+        if len(self) == 0 or k <= 0:
+            return [[] for _ in range(queries.shape[0])]
+        metrics.observe("sharded.search_many.batch_size", queries.shape[0])
+        with metrics.span("sharded.search_many", shards=self.n_shards):
+            futures = [
+                (self._pool.submit(_search_shard, spec, queries, k, rows, query_batch_size), offset)
+                for spec, offset, rows in zip(self._specs, self._offsets, self._shard_rows(filter))
+                if rows is None or len(rows)
+            ]
+            shard_rows, shard_scores = [], []
+            for future, offset in futures:
+                best, scores = future.result()
+                shard_rows.append(best + offset)
+                shard_scores.append(scores)
+            if not shard_rows:
+                return [[] for _ in range(queries.shape[0])]
+            rows = np.concatenate(shard_rows, axis=1)
+            scores = np.concatenate(shard_scores, axis=1)
+            order = top_k_indices_2d(scores, k)
+            labels = self._ids if return_ids else self._texts
+            return [
+                [(labels[rows[i, j]], float(scores[i, j])) for j in best]
+                for i, best in enumerate(order)
+            ]
+
+    def search(
+        self,
+        query_vector: np.ndarray,
+        k: int,
+        return_ids: bool = False,
+        filter: Optional[Dict[str, Any]] = None,
+    ) -> List[Tuple[str, float]]:
+        return self.search_many(np.asarray(query_vector)[None, :], k, return_ids, filter)[0]
+
+    def search_by_text(
+        self,
+        query_text: str,
+        k: int,
+        return_as_text: bool = False,
+        return_ids: bool = False,
+        filter: Optional[Dict[str, Any]] = None,
+    ) -> List[Tuple[str, float]]:
+        query_vector = self.embedding_model.get_embedding(query_text)
+        results = self.search(query_vector, k, return_ids=return_ids, filter=filter)
+        return [result[0] for result in results] if return_as_text else results
+
+
+if __name__ == "__main__":
+    import time
+    from aimakerspace.openai_utils.fakes import FakeAsyncOpenAIClient, FakeOpenAIClient
+
+    n, dim, n_queries, k = 200_000, 256, 64, 10
+    rng = np.random.default_rng(0)
+    embedding_model = EmbeddingModel(
+        client=FakeOpenAIClient(dimensions=dim), async_client=FakeAsyncOpenAIClient(dimensions=dim)
+    )
+    database = VectorDatabase(embedding_model)
+    database.insert_many([f"v{i}" for i in range(n)], rng.standard_normal((n, dim), dtype=np.float32))
+    queries = rng.standard_normal((n_queries, dim), dtype=np.float32)
+    expected = database.search_many(queries, k, return_ids=True)
+
+    start = time.perf_counter()
+    for query in queries:
+        database.search(query, k)
+    single = (time.perf_counter() - start) / n_queries
+    print(f"{n} x {dim}, {os.cpu_count()} CPUs; in-process search {single * 1e3:.2f} ms/query")
+    for n_shards in sorted({1, 2, 4, os.cpu_count() or 1}):
+        with ShardedVectorDatabase(database, n_shards) as sharded:
+            assert [[i for i, _ in r] for r in sharded.search_many(queries, k, True)] == [
+                [i for i, _ in r] for r in expected
+            ]
+            start = time.perf_counter()
+            for query in queries:
+                sharded.search(query, k)
+            elapsed = (time.perf_counter() - start) / n_queries
+            print(f"{n_shards} shards: {elapsed * 1e3:.2f} ms/query ({single / elapsed:.2f}x)")
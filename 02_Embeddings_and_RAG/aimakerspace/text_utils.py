@@ -1,12 +1,34 @@
+import hashlib
+import json
+import mmap
 import os
-from typing import List
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+from aimakerspace import metrics
 
 
 class TextFileLoader:
-    def __init__(self, path: str, encoding: str = "utf-8"):
+    def __init__(
+        self,
+        path: str,
+        encoding: str = "utf-8",
+        max_workers: int = 8,
+        mmap_threshold: int = 4 * 1024 * 1024,
+    ):
+        """
+        :param path: A .txt file or a directory searched recursively for .txt files
+        :param encoding: Text encoding of the files
+        :param max_workers: Threads used to read files in parallel
+        :param mmap_threshold: Files at least this many bytes are read through mmap
+        """
         self.documents = []
+        self.metadata: List[Dict[str, Any]] = []
+        self.manifest: Dict[str, Dict[str, Any]] = {}
         self.path = path
         self.encoding = encoding
+        self.max_workers = max_workers
+        self.mmap_threshold = mmap_threshold
 
     def load(self):
         if os.path.isdir(self.path):
@@ -19,22 +41,119 @@ class TextFileLoader:
             )
 
     def load_file(self):
-        with open(self.path, "r", encoding=self.encoding) as f:
-            self.documents.append(f.read())
+        text, metadata = self.read_document(self.path)
+        self.documents.append(text)
+        self.metadata.append(metadata)
 
     def load_directory(self):
-        for root, _, files in os.walk(self.path):
-            for file in files:
-                if file.endswith(".txt"):
-                    with open(
-                        os.path.join(root, file), "r", encoding=self.encoding
-                    ) as f:
-                        self.documents.append(f.read())
+        for text, metadata in self.iter_documents():
+            self.documents.append(text)
+            self.metadata.append(metadata)
 
     def load_documents(self):
         self.load()
         return self.documents
 
+    def iter_paths(self) -> Iterator[str]:
+        if os.path.isdir(self.path):
+            for root, _, files in os.walk(self.path):
+                for file in sorted(files):
+                    if file.endswith(".txt"):
+                        yield os.path.join(root, file)
+        elif os.path.isfile(self.path) and self.path.endswith(".txt"):
+            yield self.path
+        else:
+            raise ValueError(
+                "Provided path is neither a valid directory nor a .txt file."
+            )
+
+    def read_document(self, path: str) -> Tuple[str, Dict[str, Any]]:
+        """Reads one file and returns its text with path, size, mtime and content hash."""
+        stat = os.stat(path)
+        with open(path, "rb") as f:
+            if stat.st_size >= self.mmap_threshold:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    content_hash = hashlib.sha256(mapped).hexdigest()
+                    text = str(mapped, self.encoding)
+            else:
+                data = f.read()
+                content_hash = hashlib.sha256(data).hexdigest()
+                text = data.decode(self.encoding)
+        # Match the newline translation of text-mode reads.
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+        metadata = {
+            "source": path,
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "content_hash": content_hash,
+        }
+        return text, metadata
+
+    def _read_in_parallel(self, paths: Iterator[str]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        # Keep at most two reads per worker in flight so memory stays bounded.
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = deque()
+            for path in paths:
+                pending.append(executor.submit(self.read_document, path))
+                if len(pending) >= 2 * self.max_workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def iter_documents(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Lazily yields ``(text, metadata)`` in path order, reading files on a thread
+        pool, without storing anything in ``self.documents``.
+        """
+        yield from self._read_in_parallel(self.iter_paths())
+
+    def iter_changes(self, manifest_path: str) -> Iterator[Tuple[str, Optional[str], Dict[str, Any]]]:
+        """
+        Compares the files under ``path`` with the manifest of a previous run and
+        yields ``(status, text, metadata)`` for every ``"added"`` or ``"modified"``
+        file, then ``("deleted", None, metadata)`` for files that disappeared.
+
+        Files whose size and mtime match the manifest are not read at all; files
+        that were touched but whose content hash is unchanged are skipped too.
+        The new manifest is kept in ``self.manifest``; call ``save_manifest`` once
+        the changes have been applied.
+        """
+        previous = self.read_manifest(manifest_path)
+        self.manifest = {}
+        candidates = []
+        for path in self.iter_paths():
+            stat = os.stat(path)
+            known = previous.get(path)
+            if known and known["size"] == stat.st_size and known["mtime"] == stat.st_mtime:
+                self.manifest[path] = known
+            else:
+                candidates.append(path)
+
+        for text, metadata in self._read_in_parallel(iter(candidates)):
+            path = metadata["source"]
+            self.manifest[path] = {key: value for key, value in metadata.items() if key != "source"}
+            known = previous.get(path)
+            if known is None:
+                yield "added", text, metadata
+            elif known["content_hash"] != metadata["content_hash"]:
+                yield "modified", text, metadata
+
+        for path in previous.keys() - self.manifest.keys():
+            yield "deleted", None, {"source": path, **previous[path]}
+
+    @staticmethod
+    def read_manifest(manifest_path: str) -> Dict[str, Dict[str, Any]]:
+        if not os.path.exists(manifest_path):
+            return {}
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def save_manifest(self, manifest_path: str) -> None:
+        tmp_path = f"{manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f)
+        os.replace(tmp_path, manifest_path)
+
 
 class CharacterTextSplitter:
     def __init__(
@@ -50,20 +169,122 @@ class CharacterTextSplitter:
         self.chunk_overlap = chunk_overlap
 
     def split(self, text: str) -> List[str]:
-        chunks = []
-        for i in range(0, len(text), self.chunk_size - self.chunk_overlap):
-            chunks.append(text[i : i + self.chunk_size])
+        with metrics.span("splitter.split", splitter=type(self).__name__):
+            chunks = list(self.iter_split(text))
+        metrics.observe("splitter.chunks", len(chunks), splitter=type(self).__name__)
         return chunks
 
+    def iter_split(self, text: str) -> Iterator[str]:
+        for start, end in self.iter_spans(text):
+            yield text[start:end]
+
+    def iter_spans(self, text: str) -> Iterator[Tuple[int, int]]:
+        """Yields the ``(start, end)`` character offsets of each chunk of ``text``."""
+        for i in range(0, len(text), self.chunk_size - self.chunk_overlap):
+            yield i, min(i + self.chunk_size, len(text))
+
     def split_texts(self, texts: List[str]) -> List[str]:
         chunks = []
-        for text in texts:
-            chunks.extend(self.split(text))
+        with metrics.span("splitter.split_texts", splitter=type(self).__name__):
+            for text in texts:
+                chunks.extend(self.iter_split(text))
+        metrics.observe("splitter.chunks", len(chunks), splitter=type(self).__name__)
         return chunks
 
+    def iter_document_spans(self, texts: Iterable[str]) -> Iterator[Tuple[int, int, int]]:
+        """
+        Yields ``(doc_id, start, end)`` for every chunk of every text, where
+        ``doc_id`` is the text's position in ``texts``. No chunk string is
+        created; slice ``texts[doc_id][start:end]`` when the text is needed.
+        """
+        for doc_id, text in enumerate(texts):
+            for start, end in self.iter_spans(text):
+                yield doc_id, start, end
+
+
+DEFAULT_SEPARATORS = ("\n\n", "\n", (". ", "? ", "! "), " ")
+
+
+class RecursiveTextSplitter(CharacterTextSplitter):
+    def __init__(
+        self,
+        chunk_size: int = 1000,
+        chunk_overlap: int = 200,
+        separators: Sequence[Union[str, Tuple[str, ...]]] = DEFAULT_SEPARATORS,
+        min_chunk_size: Optional[int] = None,
+    ):
+        """
+        Boundary-aware splitter that works on character offsets.
+
+        Each chunk ends at the coarsest boundary available in its window:
+        a paragraph break if there is one, otherwise a line break, a sentence
+        end, a space, and only as a last resort an arbitrary character. The
+        next chunk starts at the coarsest boundary within the last
+        ``chunk_overlap`` characters, so overlaps begin on whole words too.
+
+        :param chunk_size: Maximum chunk length in characters
+        :param chunk_overlap: Maximum overlap between consecutive chunks
+        :param separators: Boundaries from coarsest to finest; a tuple groups
+            separators of equal rank (e.g. the different sentence endings)
+        :param min_chunk_size: Shortest chunk a boundary may produce, except for
+            the last chunk of a text (default: half of ``chunk_size``)
+        """
+        super().__init__(chunk_size, chunk_overlap)
+        self.separators = [(level,) if isinstance(level, str) else tuple(level) for level in separators]
+        self.min_chunk_size = chunk_size // 2 if min_chunk_size is None else min_chunk_size
+        assert (
+            0 < self.min_chunk_size <= chunk_size
+        ), "Minimum chunk size must be positive and at most the chunk size"
+
+    def _last_boundary(self, text: str, low: int, high: int) -> int:
+        """End of the last coarsest-level separator inside ``text[low:high]``, or -1."""
+        for level in self.separators:
+            best = -1
+            for separator in level:
+                position = text.rfind(separator, low, high)
+                if position != -1:
+                    best = max(best, position + len(separator))
+            if best != -1:
+                return best
+        return -1
+
+    def _first_boundary(self, text: str, low: int, high: int) -> int:
+        """End of the first coarsest-level separator inside ``text[low:high]``, or -1."""
+        for level in self.separators:
+            best = -1
+            for separator in level:
+                position = text.find(separator, low, high)
+                if position != -1 and position + len(separator) <= high:
+                    end = position + len(separator)
+                    best = end if best == -1 else min(best, end)
+            if best != -1:
+                return best
+        return -1
+
+    def iter_spans(self, text: str) -> Iterator[Tuple[int, int]]:
+        start, length = 0, len(text)
+        while start < length:
+            limit = start + self.chunk_size
+            if limit >= length:
+                yield start, length
+                return
+            end = self._last_boundary(text, start + self.min_chunk_size, limit)
+            if end == -1:
+                end = limit
+            yield start, end
+            if self.chunk_overlap:
+                low = max(start + 1, end - self.chunk_overlap)
+                boundary = self._first_boundary(text, low, end)
+                # Without any boundary to snap to, overlap by characters like the base class.
+                start = boundary if boundary != -1 else low
+            else:
+                start = end
+
 
 if __name__ == "__main__":
-    loader = TextFileLoader("data/KingLear.txt")
+    import time
+
+    loader = TextFileLoader("data/PMarcaBlogs.txt")
     loader.load()
     splitter = CharacterTextSplitter()
     chunks = splitter.split_texts(loader.documents)
@@ -75,3 +296,20 @@ if __name__ == "__main__":
     print(chunks[-2])
     print("--------")
     print(chunks[-1])
+    print("--------")
+
+    megabytes = sum(len(text.encode(loader.encoding)) for text in loader.documents) / 1e6
+    for splitter in (CharacterTextSplitter(), RecursiveTextSplitter()):
+        for mode, run in (
+            ("spans", lambda: sum(1 for _ in splitter.iter_document_spans(loader.documents))),
+            ("strings", lambda: len(splitter.split_texts(loader.documents))),
+        ):
+            repeats = 20
+            start = time.perf_counter()
+            for _ in range(repeats):
+                n_chunks = run()
+            seconds = (time.perf_counter() - start) / repeats
+            print(
+                f"{type(splitter).__name__:>22} {mode:>7}: {n_chunks} chunks, "
+                f"{megabytes / seconds:.1f} MB/s"
+            )
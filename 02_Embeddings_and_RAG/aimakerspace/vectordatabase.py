@@ -1,9 +1,50 @@
+import copy
+import datetime
+import json
+import os
+import shutil
 import numpy as np
-from collections import defaultdict
-from typing import List, Tuple, Callable
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Callable, Union
+from aimakerspace import metrics
 from aimakerspace.openai_utils.embedding import EmbeddingModel
+from aimakerspace.ann import IVFIndex
+from aimakerspace.bm25 import BM25Index, reciprocal_rank_fusion, weighted_score_fusion
+from aimakerspace.cache import QueryCache
+from aimakerspace.dedup import NearDuplicateDetector
+from aimakerspace.filters import MetadataIndex
+from aimakerspace.quantization import ProductQuantizer, ScalarQuantizer, TruncatedQuantizer, quantizer_from_config
 import asyncio
 
+Quantizer = Union[ScalarQuantizer, ProductQuantizer, TruncatedQuantizer]
+
+FORMAT_VERSION = 2
+SUPPORTED_FORMAT_VERSIONS = (1, 2)
+HEADER_FILE = "header.json"
+VECTORS_FILE = "vectors.f32"
+CODES_FILE = "codes.bin"
+KEYS_FILE = "keys.jsonl"
+QUANTIZER_FILE = "quantizer.npz"
+INDEX_FILE = "index.npz"
+
+
+def _encode_json(value: Any) -> Any:
+    # Dates are valid metadata (they can be range-filtered), so tag them for ``load``.
+    if isinstance(value, datetime.datetime):
+        return {"$datetime": value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {"$date": value.isoformat()}
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _decode_json(obj: Dict[str, Any]) -> Any:
+    if len(obj) == 1:
+        if "$datetime" in obj:
+            return datetime.datetime.fromisoformat(obj["$datetime"])
+        if "$date" in obj:
+            return datetime.date.fromisoformat(obj["$date"])
+    return obj
+
 
 def cosine_similarity(vector_a: np.array, vector_b: np.array) -> float:
     """Computes the cosine similarity between two vectors."""
@@ -13,25 +54,607 @@ def cosine_similarity(vector_a: np.array, vector_b: np.array) -> float:
     return dot_product / (norm_a * norm_b)
 
 
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalizes each row of a 2D array as float32; zero rows are left as zeros."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Returns the indices of the k highest scores, best first, without a full sort."""
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < scores.shape[0]:
+        candidates = np.argpartition(scores, -k)[-k:]
+    else:
+        candidates = np.arange(scores.shape[0])
+    return candidates[np.argsort(scores[candidates])[::-1]]
+
+
+def top_k_indices_2d(scores: np.ndarray, k: int) -> np.ndarray:
+    """Row-wise version of ``top_k_indices`` for a (queries, rows) score matrix."""
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        return np.empty((scores.shape[0], 0), dtype=np.int64)
+    if k < scores.shape[1]:
+        candidates = np.argpartition(scores, -k, axis=1)[:, -k:]
+    else:
+        candidates = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+    order = np.argsort(np.take_along_axis(scores, candidates, axis=1), axis=1)[:, ::-1]
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+class _VectorView(Mapping):
+    """Read-only ``key -> vector`` view over the rows of a VectorDatabase."""
+
+    def __init__(self, database: "VectorDatabase"):
+        self._database = database
+
+    def __getitem__(self, key: str) -> np.ndarray:
+        vector = self._database.retrieve_from_key(key)
+        if vector is None:
+            raise KeyError(key)
+        return vector
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._database.keys)
+
+    def __len__(self) -> int:
+        return len(self._database)
+
+
 class VectorDatabase:
-    def __init__(self, embedding_model: EmbeddingModel = None):
-        self.vectors = defaultdict(np.array)
+    def __init__(
+        self,
+        embedding_model: EmbeddingModel = None,
+        initial_capacity: int = 1024,
+        index: Optional[IVFIndex] = None,
+        quantizer: Optional[Quantizer] = None,
+        keep_full_vectors: bool = True,
+        rescore_factor: int = 4,
+        compact_threshold: Optional[float] = None,
+        lexical_index: Optional[BM25Index] = None,
+        query_cache: Optional[QueryCache] = None,
+    ):
+        """
+        Stores embeddings as rows of one growable float32 matrix.
+
+        Rows are L2-normalized once at insert time, so cosine search is a single
+        matrix-vector product. Capacity doubles when the matrix is full. Every row
+        has a stable id, a text and optional metadata; upserts and deletes only
+        mark old rows as deleted (tombstones) and ``compact`` reclaims their space.
+        Searches accept a metadata ``filter`` (see ``MetadataIndex``) that is
+        resolved to a row mask before scoring, so only matching rows are scored.
+        A BM25 index over the texts is maintained alongside the vectors for
+        ``lexical_search`` (no embedding call) and ``hybrid_search``.
+
+        :param embedding_model: Model used to embed texts and queries
+        :param initial_capacity: Number of rows to preallocate on first insert
+        :param index: Optional approximate index (e.g. ``IVFIndex``); searches fall
+            back to an exact scan until it has been built with ``build_index``
+        :param quantizer: Optional ``ScalarQuantizer``, ``ProductQuantizer`` or
+            ``TruncatedQuantizer``; once trained with ``train_quantizer`` (the
+            truncated one needs no training), the first search pass scores codes
+        :param keep_full_vectors: Keep the float32 matrix next to the codes so the
+            best candidates can be rescored exactly; False trades recall for memory
+        :param rescore_factor: Candidates rescored per result (0 disables rescoring)
+        :param compact_threshold: Compact automatically once this fraction of rows
+            is deleted (None: only when ``compact`` is called)
+        :param lexical_index: BM25 index over the row texts (default ``BM25Index()``)
+        :param query_cache: Optional ``QueryCache``; repeated ``search_by_text``
+            calls then reuse the query embedding and, until the next write, the results
+        """
         self.embedding_model = embedding_model or EmbeddingModel()
+        self.initial_capacity = max(1, initial_capacity)
+        self.index = index
+        self.quantizer = quantizer
+        self.keep_full_vectors = keep_full_vectors
+        self.rescore_factor = rescore_factor
+        self.compact_threshold = compact_threshold
+        self.lexical_index = lexical_index or BM25Index()
+        self.query_cache = query_cache
+        self._dim: Optional[int] = None
+        self._capacity = 0
+        self._matrix: Optional[np.ndarray] = None
+        self._codes: Optional[np.ndarray] = None
+        self._deleted = np.zeros(0, dtype=bool)
+        self._n_deleted = 0
+        self._ids: List[str] = []
+        self._texts: List[str] = []
+        self._metadata: List[Optional[Dict[str, Any]]] = []
+        self._id_to_row: Dict[str, int] = {}
+        self.metadata_index = MetadataIndex()
+        self._version = 0
+
+    def __len__(self) -> int:
+        return len(self._id_to_row)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._id_to_row
+
+    @property
+    def _n_rows(self) -> int:
+        return len(self._ids)
+
+    @property
+    def dim(self) -> Optional[int]:
+        return self._dim
+
+    @property
+    def keys(self) -> List[str]:
+        return list(self._id_to_row)
+
+    @property
+    def version(self) -> int:
+        """
+        Incremented by every change that can alter search results: upserts,
+        deletes and (re)training the index or quantizer.
+        """
+        return self._version
+
+    @property
+    def n_deleted(self) -> int:
+        return self._n_deleted
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """
+        The populated, normalized rows (a view, not a copy), including rows deleted
+        since the last ``compact``. When full vectors were dropped after
+        quantization, the rows are decoded from the codes.
+        """
+        if self._matrix is not None:
+            return self._matrix[: self._n_rows]
+        if self._codes is not None:
+            return self.quantizer.decode(self._codes[: self._n_rows])
+        return np.empty((0, self._dim or 0), dtype=np.float32)
+
+    @property
+    def vectors(self) -> Mapping:
+        return _VectorView(self)
+
+    @property
+    def is_quantized(self) -> bool:
+        return self._codes is not None
+
+    def _ensure_capacity(self, dim: int, extra_rows: int) -> None:
+        if self._dim is None:
+            self._dim = dim
+        elif dim != self._dim:
+            raise ValueError(f"Expected vectors of dimension {self._dim}, got {dim}")
+        size = self._n_rows
+        if self._matrix is None and self._codes is None:
+            self._capacity = max(self.initial_capacity, extra_rows)
+            self._matrix = np.zeros((self._capacity, dim), dtype=np.float32)
+            self._deleted = np.zeros(self._capacity, dtype=bool)
+            return
+        if size + extra_rows <= self._capacity and self._is_writeable():
+            return
+        self._capacity = max(self._capacity * 2, size + extra_rows)
+        self._matrix = self._grow(self._matrix, size)
+        self._codes = self._grow(self._codes, size)
+        self._deleted = self._grow(self._deleted, size)
+
+    def _is_writeable(self) -> bool:
+        # Arrays memory-mapped read-only by ``load`` are copied on the first write.
+        return all(array is None or array.flags.writeable for array in (self._matrix, self._codes))
+
+    def _grow(self, array: Optional[np.ndarray], size: int) -> Optional[np.ndarray]:
+        if array is None:
+            return None
+        grown = np.zeros((self._capacity,) + array.shape[1:], dtype=array.dtype)
+        grown[:size] = array[:size]
+        return grown
 
     def insert(self, key: str, vector: np.array) -> None:
-        self.vectors[key] = vector
+        """Stores ``vector`` under ``key``, which also serves as the row's text."""
+        self.upsert([key], np.asarray(vector)[None, :])
+
+    def insert_many(
+        self,
+        keys: List[str],
+        vectors: np.ndarray,
+        texts: Optional[List[str]] = None,
+        metadatas: Optional[List[Dict[str, Any]]] = None,
+    ) -> None:
+        self.upsert(keys, vectors, texts, metadatas)
+
+    def upsert(
+        self,
+        ids: List[str],
+        vectors: np.ndarray,
+        texts: Optional[List[str]] = None,
+        metadatas: Optional[List[Dict[str, Any]]] = None,
+    ) -> None:
+        """
+        Inserts or replaces vectors by id. A replaced row is tombstoned and the new
+        vector appended, so existing storage is never rewritten.
+
+        :param ids: Stable ids of the vectors
+        :param vectors: (len(ids), dim) array
+        :param texts: Text returned by searches for each row (defaults to the id)
+        :param metadatas: Filterable metadata dict for each row
+        """
+        vectors = normalize_rows(np.atleast_2d(vectors))
+        texts = ids if texts is None else texts
+        metadatas = [None] * len(ids) if metadatas is None else metadatas
+        if not len(ids) == vectors.shape[0] == len(texts) == len(metadatas):
+            raise ValueError("ids, vectors, texts and metadatas must have the same length")
+        self._ensure_capacity(vectors.shape[1], vectors.shape[0])
+        first_row = self._n_rows
+        for key, text, metadata in zip(ids, texts, metadatas):
+            self._tombstone(key)
+            self._id_to_row[key] = self._n_rows
+            self._ids.append(key)
+            self._texts.append(text)
+            self._metadata.append(metadata)
+        self.metadata_index.add(first_row, metadatas)
+        if self.lexical_index.n_rows == first_row:
+            self.lexical_index.add(first_row, texts)
+        rows = np.arange(first_row, self._n_rows)
+        if self._matrix is not None:
+            self._matrix[rows] = vectors
+        if self._codes is not None:
+            self._codes[rows] = self.quantizer.encode(vectors)
+        elif self.quantizer is not None and self.quantizer.is_trained:
+            # Quantizers that need no training (e.g. TruncatedQuantizer) encode from the first insert.
+            self._encode_rows()
+        if self.index is not None and self.index.is_trained:
+            self.index.add(rows, vectors)
+        self._version += 1
+        self._maybe_compact()
+
+    def _tombstone(self, key: str) -> bool:
+        row = self._id_to_row.pop(key, None)
+        if row is None:
+            return False
+        self._deleted[row] = True
+        self._n_deleted += 1
+        return True
+
+    def delete(self, ids: List[str]) -> int:
+        """Tombstones the given ids and returns how many were present."""
+        deleted = sum(self._tombstone(key) for key in ids)
+        if deleted:
+            self._version += 1
+        self._maybe_compact()
+        return deleted
+
+    def _maybe_compact(self) -> None:
+        if (
+            self.compact_threshold is not None
+            and self._n_deleted
+            and self._n_deleted >= self.compact_threshold * self._n_rows
+        ):
+            self.compact()
+
+    def compact(self) -> None:
+        """Drops tombstoned rows, rewriting the storage once for all pending deletes."""
+        if not self._n_deleted:
+            return
+        keep = np.flatnonzero(~self._deleted[: self._n_rows])
+        self._capacity = max(self.initial_capacity, keep.size)
+
+        def take(array: Optional[np.ndarray]) -> Optional[np.ndarray]:
+            if array is None:
+                return None
+            compacted = np.zeros((self._capacity,) + array.shape[1:], dtype=array.dtype)
+            compacted[: keep.size] = array[keep]
+            return compacted
+
+        if self.lexical_index.n_rows == self._n_rows:
+            self.lexical_index.compact(keep)
+        else:
+            self.lexical_index.clear()
+        self._matrix = take(self._matrix)
+        self._codes = take(self._codes)
+        self._deleted = np.zeros(self._capacity, dtype=bool)
+        self._n_deleted = 0
+        self._ids = [self._ids[row] for row in keep]
+        self._texts = [self._texts[row] for row in keep]
+        self._metadata = [self._metadata[row] for row in keep]
+        self.metadata_index.compact(keep)
+        self._id_to_row = {key: row for row, key in enumerate(self._ids)}
+        if self.index is not None and self.index.is_trained:
+            self.index.compact(keep)
+
+    def prepare_for_reads(self) -> None:
+        """
+        Builds the structures that searches otherwise fill in lazily (the BM25
+        index after ``load``, filter posting arrays, IVF lists). Afterwards
+        searches do not modify the database until it is written to, so several
+        threads can search it at once.
+        """
+        self._sync_lexical_index()
+        self.metadata_index.build_posting_arrays()
+        if self.index is not None and self.index.is_trained and self.index._order is None:
+            self.index._build_lists()
+
+    def _fork(self) -> "VectorDatabase":
+        """
+        A writable successor of this database for building its next version.
+
+        Vector and code storage is shared, not copied: the fork only appends
+        rows past this database's last row, which this database never reads,
+        and growth or compaction moves the fork to new arrays. The metadata,
+        lexical and approximate indexes are forked copy-on-write, so only the
+        posting lists a write touches are copied. The per-row tombstones, ids,
+        texts, metadata and id map are still copied in full; those are flat
+        copies, but they make a fork O(rows). This database must not be modified
+        afterwards (see ``SnapshotVectorDatabase``).
+        """
+        fork = copy.copy(self)
+        fork._deleted = self._deleted.copy()
+        fork._ids = list(self._ids)
+        fork._texts = list(self._texts)
+        fork._metadata = list(self._metadata)
+        fork._id_to_row = dict(self._id_to_row)
+        fork.metadata_index = self.metadata_index.fork()
+        fork.lexical_index = self.lexical_index.fork()
+        if self.index is not None:
+            fork.index = self.index.fork()
+        # Codebooks are small and independent of the number of rows.
+        fork.quantizer = copy.deepcopy(self.quantizer)
+        return fork
+
+    def build_index(self) -> None:
+        """Trains the approximate index on the current rows and adds all of them."""
+        if self.index is None:
+            raise ValueError("VectorDatabase was created without an index")
+        if len(self) == 0:
+            raise ValueError("Cannot build an index over an empty VectorDatabase")
+        matrix = self.matrix
+        self.index.train(matrix)
+        self.index.add(np.arange(self._n_rows), matrix)
+        self._version += 1
+
+    def train_quantizer(self) -> None:
+        """
+        Trains the quantizer on the current rows and encodes all of them. Unless
+        ``keep_full_vectors`` is set, the float32 matrix is released afterwards.
+        """
+        if self.quantizer is None:
+            raise ValueError("VectorDatabase was created without a quantizer")
+        if len(self) == 0:
+            raise ValueError("Cannot train a quantizer on an empty VectorDatabase")
+        self.quantizer.train(self.matrix)
+        self._encode_rows()
+        self._version += 1
+
+    def _encode_rows(self) -> None:
+        codes = self.quantizer.encode(self.matrix)
+        self._codes = np.zeros((self._capacity,) + codes.shape[1:], dtype=codes.dtype)
+        self._codes[: self._n_rows] = codes
+        if not self.keep_full_vectors:
+            self._matrix = None
+
+    def memory_usage(self) -> Dict[str, int]:
+        """Bytes held by each storage component for the populated rows."""
+        size = self._n_rows
+        usage = {
+            "full_vectors": 0 if self._matrix is None else self._matrix[:size].nbytes,
+            "codes": 0 if self._codes is None else self._codes[:size].nbytes,
+            "quantizer": 0 if self.quantizer is None else self.quantizer.nbytes,
+        }
+        usage["total"] = sum(usage.values())
+        return usage
+
+    def _use_index(self, distance_measure: Callable, exact: bool) -> bool:
+        return (
+            not exact
+            and distance_measure is cosine_similarity
+            and self.index is not None
+            and self.index.is_trained
+        )
+
+    def _deleted_rows(self) -> Optional[np.ndarray]:
+        return self._deleted[: self._n_rows] if self._n_deleted else None
+
+    def _allowed_rows(self, filter: Dict[str, Any]) -> np.ndarray:
+        """Mask of live rows whose metadata matches ``filter``."""
+        allowed = self.metadata_index.mask(filter, self._n_rows)
+        if self._n_deleted:
+            allowed &= ~self._deleted[: self._n_rows]
+        return allowed
+
+    def _search_rows(
+        self, query: np.ndarray, k: int, exact: bool, filter: Optional[Dict[str, Any]] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Cosine top-k for a normalized query; returns (rows, scores), best first."""
+        deleted = self._deleted_rows()
+        rows = None
+        use_index = self._use_index(cosine_similarity, exact)
+        if filter is not None:
+            allowed = self._allowed_rows(filter)
+            deleted = None
+            # A selective filter leaves fewer rows than the index would probe, so
+            # scanning them exactly is both cheaper and more accurate.
+            if use_index and np.count_nonzero(allowed) > self._n_rows * self.index.nprobe / self.index.n_lists:
+                rows = self.index.candidates(query)
+                rows = rows[allowed[rows]]
+            else:
+                rows = np.flatnonzero(allowed)
+        elif use_index:
+            rows = self.index.candidates(query)
+            if deleted is not None:
+                rows = rows[~deleted[rows]]
+            deleted = None
+
+        if self._codes is not None and not (exact and self._matrix is not None):
+            codes = self._codes[: self._n_rows] if rows is None else self._codes[rows]
+            scores = self.quantizer.scores(query, codes)
+            if deleted is not None:
+                scores[deleted] = -np.inf
+            if self._matrix is None or self.rescore_factor <= 0:
+                return self._best(rows, scores, k)
+            shortlist = top_k_indices(scores, k * self.rescore_factor)
+            shortlist = shortlist[np.isfinite(scores[shortlist])]
+            rows = shortlist if rows is None else rows[shortlist]
+            deleted = None
+
+        scores = self.matrix @ query if rows is None else self._matrix[rows] @ query
+        if deleted is not None:
+            scores[deleted] = -np.inf
+        return self._best(rows, scores, k)
+
+    @staticmethod
+    def _best(rows: Optional[np.ndarray], scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        best = top_k_indices(scores, k)
+        best = best[np.isfinite(scores[best])]
+        return (best if rows is None else rows[best]), scores[best]
+
+    def _label(self, row: int, return_ids: bool) -> str:
+        return self._ids[row] if return_ids else self._texts[row]
+
+    def _score(
+        self, query_vector: np.array, distance_measure: Callable, filter: Optional[Dict[str, Any]] = None
+    ) -> np.ndarray:
+        # Custom measures are applied row by row against the stored (normalized) vectors.
+        allowed = None if filter is None else self._allowed_rows(filter)
+        scores = np.full(self._n_rows, -np.inf)
+        for row, vector in enumerate(self.matrix):
+            if allowed is None or allowed[row]:
+                scores[row] = distance_measure(query_vector, vector)
+        deleted = self._deleted_rows()
+        if deleted is not None:
+            scores[deleted] = -np.inf
+        return scores
 
     def search(
         self,
         query_vector: np.array,
         k: int,
         distance_measure: Callable = cosine_similarity,
+        exact: bool = False,
+        return_ids: bool = False,
+        filter: Optional[Dict[str, Any]] = None,
     ) -> List[Tuple[str, float]]:
-        scores = [
-            (key, distance_measure(query_vector, vector))
-            for key, vector in self.vectors.items()
-        ]
-        return sorted(scores, key=lambda x: x[1], reverse=True)[:k]
+        """
+        Returns the ``k`` best ``(text, score)`` pairs, or ``(id, score)`` pairs
+        when ``return_ids`` is set, among rows whose metadata matches ``filter``.
+        """
+        if len(self) == 0:
+            return []
+        with metrics.span("vectordb.search"):
+            if distance_measure is cosine_similarity:
+                query = normalize_rows(np.asarray(query_vector).reshape(1, -1))[0]
+                rows, scores = self._search_rows(query, k, exact, filter)
+            else:
+                rows, scores = self._best(None, self._score(query_vector, distance_measure, filter), k)
+        return [(self._label(row, return_ids), float(score)) for row, score in zip(rows, scores)]
+
+    def search_many(
+        self,
+        query_vectors: np.ndarray,
+        k: int,
+        distance_measure: Callable = cosine_similarity,
+        query_batch_size: int = 256,
+        exact: bool = False,
+        return_ids: bool = False,
+        filter: Optional[Dict[str, Any]] = None,
+    ) -> List[List[Tuple[str, float]]]:
+        """
+        Searches a batch of queries and returns one top-k list per query.
+
+        Cosine scores for up to ``query_batch_size`` queries are computed with a
+        single matrix-matrix product, which bounds the size of the score matrix.
+        """
+        query_vectors = np.atleast_2d(np.asarray(query_vectors))
+        if len(self) == 0:
+            return [[] for _ in range(query_vectors.shape[0])]
+        metrics.observe("vectordb.search_many.batch_size", query_vectors.shape[0])
+        with metrics.span("vectordb.search_many"):
+            if (
+                distance_measure is not cosine_similarity
+                or self._use_index(distance_measure, exact)
+                or (self.is_quantized and not (exact and self._matrix is not None))
+            ):
+                # Approximate and quantized queries use per-query candidate sets.
+                return [
+                    self.search(query, k, distance_measure, exact, return_ids, filter)
+                    for query in query_vectors
+                ]
+
+            deleted = self._deleted_rows()
+            rows = None
+            candidates = self.matrix
+            if filter is not None:
+                # Only the matching rows take part in the matrix-matrix product.
+                rows = np.flatnonzero(self._allowed_rows(filter))
+                candidates = self._matrix[rows]
+                deleted = None
+            results = []
+            for start in range(0, query_vectors.shape[0], query_batch_size):
+                queries = normalize_rows(query_vectors[start : start + query_batch_size])
+                scores = queries @ candidates.T
+                if deleted is not None:
+                    scores[:, deleted] = -np.inf
+                for row_scores, best in zip(scores, top_k_indices_2d(scores, k)):
+                    results.append(
+                        [
+                            (self._label(i if rows is None else rows[i], return_ids), float(row_scores[i]))
+                            for i in best
+                            if np.isfinite(row_scores[i])
+                        ]
+                    )
+            return results
+
+    def _embedding_key(self, query_text: str) -> tuple:
+        model = self.embedding_model
+        return (model.embeddings_model_name, model.dimensions, query_text)
+
+    def _query_embedding(self, query_text: str) -> np.array:
+        if self.query_cache is None:
+            return self.embedding_model.get_embedding(query_text)
+        key = self._embedding_key(query_text)
+        query_vector = self.query_cache.embeddings.get(key)
+        if query_vector is None:
+            query_vector = self.embedding_model.get_embedding(query_text)
+            self.query_cache.embeddings.put(key, query_vector)
+        return query_vector
+
+    async def _aquery_embedding(self, query_text: str) -> np.array:
+        if self.query_cache is None:
+            return await self.embedding_model.async_get_embedding(query_text)
+        key = self._embedding_key(query_text)
+        query_vector = self.query_cache.embeddings.get(key)
+        if query_vector is None:
+            query_vector = await self.embedding_model.async_get_embedding(query_text)
+            self.query_cache.embeddings.put(key, query_vector)
+        return query_vector
+
+    def _results_key(
+        self, query_text: str, k: int, distance_measure: Callable, return_ids: bool, filter: Optional[Dict[str, Any]]
+    ) -> Optional[tuple]:
+        if self.query_cache is None:
+            return None
+        # The version is read before searching: results of a search that races
+        # a write are filed under the outdated version and never looked up again.
+        return (
+            query_text,
+            k,
+            distance_measure,
+            return_ids,
+            None if filter is None else json.dumps(filter, sort_keys=True, default=str),
+            self.version,
+        )
+
+    def _cached_results(self, key: Optional[tuple]) -> Optional[List[Tuple[str, float]]]:
+        if key is None:
+            return None
+        results = self.query_cache.results.get(key)
+        if results is None:
+            metrics.increment("vectordb.query_cache_misses")
+            return None
+        metrics.increment("vectordb.query_cache_hits")
+        return list(results)
+
+    def _cache_results(self, key: Optional[tuple], results: List[Tuple[str, float]]) -> None:
+        if key is not None:
+            self.query_cache.results.put(key, tuple(results))
 
     def search_by_text(
         self,
@@ -39,20 +662,393 @@ class VectorDatabase:
         k: int,
         distance_measure: Callable = cosine_similarity,
         return_as_text: bool = False,
+        return_ids: bool = False,
+        filter: Optional[Dict[str, Any]] = None,
+    ) -> List[Tuple[str, float]]:
+        key = self._results_key(query_text, k, distance_measure, return_ids, filter)
+        results = self._cached_results(key)
+        if results is None:
+            query_vector = self._query_embedding(query_text)
+            results = self.search(query_vector, k, distance_measure, return_ids=return_ids, filter=filter)
+            self._cache_results(key, results)
+        return [result[0] for result in results] if return_as_text else results
+
+    async def asearch_by_text(
+        self,
+        query_text: str,
+        k: int,
+        distance_measure: Callable = cosine_similarity,
+        return_as_text: bool = False,
+        return_ids: bool = False,
+        filter: Optional[Dict[str, Any]] = None,
+    ) -> List[Tuple[str, float]]:
+        """
+        Async variant of ``search_by_text`` using ``async_get_embedding``; shares
+        its query cache. The scan runs in a worker thread so it does not block
+        the event loop; call ``prepare_for_reads`` before running many at once.
+        """
+        key = self._results_key(query_text, k, distance_measure, return_ids, filter)
+        results = self._cached_results(key)
+        if results is None:
+            query_vector = await self._aquery_embedding(query_text)
+            results = await asyncio.to_thread(
+                self.search, query_vector, k, distance_measure, return_ids=return_ids, filter=filter
+            )
+            self._cache_results(key, results)
+        return [result[0] for result in results] if return_as_text else results
+
+    def search_by_texts(
+        self,
+        query_texts: List[str],
+        k: int,
+        distance_measure: Callable = cosine_similarity,
+        return_as_text: bool = False,
+        return_ids: bool = False,
+        filter: Optional[Dict[str, Any]] = None,
+    ) -> List[List[Tuple[str, float]]]:
+        """Embeds all queries in one request and searches them as a batch."""
+        if not query_texts:
+            return []
+        query_vectors = self.embedding_model.get_embeddings(query_texts)
+        results = self.search_many(
+            np.asarray(query_vectors), k, distance_measure, return_ids=return_ids, filter=filter
+        )
+        return [[result[0] for result in per_query] for per_query in results] if return_as_text else results
+
+    async def asearch_by_texts(
+        self,
+        query_texts: List[str],
+        k: int,
+        distance_measure: Callable = cosine_similarity,
+        return_as_text: bool = False,
+        return_ids: bool = False,
+        filter: Optional[Dict[str, Any]] = None,
+    ) -> List[List[Tuple[str, float]]]:
+        """Async variant of ``search_by_texts`` using ``async_get_embeddings``; scans in a worker thread."""
+        if not query_texts:
+            return []
+        query_vectors = await self.embedding_model.async_get_embeddings(query_texts)
+        results = await asyncio.to_thread(
+            self.search_many, np.asarray(query_vectors), k, distance_measure, return_ids=return_ids, filter=filter
+        )
+        return [[result[0] for result in per_query] for per_query in results] if return_as_text else results
+
+    def _sync_lexical_index(self) -> None:
+        # After ``load`` the BM25 index is rebuilt from the texts on first use.
+        if self.lexical_index.n_rows < self._n_rows:
+            first_row = self.lexical_index.n_rows
+            self.lexical_index.add(first_row, self._texts[first_row:])
+
+    def _lexical_rows(
+        self, query_text: str, k: int, filter: Optional[Dict[str, Any]] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        self._sync_lexical_index()
+        if filter is not None:
+            mask = self._allowed_rows(filter)
+        else:
+            mask = None if self._n_deleted == 0 else ~self._deleted[: self._n_rows]
+        return self.lexical_index.search(query_text, k, mask)
+
+    def lexical_search(
+        self,
+        query_text: str,
+        k: int,
+        return_as_text: bool = False,
+        return_ids: bool = False,
+        filter: Optional[Dict[str, Any]] = None,
     ) -> List[Tuple[str, float]]:
-        query_vector = self.embedding_model.get_embedding(query_text)
-        results = self.search(query_vector, k, distance_measure)
+        """BM25 keyword search over the row texts; needs no embedding call."""
+        with metrics.span("vectordb.lexical_search"):
+            rows, scores = self._lexical_rows(query_text, k, filter)
+        results = [(self._label(row, return_ids), float(score)) for row, score in zip(rows, scores)]
+        return [result[0] for result in results] if return_as_text else results
+
+    def _hybrid(
+        self,
+        query_text: str,
+        query_vector: np.array,
+        k: int,
+        fusion: str,
+        vector_weight: float,
+        rrf_k: int,
+        candidate_factor: int,
+        return_ids: bool,
+        filter: Optional[Dict[str, Any]],
+    ) -> List[Tuple[str, float]]:
+        if len(self) == 0:
+            return []
+        n_candidates = k * max(1, candidate_factor)
+        query = normalize_rows(np.asarray(query_vector).reshape(1, -1))[0]
+        vector_results = self._search_rows(query, n_candidates, False, filter)
+        lexical_results = self._lexical_rows(query_text, n_candidates, filter)
+        weights = [vector_weight, 1.0 - vector_weight]
+        if fusion == "rrf":
+            fused = reciprocal_rank_fusion([vector_results[0], lexical_results[0]], rrf_k, weights)
+        elif fusion == "weighted":
+            fused = weighted_score_fusion([vector_results, lexical_results], weights)
+        else:
+            raise ValueError(f"Unknown fusion method: {fusion!r} (expected 'rrf' or 'weighted')")
+        return [(self._label(row, return_ids), score) for row, score in fused[:k]]
+
+    def hybrid_search(
+        self,
+        query_text: str,
+        k: int,
+        fusion: str = "rrf",
+        vector_weight: float = 0.5,
+        rrf_k: int = 60,
+        candidate_factor: int = 4,
+        return_as_text: bool = False,
+        return_ids: bool = False,
+        filter: Optional[Dict[str, Any]] = None,
+    ) -> List[Tuple[str, float]]:
+        """
+        Fuses cosine and BM25 rankings, so exact-term queries (names, error codes)
+        still surface rows that embeddings rank low.
+
+        :param fusion: ``"rrf"`` (reciprocal rank fusion) or ``"weighted"``
+            (weighted sum of min-max normalized scores)
+        :param vector_weight: Weight of the vector ranking; BM25 gets the rest
+        :param rrf_k: Rank offset of reciprocal rank fusion
+        :param candidate_factor: Each retriever contributes ``k * candidate_factor`` rows
+        """
+        query_vector = self._query_embedding(query_text)
+        results = self._hybrid(
+            query_text, query_vector, k, fusion, vector_weight, rrf_k, candidate_factor, return_ids, filter
+        )
+        return [result[0] for result in results] if return_as_text else results
+
+    async def ahybrid_search(
+        self,
+        query_text: str,
+        k: int,
+        fusion: str = "rrf",
+        vector_weight: float = 0.5,
+        rrf_k: int = 60,
+        candidate_factor: int = 4,
+        return_as_text: bool = False,
+        return_ids: bool = False,
+        filter: Optional[Dict[str, Any]] = None,
+    ) -> List[Tuple[str, float]]:
+        """Async variant of ``hybrid_search`` using ``async_get_embedding``; scans in a worker thread."""
+        query_vector = await self._aquery_embedding(query_text)
+        results = await asyncio.to_thread(
+            self._hybrid, query_text, query_vector, k, fusion, vector_weight, rrf_k, candidate_factor, return_ids, filter
+        )
         return [result[0] for result in results] if return_as_text else results
 
     def retrieve_from_key(self, key: str) -> np.array:
-        return self.vectors.get(key, None)
+        """Returns the stored (L2-normalized) vector for ``key``, or None."""
+        row = self._id_to_row.get(key)
+        if row is None:
+            return None
+        if self._matrix is None:
+            return self.quantizer.decode(self._codes[row : row + 1])[0]
+        return self._matrix[row]
+
+    def get_text(self, key: str) -> Optional[str]:
+        row = self._id_to_row.get(key)
+        return None if row is None else self._texts[row]
+
+    def get_metadata(self, key: str) -> Optional[Dict[str, Any]]:
+        row = self._id_to_row.get(key)
+        return None if row is None else self._metadata[row]
+
+    def copy_rows(
+        self, ids: List[str], source_ids: List[str], metadatas: Optional[List[Dict[str, Any]]] = None
+    ) -> int:
+        """
+        Stores the vector and text of each ``source_ids`` row under the matching id
+        of ``ids`` as well, without an embedding call. Missing sources are skipped.
 
-    async def abuild_from_list(self, list_of_text: List[str]) -> "VectorDatabase":
+        :param metadatas: Metadata of the new rows (default: the source row's)
+        :return: Number of rows copied
+        """
+        metadatas = [None] * len(ids) if metadatas is None else metadatas
+        pairs = [
+            (key, source, metadata)
+            for key, source, metadata in zip(ids, source_ids, metadatas)
+            if source in self._id_to_row
+        ]
+        if pairs:
+            self.upsert(
+                [key for key, _, _ in pairs],
+                np.asarray([self.retrieve_from_key(source) for _, source, _ in pairs], dtype=np.float32),
+                [self.get_text(source) for _, source, _ in pairs],
+                [self.get_metadata(source) if metadata is None else metadata for _, source, metadata in pairs],
+            )
+        return len(pairs)
+
+    def ids_matching(self, filter: Dict[str, Any]) -> List[str]:
+        """Ids of the live rows whose metadata matches ``filter``."""
+        return [self._ids[row] for row in np.flatnonzero(self._allowed_rows(filter))]
+
+    def save(self, path: str) -> None:
+        """
+        Writes the database to the directory ``path``, compacting it first.
+
+        Vectors and codes are raw little-endian row-major arrays that ``np.memmap``
+        can open directly; ids, texts and metadata go to a JSON-lines sidecar and the header
+        records the format version, embedding model, dimension and row count.
+
+        Files are written to a sibling temporary directory that then replaces
+        ``path``, so an interrupted save never mixes old and new files, and
+        processes that memory-mapped the previous files keep reading them intact.
+        """
+        self.compact()
+        # Serialize the records first, so unsupported metadata fails before any file is written.
+        records = [
+            json.dumps({"id": key, "text": text, "metadata": metadata}, default=_encode_json) + "\n"
+            for key, text, metadata in zip(self._ids, self._texts, self._metadata)
+        ]
+        path = os.path.abspath(path)
+        target, path = path, f"{path}.tmp-{os.getpid()}"
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+        size = self._n_rows
+        header = {
+            "format_version": FORMAT_VERSION,
+            "model_name": getattr(self.embedding_model, "embeddings_model_name", None),
+            "dim": self._dim,
+            "count": size,
+            "has_full_vectors": self._matrix is not None,
+            "quantizer": None,
+            "codes_dtype": None,
+            "codes_shape": None,
+            "index": None,
+        }
+        if self._matrix is not None:
+            self._matrix[:size].astype("<f4").tofile(os.path.join(path, VECTORS_FILE))
+        if self._codes is not None:
+            self._codes[:size].tofile(os.path.join(path, CODES_FILE))
+            np.savez(os.path.join(path, QUANTIZER_FILE), **self.quantizer.arrays())
+            header["quantizer"] = self.quantizer.config()
+            header["codes_dtype"] = self._codes.dtype.str
+            header["codes_shape"] = list(self._codes.shape[1:])
+        if self.index is not None and self.index.is_trained:
+            np.savez(os.path.join(path, INDEX_FILE), **self.index.arrays())
+            header["index"] = self.index.config()
+        with open(os.path.join(path, KEYS_FILE), "w", encoding="utf-8") as f:
+            f.writelines(records)
+        with open(os.path.join(path, HEADER_FILE), "w", encoding="utf-8") as f:
+            json.dump(header, f, indent=2)
+        if os.path.exists(target):
+            # A directory can only be renamed over an empty one, so move the old one aside first.
+            previous = f"{target}.old-{os.getpid()}"
+            os.replace(target, previous)
+            os.replace(path, target)
+            shutil.rmtree(previous)
+        else:
+            os.replace(path, target)
+
+    @classmethod
+    def load(
+        cls,
+        path: str,
+        embedding_model: EmbeddingModel = None,
+        mmap: bool = True,
+        query_cache: Optional[QueryCache] = None,
+    ) -> "VectorDatabase":
+        """
+        Loads a database written by ``save``.
+
+        With ``mmap`` the vector and code files are memory-mapped read-only, so
+        startup does not read them and processes share pages through the OS page
+        cache; the first write to the database copies them into memory.
+        ``query_cache`` is passed to the constructor (see ``__init__``).
+
+        :raises ValueError: If the format version, embedding model or the model's
+            configured dimensions do not match
+        """
+        with open(os.path.join(path, HEADER_FILE), encoding="utf-8") as f:
+            header = json.load(f)
+        if header["format_version"] not in SUPPORTED_FORMAT_VERSIONS:
+            raise ValueError(f"Unsupported index format version: {header['format_version']}")
+        database = cls(embedding_model, query_cache=query_cache)
+        model_name = getattr(database.embedding_model, "embeddings_model_name", None)
+        if header["model_name"] and model_name and header["model_name"] != model_name:
+            raise ValueError(
+                f"Index was built with {header['model_name']}, but the embedding model is {model_name}"
+            )
+        dimensions = getattr(database.embedding_model, "dimensions", None)
+        if header["dim"] is not None and dimensions is not None and header["dim"] != dimensions:
+            raise ValueError(
+                f"Index holds {header['dim']}-dimensional vectors, but the embedding model returns {dimensions}"
+            )
+
+        def read_array(filename: str, dtype, shape: Tuple[int, ...]) -> np.ndarray:
+            filename = os.path.join(path, filename)
+            if shape[0] == 0:
+                return np.zeros(shape, dtype=dtype)
+            if mmap:
+                return np.memmap(filename, dtype=dtype, mode="r", shape=shape)
+            return np.fromfile(filename, dtype=dtype).reshape(shape)
+
+        count, dim = header["count"], header["dim"]
+        with open(os.path.join(path, KEYS_FILE), encoding="utf-8") as f:
+            records = [json.loads(line, object_hook=_decode_json) for line in f]
+        if header["format_version"] == 1:
+            # Version 1 stored bare keys, which doubled as the texts.
+            records = [{"id": key, "text": key} for key in records]
+        database._ids = [record["id"] for record in records]
+        database._texts = [record["text"] for record in records]
+        database._metadata = [record.get("metadata") for record in records]
+        database.metadata_index.add(0, database._metadata)
+        database._id_to_row = {key: row for row, key in enumerate(database._ids)}
+        database._dim = dim
+        database._capacity = count
+        database._deleted = np.zeros(count, dtype=bool)
+        database.keep_full_vectors = header["has_full_vectors"]
+        if header["has_full_vectors"]:
+            database._matrix = read_array(VECTORS_FILE, "<f4", (count, dim))
+        if header["quantizer"] is not None:
+            database.quantizer = quantizer_from_config(header["quantizer"])
+            with np.load(os.path.join(path, QUANTIZER_FILE)) as arrays:
+                database.quantizer.set_arrays(**arrays)
+            codes_shape = (count,) + tuple(header["codes_shape"])
+            database._codes = read_array(CODES_FILE, np.dtype(header["codes_dtype"]), codes_shape)
+        if header["index"] is not None:
+            database.index = IVFIndex(**header["index"])
+            with np.load(os.path.join(path, INDEX_FILE)) as arrays:
+                database.index.set_arrays(**arrays)
+        return database
+
+    async def abuild_from_list(
+        self,
+        list_of_text: List[str],
+        ids: Optional[List[str]] = None,
+        metadatas: Optional[List[Dict[str, Any]]] = None,
+        deduplicator: Optional[NearDuplicateDetector] = None,
+    ) -> "VectorDatabase":
+        """
+        Embeds and stores ``list_of_text``. Without ``ids`` each text is its own id,
+        so identical texts share one row. With a ``deduplicator``, exact and near
+        duplicates are neither embedded nor stored; it records them as aliases
+        of the row that is kept.
+        """
+        if deduplicator is not None:
+            keep = deduplicator.keep(ids or list_of_text, list_of_text)
+            # Aliases that took over a changed text's old content get its stored vector.
+            promotions = deduplicator.take_promotions()
+            self.copy_rows(list(promotions), list(promotions.values()))
+            list_of_text = [list_of_text[i] for i in keep]
+            ids = None if ids is None else [ids[i] for i in keep]
+            metadatas = None if metadatas is None else [metadatas[i] for i in keep]
         embeddings = await self.embedding_model.async_get_embeddings(list_of_text)
-        for text, embedding in zip(list_of_text, embeddings):
-            self.insert(text, np.array(embedding))
+        if embeddings:
+            self.upsert(
+                ids or list_of_text, np.asarray(embeddings, dtype=np.float32), list_of_text, metadatas
+            )
+        self.train_pending()
         return self
 
+    def train_pending(self) -> None:
+        """Trains a configured quantizer or index that has not been trained yet."""
+        if self.quantizer is not None and not self.is_quantized and len(self) > 0:
+            self.train_quantizer()
+        if self.index is not None and not self.index.is_trained and len(self) >= self.index.n_lists:
+            self.build_index()
+
 
 if __name__ == "__main__":
     list_of_text = [
@@ -63,7 +1059,7 @@ if __name__ == "__main__":
         "Look at this cute hamster munching on a piece of broccoli.",
     ]
 
-    vector_db = VectorDatabase()
+    vector_db = VectorDatabase(query_cache=QueryCache())
     vector_db = asyncio.run(vector_db.abuild_from_list(list_of_text))
     k = 2
 
@@ -79,3 +1075,12 @@ if __name__ == "__main__":
         "I think fruit is awesome!", k=k, return_as_text=True
     )
     print(f"Closest {k} text(s):", relevant_texts)
+
+    batched_texts = vector_db.search_by_texts(
+        ["I think fruit is awesome!", "Which pets are cute?"], k=k, return_as_text=True
+    )
+    print(f"Closest {k} text(s) per query:", batched_texts)
+
+    print("Keyword matches:", vector_db.lexical_search("hamster", k=k, return_as_text=True))
+    print("Hybrid matches:", vector_db.hybrid_search("cute hamster", k=k, return_as_text=True))
+    print("Query cache:", vector_db.query_cache.stats())
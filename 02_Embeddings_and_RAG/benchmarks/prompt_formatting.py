@@ -0,0 +1,179 @@
+"""
+Micro-benchmark: compiled prompt templates vs. the previous per-call parsing.
+
+Run from ``02_Embeddings_and_RAG``::
+
+    python -m benchmarks.prompt_formatting
+
+The ``Legacy*`` classes are verbatim copies of the formatting code that
+``aimakerspace.openai_utils.prompts`` used before templates were compiled, kept
+here as the reference point.
+"""
+import re
+import timeit
+from typing import Any, Dict, List, Optional
+
+from aimakerspace.openai_utils.prompts import BasePrompt, ConditionalPrompt, PromptValidationError
+
+
+class LegacyBasePrompt:
+    def __init__(self, prompt: str, strict: bool = False, defaults: Optional[Dict[str, Any]] = None):
+        self.prompt = prompt
+        self.strict = strict
+        self.defaults = defaults or {}
+        self._pattern = re.compile(r"\{([^}]+)\}")
+
+    def format_prompt(self, **kwargs) -> str:
+        variables = self._pattern.findall(self.prompt)
+        merged_kwargs = {**self.defaults, **kwargs}
+        if self.strict:
+            missing_vars = set(variables) - set(merged_kwargs.keys())
+            if missing_vars:
+                raise PromptValidationError(f"Missing required variables: {missing_vars}")
+        format_dict = {var: merged_kwargs.get(var, self.defaults.get(var, "")) for var in variables}
+        return self.prompt.format(**format_dict)
+
+
+class LegacyConditionalPrompt:
+    def __init__(self, prompt: str, strict: bool = False, defaults: Optional[Dict[str, Any]] = None):
+        self.prompt = prompt
+        self.strict = strict
+        self.defaults = defaults or {}
+        self._var_pattern = re.compile(r'\{([^{}]+)\}')
+        self._conditional_pattern = re.compile(r'\{if\s+([^}]+)\}(.*?)(?:\{else\}(.*?))?\{/if\}', re.DOTALL)
+
+    def format_prompt(self, **kwargs) -> str:
+        merged_kwargs = {**self.defaults, **kwargs}
+        result = self._process_conditionals(self.prompt, merged_kwargs)
+        variables = self._var_pattern.findall(result)
+        if self.strict:
+            missing_vars = set(variables) - set(merged_kwargs.keys())
+            if missing_vars:
+                raise PromptValidationError(f"Missing required variables: {missing_vars}")
+        for var in variables:
+            value = merged_kwargs.get(var, "")
+            result = result.replace(f"{{{var}}}", str(value))
+        return result
+
+    def _process_conditionals(self, text: str, context: Dict[str, Any]) -> str:
+        def replace_conditional(match):
+            condition = match.group(1).strip()
+            true_content = match.group(2).strip()
+            false_content = match.group(3).strip() if match.group(3) else ""
+            try:
+                if condition in context:
+                    condition_result = bool(context[condition])
+                else:
+                    condition_result = self._evaluate_condition(condition, context)
+                return true_content if condition_result else false_content
+            except Exception:
+                return false_content
+
+        return self._conditional_pattern.sub(replace_conditional, text)
+
+    def _evaluate_condition(self, condition: str, context: Dict[str, Any]) -> bool:
+        if '==' in condition:
+            parts = condition.split('==')
+            if len(parts) == 2:
+                left = parts[0].strip()
+                right = parts[1].strip().strip('"').strip("'")
+                return str(context.get(left, "")) == right
+        for op in ['>', '<', '>=', '<=', '!=']:
+            if op in condition:
+                parts = condition.split(op)
+                if len(parts) == 2:
+                    left = parts[0].strip()
+                    right = parts[1].strip()
+                    try:
+                        left_val = float(context.get(left, 0))
+                        right_val = float(right)
+                        if op == '>': return left_val > right_val
+                        elif op == '<': return left_val < right_val
+                        elif op == '>=': return left_val >= right_val
+                        elif op == '<=': return left_val <= right_val
+                        elif op == '!=': return left_val != right_val
+                    except (ValueError, TypeError):
+                        return False
+        return bool(context.get(condition, False))
+
+
+RAG_TEMPLATE = """Use the provided context to answer the user's query.
+
+You may not answer the user's query unless there is specific context in the following text.
+
+If you do not know the answer, or cannot answer, please respond with "I don't know".
+
+Context:
+{context}
+
+User Query:
+{user_query}"""
+
+CONDITIONAL_TEMPLATE = """You are a helpful assistant for {company}.
+{if premium}The user is a premium customer; answer in depth.{else}Keep answers brief.{/if}
+{if n_sources > 3}Cite the most relevant of the {n_sources} sources.{/if}
+{if language == "fr"}Answer in French.{else}Answer in English.{/if}
+
+Context:
+{context}
+
+Question:
+{user_query}"""
+
+
+def make_contexts(n: int, context_chars: int) -> List[Dict[str, Any]]:
+    passage = "Retrieved passage about startups, hiring and product/market fit. "
+    context = (passage * (context_chars // len(passage) + 1))[:context_chars]
+    return [
+        {
+            "context": context,
+            "user_query": f"Question number {i}?",
+            "company": "AI Makerspace",
+            "premium": i % 2 == 0,
+            "n_sources": i % 7,
+            "language": "fr" if i % 5 == 0 else "en",
+        }
+        for i in range(n)
+    ]
+
+
+def seconds_per_prompt(function, n_prompts: int, repeats: int = 5) -> float:
+    return min(timeit.repeat(function, number=1, repeat=repeats)) / n_prompts
+
+
+def run(n_prompts: int = 2000, context_chars: int = 8000) -> Dict[str, Dict[str, float]]:
+    contexts = make_contexts(n_prompts, context_chars)
+    results = {}
+    for name, template, legacy, compiled in (
+        ("BasePrompt", RAG_TEMPLATE, LegacyBasePrompt(RAG_TEMPLATE), BasePrompt(RAG_TEMPLATE)),
+        (
+            "ConditionalPrompt",
+            CONDITIONAL_TEMPLATE,
+            LegacyConditionalPrompt(CONDITIONAL_TEMPLATE),
+            ConditionalPrompt(CONDITIONAL_TEMPLATE),
+        ),
+    ):
+        expected = [legacy.format_prompt(**context) for context in contexts]
+        assert compiled.format_many(contexts) == expected, f"{name} output differs from the legacy implementation"
+        timings = {
+            "legacy_format_prompt": seconds_per_prompt(
+                lambda: [legacy.format_prompt(**context) for context in contexts], n_prompts
+            ),
+            "format_prompt": seconds_per_prompt(
+                lambda: [compiled.format_prompt(**context) for context in contexts], n_prompts
+            ),
+            "format_many": seconds_per_prompt(lambda: compiled.format_many(contexts), n_prompts),
+        }
+        timings["speedup"] = timings["legacy_format_prompt"] / timings["format_many"]
+        results[name] = timings
+    return results
+
+
+if __name__ == "__main__":
+    for name, timings in run().items():
+        print(
+            f"{name:>18}: legacy {timings['legacy_format_prompt'] * 1e6:7.2f} us/prompt, "
+            f"format_prompt {timings['format_prompt'] * 1e6:7.2f} us/prompt, "
+            f"format_many {timings['format_many'] * 1e6:7.2f} us/prompt "
+            f"({timings['speedup']:.1f}x)"
+        )
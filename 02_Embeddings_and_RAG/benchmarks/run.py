@@ -0,0 +1,402 @@
+"""
+Offline benchmark suite for ``aimakerspace``.
+
+Every benchmark runs against deterministic in-process fakes (hash-based
+embeddings and canned chat replies from ``aimakerspace.openai_utils.fakes``),
+so no API key or network access is needed and numbers are comparable between
+commits. Run from ``02_Embeddings_and_RAG``::
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --sizes 1000 100000 --only vectordb splitter
+    python -m benchmarks.run --only sharded --sizes 1000000 --shards 1 2 4 8
+    python -m benchmarks.run --output new.json --baseline results.json
+
+Results are written as JSON together with the commit, Python and NumPy
+versions; ``--baseline`` prints the relative change of every metric.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from aimakerspace.openai_utils.chatmodel import ChatOpenAI
+from aimakerspace.openai_utils.embedding import EmbeddingModel
+from aimakerspace.openai_utils.fakes import FakeAsyncOpenAIClient, FakeOpenAIClient
+from aimakerspace.openai_utils.prompts import SystemRolePrompt, UserRolePrompt
+from aimakerspace.rag import RetrievalAugmentedQAPipeline
+from aimakerspace.sharding import ShardedVectorDatabase
+from aimakerspace.text_utils import CharacterTextSplitter, RecursiveTextSplitter, TextFileLoader
+from aimakerspace.vectordatabase import VectorDatabase
+from benchmarks import prompt_formatting
+
+CORPUS = os.path.join("data", "PMarcaBlogs.txt")
+SECTIONS = ("vectordb", "sharded", "splitter", "loader", "prompts", "rag")
+
+
+def fake_embedding_model(dimensions: int, latency: float = 0.0) -> EmbeddingModel:
+    """The real ``EmbeddingModel`` wired to deterministic fake clients."""
+    return EmbeddingModel(
+        client=FakeOpenAIClient(dimensions=dimensions, latency=latency),
+        async_client=FakeAsyncOpenAIClient(dimensions=dimensions, latency=latency),
+    )
+
+
+def fake_chat_model(latency: float = 0.0, token_latency: float = 0.0) -> ChatOpenAI:
+    return ChatOpenAI(
+        client=FakeOpenAIClient(latency=latency, token_latency=token_latency),
+        async_client=FakeAsyncOpenAIClient(latency=latency, token_latency=token_latency),
+    )
+
+
+def latency_stats(samples: List[float]) -> Dict[str, float]:
+    samples = np.asarray(samples) * 1000
+    return {
+        "mean_ms": float(samples.mean()),
+        "p50_ms": float(np.percentile(samples, 50)),
+        "p95_ms": float(np.percentile(samples, 95)),
+        "p99_ms": float(np.percentile(samples, 99)),
+    }
+
+
+def measure(function: Callable[[], Any], repeats: int) -> List[float]:
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def read_corpus() -> str:
+    text, _ = TextFileLoader(CORPUS).read_document(CORPUS)
+    return text
+
+
+def bench_vectordb(sizes: List[int], dim: int, n_queries: int, k: int = 10) -> Dict[str, Any]:
+    results = {}
+    for n in sizes:
+        rng = np.random.default_rng(0)
+        embedding_model = fake_embedding_model(dim)
+        db = VectorDatabase(embedding_model)
+
+        batch_size = 10_000
+        start = time.perf_counter()
+        for first in range(0, n, batch_size):
+            count = min(batch_size, n - first)
+            ids = [f"v{i}" for i in range(first, first + count)]
+            db.insert_many(ids, rng.standard_normal((count, dim), dtype=np.float32))
+        insert_many_seconds = time.perf_counter() - start
+
+        n_single = min(n, 5_000)
+        single_db = VectorDatabase(embedding_model)
+        vectors = rng.standard_normal((n_single, dim), dtype=np.float32)
+        start = time.perf_counter()
+        for i in range(n_single):
+            single_db.insert(f"v{i}", vectors[i])
+        insert_seconds = time.perf_counter() - start
+        del single_db, vectors
+
+        queries = rng.standard_normal((n_queries, dim), dtype=np.float32)
+        search = [
+            sample
+            for query in queries
+            for sample in measure(lambda: db.search(query, k), 1)
+        ]
+        # Bound the (queries x rows) float32 score matrix to about 200 MB.
+        query_batch_size = max(1, min(256, 50_000_000 // n))
+        start = time.perf_counter()
+        db.search_many(queries, k, query_batch_size=query_batch_size)
+        search_many_seconds = time.perf_counter() - start
+        texts = [f"benchmark query {i}" for i in range(n_queries)]
+        search_by_text = [
+            sample
+            for text in texts
+            for sample in measure(lambda: db.search_by_text(text, k), 1)
+        ]
+
+        results[str(n)] = {
+            "vectors": n,
+            "dim": dim,
+            "insert_many_vectors_per_s": n / insert_many_seconds,
+            "insert_us_per_vector": insert_seconds / n_single * 1e6,
+            "search": latency_stats(search),
+            "search_many_us_per_query": search_many_seconds / n_queries * 1e6,
+            "search_by_text": latency_stats(search_by_text),
+            "memory_bytes": db.memory_usage()["total"],
+        }
+        del db
+    return results
+
+
+def bench_sharded(
+    sizes: List[int], dim: int, n_queries: int, shard_counts: List[int], k: int = 10
+) -> Dict[str, Any]:
+    """Search latency and batch throughput of ``ShardedVectorDatabase`` per shard count."""
+    results = {}
+    for n in sizes:
+        rng = np.random.default_rng(0)
+        db = VectorDatabase(fake_embedding_model(dim))
+        for first in range(0, n, 10_000):
+            count = min(10_000, n - first)
+            ids = [f"v{i}" for i in range(first, first + count)]
+            db.insert_many(ids, rng.standard_normal((count, dim), dtype=np.float32))
+        queries = rng.standard_normal((n_queries, dim), dtype=np.float32)
+        query_batch_size = max(1, min(256, 50_000_000 // n))
+        in_process = latency_stats(
+            [sample for query in queries for sample in measure(lambda: db.search(query, k), 1)]
+        )
+        by_shards = {"in_process": {"search": in_process}}
+        for n_shards in shard_counts:
+            with ShardedVectorDatabase(db, n_shards) as sharded:
+                search = [
+                    sample
+                    for query in queries
+                    for sample in measure(lambda: sharded.search(query, k), 1)
+                ]
+                start = time.perf_counter()
+                sharded.search_many(queries, k, query_batch_size=query_batch_size)
+                search_many_seconds = time.perf_counter() - start
+            stats = latency_stats(search)
+            by_shards[str(n_shards)] = {
+                "search": stats,
+                "search_many_us_per_query": search_many_seconds / n_queries * 1e6,
+                "speedup_vs_in_process": in_process["mean_ms"] / stats["mean_ms"],
+            }
+        results[str(n)] = by_shards
+        del db
+    return results
+
+
+def bench_splitter(repeats: int = 10) -> Dict[str, Any]:
+    texts = [read_corpus()]
+    megabytes = sum(len(text.encode("utf-8")) for text in texts) / 1e6
+    results = {}
+    for splitter in (CharacterTextSplitter(), RecursiveTextSplitter()):
+        for mode, run in (
+            ("spans", lambda: sum(1 for _ in splitter.iter_document_spans(texts))),
+            ("strings", lambda: len(splitter.split_texts(texts))),
+        ):
+            seconds = min(measure(run, repeats))
+            results[f"{type(splitter).__name__}.{mode}"] = {
+                "chunks": run(),
+                "mb_per_s": megabytes / seconds,
+            }
+    return results
+
+
+def make_tree(root: str, n_files: int, file_bytes: int, files_per_dir: int = 50) -> int:
+    """Writes ``n_files`` text files of about ``file_bytes`` each under ``root``."""
+    corpus = read_corpus()
+    total = 0
+    for i in range(n_files):
+        directory = os.path.join(root, f"d{i // files_per_dir:03d}", f"s{i % 3}")
+        os.makedirs(directory, exist_ok=True)
+        start = (i * 7919) % max(1, len(corpus) - file_bytes)
+        text = corpus[start : start + file_bytes]
+        with open(os.path.join(directory, f"f{i:05d}.txt"), "w", encoding="utf-8") as f:
+            f.write(text)
+        total += len(text.encode("utf-8"))
+    return total
+
+
+def bench_loader(n_files: int, file_bytes: int) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as root:
+        total_bytes = make_tree(root, n_files, file_bytes)
+        loader = TextFileLoader(root)
+        start = time.perf_counter()
+        loader.load()
+        load_seconds = time.perf_counter() - start
+
+        manifest = os.path.join(root, "manifest.json")
+        first = TextFileLoader(root)
+        list(first.iter_changes(manifest))
+        first.save_manifest(manifest)
+        start = time.perf_counter()
+        unchanged = list(TextFileLoader(root).iter_changes(manifest))
+        rescan_seconds = time.perf_counter() - start
+
+    return {
+        "files": n_files,
+        "bytes": total_bytes,
+        "load_mb_per_s": total_bytes / 1e6 / load_seconds,
+        "load_files_per_s": n_files / load_seconds,
+        "unchanged_rescan_ms": rescan_seconds * 1000,
+        "unchanged_rescan_changes": len(unchanged),
+    }
+
+
+def bench_prompts(n_prompts: int) -> Dict[str, Any]:
+    return prompt_formatting.run(n_prompts=n_prompts)
+
+
+RAG_SYSTEM_TEMPLATE = """You are a knowledgeable assistant that answers questions based strictly on provided context.
+Keep responses {response_style} and {response_length}."""
+
+RAG_USER_TEMPLATE = """Context Information:
+{context}
+
+Number of relevant sources found: {context_count}
+
+Question: {user_query}
+
+Please provide your answer based solely on the context above."""
+
+
+def bench_rag(n_queries: int, dim: int, chat_latency: float, k: int = 4) -> Dict[str, Any]:
+    system_prompt = SystemRolePrompt(
+        RAG_SYSTEM_TEMPLATE, defaults={"response_style": "concise", "response_length": "brief"}
+    )
+    user_prompt = UserRolePrompt(RAG_USER_TEMPLATE)
+    chat = fake_chat_model(latency=chat_latency)
+
+    start = time.perf_counter()
+    loader = TextFileLoader(CORPUS)
+    loader.load()
+    chunks = CharacterTextSplitter().split_texts(loader.documents)
+    db = asyncio.run(VectorDatabase(fake_embedding_model(dim)).abuild_from_list(chunks))
+    ingest_seconds = time.perf_counter() - start
+
+    rng = np.random.default_rng(0)
+    questions = [chunks[i][:120] for i in rng.integers(0, len(chunks), n_queries)]
+    retrieve, format_, generate, total = [], [], [], []
+    for question in questions:
+        t0 = time.perf_counter()
+        contexts = db.search_by_text(question, k)
+        t1 = time.perf_counter()
+        context = "\n\n".join(f"[Source {i}]: {text}" for i, (text, _) in enumerate(contexts, 1))
+        messages = [
+            system_prompt.create_message(),
+            user_prompt.create_message(user_query=question, context=context, context_count=len(contexts)),
+        ]
+        t2 = time.perf_counter()
+        chat.run(messages)
+        t3 = time.perf_counter()
+        retrieve.append(t1 - t0)
+        format_.append(t2 - t1)
+        generate.append(t3 - t2)
+        total.append(t3 - t0)
+
+    # The same questions, all in flight at once through the micro-batching pipeline.
+    concurrent = {}
+    for window in (0.0, 0.005):
+        pipeline = RetrievalAugmentedQAPipeline(chat, db, batch_window=window, max_batch_size=256)
+        start = time.perf_counter()
+        asyncio.run(pipeline.arun_many(questions, k))
+        elapsed = time.perf_counter() - start
+        concurrent[f"window_{window * 1000:g}ms"] = {
+            "queries_per_s": n_queries / elapsed,
+            "embedding_calls": pipeline.batcher.batches,
+        }
+
+    return {
+        "chunks": len(chunks),
+        "dim": dim,
+        "chat_latency_s": chat_latency,
+        "ingest_s": ingest_seconds,
+        "retrieve": latency_stats(retrieve),
+        "format": latency_stats(format_),
+        "generate": latency_stats(generate),
+        "total": latency_stats(total),
+        "concurrent": concurrent,
+    }
+
+
+def environment() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def flatten(results: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]) -> List[str]:
+    """One line per metric present in both runs with its relative change."""
+    old, new = flatten(baseline["results"]), flatten(current["results"])
+    lines = []
+    for name in sorted(old.keys() & new.keys()):
+        if old[name]:
+            change = (new[name] - old[name]) / abs(old[name]) * 100
+            lines.append(f"{name:<70} {old[name]:>14.4g} -> {new[name]:>14.4g} ({change:+.1f}%)")
+    return lines
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    sections = args.only or SECTIONS
+    if "vectordb" in sections:
+        results["vectordb"] = bench_vectordb(args.sizes, args.dim, args.queries)
+    if "sharded" in sections:
+        results["sharded"] = bench_sharded(args.sizes, args.dim, args.queries, args.shards)
+    if "splitter" in sections:
+        results["splitter"] = bench_splitter()
+    if "loader" in sections:
+        results["loader"] = bench_loader(args.files, args.file_bytes)
+    if "prompts" in sections:
+        results["prompts"] = bench_prompts(args.prompts)
+    if "rag" in sections:
+        results["rag"] = bench_rag(args.queries, args.rag_dim, args.chat_latency)
+    return {"environment": environment(), "config": vars(args), "results": results}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", nargs="+", choices=SECTIONS, help="Run only these sections")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1_000, 100_000, 1_000_000])
+    parser.add_argument("--dim", type=int, default=256, help="Vector dimension for the VectorDatabase runs")
+    parser.add_argument(
+        "--shards", nargs="+", type=int, default=sorted({1, 2, 4, os.cpu_count() or 1}),
+        help="Shard (worker process) counts for the sharded search runs",
+    )
+    parser.add_argument("--queries", type=int, default=100, help="Queries per search/RAG benchmark")
+    parser.add_argument("--files", type=int, default=500, help="Files in the synthetic loader tree")
+    parser.add_argument("--file-bytes", type=int, default=32_000, help="Approximate size of each file")
+    parser.add_argument("--prompts", type=int, default=2_000, help="Prompts per formatting benchmark")
+    parser.add_argument("--rag-dim", type=int, default=1536, help="Embedding dimension for end-to-end RAG")
+    parser.add_argument("--chat-latency", type=float, default=0.0, help="Simulated seconds per chat call")
+    parser.add_argument("--output", help="Write results to this JSON file")
+    parser.add_argument("--baseline", help="Compare against a previous JSON result file")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print("\n".join(compare(baseline, report)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,9 @@
+import pytest
+from aimakerspace.openai_utils.embedding import EmbeddingModel
+from aimakerspace.openai_utils.fakes import FakeAsyncOpenAIClient, FakeOpenAIClient
+
+
+@pytest.fixture
+def embedding_model() -> EmbeddingModel:
+    """An embedding model backed by the offline fakes (8-dimensional vectors)."""
+    return EmbeddingModel(client=FakeOpenAIClient(dimensions=8), async_client=FakeAsyncOpenAIClient(dimensions=8))
@@ -0,0 +1,98 @@
+import asyncio
+import pytest
+from aimakerspace.openai_utils.batching import EmbeddingBatchScheduler, pack_batches
+
+
+class _RateLimited(Exception):
+    status_code = 429
+
+
+class _BadRequest(Exception):
+    status_code = 400
+
+
+def _flaky(failures):
+    """An embed_batch that raises each error in ``failures`` once, then echoes lengths."""
+    failures = list(failures)
+
+    def embed_batch(texts):
+        if failures:
+            raise failures.pop(0)
+        return [[len(text)] for text in texts]
+
+    return embed_batch
+
+
+def test_pack_batches_respects_item_and_token_limits():
+    assert pack_batches(["a"] * 5, max_items=2, max_tokens=100) == [range(0, 2), range(2, 4), range(4, 5)]
+    assert pack_batches(["x" * 400, "y", "z"], max_items=10, max_tokens=50) == [range(0, 1), range(1, 3)]
+
+
+def test_retryable_errors_are_retried_with_bounded_backoff(monkeypatch):
+    delays = []
+    monkeypatch.setattr("aimakerspace.openai_utils.batching.time.sleep", delays.append)
+    scheduler = EmbeddingBatchScheduler(max_batch_items=2, max_retries=3, base_delay=0.5, max_delay=1.0)
+
+    results = scheduler.run(["a", "bb", "ccc"], _flaky([_RateLimited(), ConnectionError()]))
+
+    assert results == [[1], [2], [3]] and scheduler.retries == 2
+    assert len(delays) == 2 and all(0 <= delay <= 1.0 for delay in delays)
+    assert all(scheduler.backoff(attempt) <= 1.0 for attempt in range(10))
+
+
+def test_non_retryable_and_exhausted_errors_are_raised(monkeypatch):
+    monkeypatch.setattr("aimakerspace.openai_utils.batching.time.sleep", lambda delay: None)
+    with pytest.raises(_BadRequest):
+        EmbeddingBatchScheduler().run(["a"], _flaky([_BadRequest()]))
+    scheduler = EmbeddingBatchScheduler(max_retries=2)
+    with pytest.raises(_RateLimited):
+        scheduler.run(["a"], _flaky([_RateLimited()] * 3))
+    assert scheduler.retries == 2
+
+
+def test_retries_are_counted_across_threads(monkeypatch):
+    monkeypatch.setattr("aimakerspace.openai_utils.batching.time.sleep", lambda delay: None)
+    scheduler = EmbeddingBatchScheduler(max_concurrency=8, max_batch_items=1)
+    attempts = {}
+
+    def embed_batch(texts):
+        attempts[texts[0]] = attempts.get(texts[0], 0) + 1
+        if attempts[texts[0]] == 1:
+            raise _RateLimited()
+        return [[1.0]]
+
+    texts = [str(i) for i in range(200)]
+    assert scheduler.run(texts, embed_batch) == [[1.0]] * 200
+    assert scheduler.retries == 200
+
+
+def test_a_batch_with_the_wrong_number_of_embeddings_is_rejected():
+    async def short_batch(texts):
+        return [[0.0]] * (len(texts) - 1)
+
+    with pytest.raises(ValueError, match="returned 1 results for 2 texts"):
+        asyncio.run(EmbeddingBatchScheduler().arun(["a", "b"], short_batch))
+    with pytest.raises(ValueError):
+        EmbeddingBatchScheduler().run(["a", "b"], lambda texts: [[0.0]] * 3)
+
+
+def test_async_batches_retry_and_keep_input_order(monkeypatch):
+    delays = []
+
+    async def no_sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr("aimakerspace.openai_utils.batching.asyncio.sleep", no_sleep)
+    failures = {"ccc": 2}
+
+    async def embed_batch(texts):
+        if failures.get(texts[0]):
+            failures[texts[0]] -= 1
+            raise _RateLimited()
+        return [[len(text)] for text in texts]
+
+    scheduler = EmbeddingBatchScheduler(max_concurrency=2, max_batch_items=1, base_delay=0.1, max_delay=0.2)
+    results = asyncio.run(scheduler.arun(["a", "bb", "ccc", "dddd"], embed_batch))
+
+    assert results == [[1], [2], [3], [4]] and scheduler.retries == 2
+    assert len(delays) == 2 and delays[0] <= 0.1 and delays[1] <= 0.2
@@ -0,0 +1,17 @@
+from aimakerspace.bm25 import BM25Index, tokenize
+
+
+def test_tokenize_keeps_hyphenated_identifiers_and_their_parts():
+    assert tokenize("Try GPT-4o on E1234, not gpt-4.") == [
+        "try", "gpt-4o", "gpt", "4o", "on", "e1234", "not", "gpt-4", "gpt", "4"
+    ]
+    assert tokenize("a - b -- c-") == ["a", "b", "c"]
+
+
+def test_hyphenated_identifiers_outrank_their_parts():
+    index = BM25Index()
+    index.add(0, ["we benchmarked gpt-4o today", "gpt models in general", "unrelated text"])
+    rows, _ = index.search("gpt-4o", k=3)
+    assert rows.tolist() == [0, 1]
+    rows, _ = index.search("gpt", k=3)
+    assert sorted(rows.tolist()) == [0, 1]
@@ -0,0 +1,23 @@
+import asyncio
+import numpy as np
+from aimakerspace.ann import IVFIndex
+from aimakerspace.cache import QueryCache
+from aimakerspace.vectordatabase import VectorDatabase
+
+
+def test_building_the_index_invalidates_cached_results(embedding_model):
+    database = VectorDatabase(embedding_model, index=IVFIndex(n_lists=4, nprobe=1), query_cache=QueryCache())
+    texts = [f"document number {i}" for i in range(64)]
+    asyncio.run(database.abuild_from_list(texts))
+    database.index = IVFIndex(n_lists=4, nprobe=1)
+    exact = database.search_by_text("document number 7", 10)
+    version = database.version
+
+    database.build_index()
+
+    assert database.version > version
+    assert database.search_by_text("document number 7", 10) == database.search(
+        np.asarray(embedding_model.get_embedding("document number 7")), 10
+    )
+    assert database.query_cache.stats()["results"]["hits"] == 0
+    assert exact[0][0] == "document number 7"
@@ -0,0 +1,45 @@
+import asyncio
+from aimakerspace import metrics
+from aimakerspace.openai_utils.chatmodel import ChatOpenAI
+from aimakerspace.openai_utils.fakes import FakeAsyncOpenAIClient, FakeOpenAIClient
+
+MESSAGES = [{"role": "user", "content": "Tell me a fairly long story, please."}]
+
+
+def _chat() -> ChatOpenAI:
+    return ChatOpenAI(client=FakeOpenAIClient(), async_client=FakeAsyncOpenAIClient())
+
+
+def _stream_count(collector) -> int:
+    return sum(series["count"] for series in collector.snapshot()["summaries"]["chat.stream.seconds"])
+
+
+def test_a_stream_abandoned_after_one_token_is_recorded_and_closed():
+    with metrics.collecting() as collector:
+        stream = _chat().stream(MESSAGES)
+        for _ in stream:
+            break
+    assert stream.total_time is not None and stream.time_to_first_token is not None
+    assert stream._chunks.gi_frame is None and _stream_count(collector) == 1
+
+
+def test_an_unread_stream_is_released_by_its_context_manager():
+    with metrics.collecting() as collector:
+        with _chat().stream(MESSAGES) as stream:
+            pass
+        stream.close()
+    assert stream.total_time is not None and stream._chunks.gi_frame is None
+    assert _stream_count(collector) == 1
+
+
+def test_an_abandoned_async_stream_is_recorded_and_closed():
+    async def read_one():
+        async with await _chat().astream(MESSAGES) as stream:
+            async for _ in stream:
+                break
+        return stream
+
+    with metrics.collecting() as collector:
+        stream = asyncio.run(read_one())
+    assert stream.total_time is not None and stream._chunks.ag_frame is None
+    assert _stream_count(collector) == 1
@@ -0,0 +1,33 @@
+import asyncio
+import pytest
+from aimakerspace.openai_utils.chatmodel import ChatOpenAI
+from aimakerspace.openai_utils.embedding import EmbeddingModel
+from aimakerspace.openai_utils.fakes import FakeOpenAIServer
+
+pytest.importorskip("openai")
+
+
+@pytest.fixture
+def server():
+    with FakeOpenAIServer(dimensions=8) as server:
+        yield server
+
+
+def test_async_clients_survive_repeated_asyncio_run(server):
+    chat = ChatOpenAI(api_key="test", base_url=server.url)
+    embedding_model = EmbeddingModel(api_key="test", base_url=server.url)
+    messages = [{"role": "user", "content": "hi"}]
+    for _ in range(3):
+        assert asyncio.run(chat.arun(messages))
+        assert len(asyncio.run(embedding_model.async_get_embeddings(["a", "b"]))) == 2
+
+
+def test_async_client_is_reused_within_a_loop(server):
+    embedding_model = EmbeddingModel(api_key="test", base_url=server.url)
+
+    async def clients():
+        return embedding_model.async_client, embedding_model.async_client
+
+    first, second = asyncio.run(clients())
+    assert first is second
+    assert asyncio.run(clients())[0] is not first
@@ -0,0 +1,44 @@
+from aimakerspace.dedup import NearDuplicateDetector
+
+BASE = " ".join(f"word{i}" for i in range(60))
+OTHER = " ".join(f"term{i}" for i in range(60))
+
+
+def test_readding_same_text_keeps_the_answer():
+    detector = NearDuplicateDetector()
+    assert detector.add("a", BASE) is None
+    assert detector.add("b", BASE) == "a"
+    assert detector.add("a", BASE) is None
+    assert detector.add("b", BASE) == "a"
+
+
+def test_changed_alias_is_checked_again():
+    detector = NearDuplicateDetector()
+    detector.add("a", BASE)
+    assert detector.add("b", BASE) == "a"
+    assert detector.add("b", OTHER) is None
+    assert "b" not in detector.alias_of and "a" not in detector.aliases
+    assert len(detector) == 2
+
+
+def test_changed_representative_hands_its_old_content_to_an_alias():
+    detector = NearDuplicateDetector()
+    detector.add("a", BASE)
+    detector.add("b", BASE)
+    detector.add("c", BASE)
+    assert detector.add("a", OTHER) is None
+    assert detector.take_promotions() == {"b": "a"}
+    assert detector.take_promotions() == {}
+    assert detector.alias_of == {"c": "b"}
+    # The old content is now represented by "b"; the changed text is new content.
+    assert detector.add("d", BASE) == "b"
+    assert detector.add("e", OTHER) == "a"
+    assert len(detector) == 2
+
+
+def test_changed_representative_without_aliases_is_forgotten():
+    detector = NearDuplicateDetector()
+    detector.add("a", BASE)
+    assert detector.add("a", OTHER) is None
+    assert detector.add("b", BASE) is None
+    assert detector.take_promotions() == {}
@@ -0,0 +1,28 @@
+import time
+import numpy as np
+from aimakerspace.openai_utils.embedding_cache import SQLiteEmbeddingStore
+
+
+def test_reads_defer_access_times_until_the_next_write(tmp_path):
+    store = SQLiteEmbeddingStore(str(tmp_path / "embeddings.sqlite"), max_bytes=3 * 32)
+    for key in "abc":
+        store.put_many({key: np.full(8, ord(key), dtype=np.float32)})
+        time.sleep(0.01)
+    changes = store._connection.total_changes
+
+    assert set(store.get_many(["a"])) == {"a"}
+    assert store._connection.total_changes == changes
+
+    # The buffered read of "a" is written before eviction, so "b" is now the oldest.
+    store.put_many({"d": np.zeros(8, dtype=np.float32)})
+    assert set(store.get_many(list("abcd"))) == {"a", "c", "d"}
+    store.close()
+
+
+def test_access_times_are_flushed_after_the_interval(tmp_path):
+    store = SQLiteEmbeddingStore(str(tmp_path / "embeddings.sqlite"), access_flush_interval=0)
+    store.put_many({"a": np.ones(8, dtype=np.float32)})
+    changes = store._connection.total_changes
+    store.get_many(["a"])
+    assert store._connection.total_changes == changes + 1
+    store.close()
@@ -0,0 +1,20 @@
+import numpy as np
+import pytest
+from aimakerspace.filters import MetadataIndex
+
+
+@pytest.fixture
+def index() -> MetadataIndex:
+    index = MetadataIndex()
+    index.add(0, [{"tags": ["x", "z"]}, {"tags": "y"}, {"tags": ["z"]}, None])
+    return index
+
+
+def test_list_operand_matches_any_item(index):
+    assert index.mask({"tags": ["x", "y"]}, 4).tolist() == [True, True, False, False]
+    assert np.array_equal(index.mask({"tags": ["x", "y"]}, 4), index.mask({"tags": {"$in": ["x", "y"]}}, 4))
+
+
+def test_unhashable_value_names_the_field(index):
+    with pytest.raises(ValueError, match="tags"):
+        index.mask({"tags": {"$eq": {"nested": 1}}}, 4)
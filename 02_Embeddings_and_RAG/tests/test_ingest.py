@@ -0,0 +1,113 @@
+import asyncio
+import os
+import pytest
+from aimakerspace.dedup import NearDuplicateDetector
+from aimakerspace.ingest import astream_ingest
+from aimakerspace.text_utils import CharacterTextSplitter, TextFileLoader
+from aimakerspace.vectordatabase import VectorDatabase
+
+TEXT = " ".join(f"sentence {i} about founders, markets and hiring." for i in range(120))
+
+
+def ingest(directory, vector_db, **kwargs):
+    loader = TextFileLoader(str(directory))
+    splitter = CharacterTextSplitter(chunk_size=400, chunk_overlap=0)
+    return asyncio.run(astream_ingest(loader, splitter, vector_db, batch_size=4, **kwargs))
+
+
+def test_duplicate_sources_are_recorded_on_the_kept_chunk(tmp_path, embedding_model):
+    corpus = tmp_path / "corpus"
+    corpus.mkdir()
+    for name in ("a.txt", "b.txt"):
+        (corpus / name).write_text(TEXT)
+    vector_db = VectorDatabase(embedding_model)
+    stats = ingest(corpus, vector_db, deduplicator=NearDuplicateDetector())
+    assert stats["duplicates"] == stats["chunks"] == len(vector_db)
+
+    b_source = os.path.join(str(corpus), "b.txt")
+    shared = {"$or": [{"source": b_source}, {"alias_sources": b_source}]}
+    assert len(vector_db.search_by_text("founders", 3, filter=shared)) == 3
+
+    vector_db.save(str(tmp_path / "index"))
+    loaded = VectorDatabase.load(str(tmp_path / "index"), embedding_model)
+    assert len(loaded.search_by_text("founders", 3, filter={"alias_sources": b_source})) == 3
+
+
+class _CountingLoader:
+    def __init__(self, n_documents: int):
+        self.n_documents = n_documents
+        self.read = 0
+
+    def iter_documents(self):
+        for i in range(self.n_documents):
+            self.read += 1
+            yield TEXT, {"source": f"doc-{i}.txt"}
+
+
+class _FailingEmbeddings:
+    async def async_get_embeddings(self, texts):
+        raise RuntimeError("embedding service unavailable")
+
+
+def test_reader_stops_after_an_embedding_failure(embedding_model):
+    vector_db = VectorDatabase(embedding_model)
+    vector_db.embedding_model = _FailingEmbeddings()
+    loader = _CountingLoader(500)
+    splitter = CharacterTextSplitter(chunk_size=400, chunk_overlap=0)
+    with pytest.raises(RuntimeError, match="unavailable"):
+        asyncio.run(astream_ingest(loader, splitter, vector_db, batch_size=4, max_pending_batches=1))
+    assert loader.read < 10
+
+
+def test_reingesting_a_shorter_document_deletes_its_old_chunks(tmp_path, embedding_model):
+    (tmp_path / "a.txt").write_text(TEXT)
+    (tmp_path / "b.txt").write_text(TEXT)
+    vector_db = VectorDatabase(embedding_model)
+    ingest(tmp_path, vector_db)
+    n_chunks = len(vector_db)
+
+    (tmp_path / "a.txt").write_text(TEXT[:500])
+    stats = ingest(tmp_path, vector_db)
+    a_ids = vector_db.ids_matching({"source": str(tmp_path / "a.txt")})
+    assert len(a_ids) == 2 and stats["deleted"] == n_chunks // 2 - 2
+
+    (tmp_path / "b.txt").unlink()
+    ingest(tmp_path, vector_db)
+    assert vector_db.ids_matching({"source": str(tmp_path / "b.txt")})
+    ingest(tmp_path, vector_db, delete_missing_sources=True)
+    assert sorted(vector_db.keys) == sorted(a_ids)
+
+
+def test_reingesting_many_sources_filters_once(tmp_path, embedding_model, monkeypatch):
+    for i in range(40):
+        (tmp_path / f"doc-{i}.txt").write_text(TEXT[: 400 * (1 + i % 3)])
+    vector_db = VectorDatabase(embedding_model)
+    ingest(tmp_path, vector_db)
+    for i in range(40):
+        (tmp_path / f"doc-{i}.txt").write_text(TEXT[:400])
+
+    calls = []
+    ids_matching = vector_db.ids_matching
+    monkeypatch.setattr(vector_db, "ids_matching", lambda filter: calls.append(filter) or ids_matching(filter))
+    stats = ingest(tmp_path, vector_db)
+    assert len(calls) == 1
+    assert stats["deleted"] == sum(i % 3 for i in range(40))
+    assert len(vector_db) == 40
+
+
+def test_duplicates_keep_their_content_when_the_kept_chunk_changes(tmp_path, embedding_model):
+    (tmp_path / "a.txt").write_text(TEXT)
+    (tmp_path / "b.txt").write_text(TEXT)
+    vector_db = VectorDatabase(embedding_model)
+    deduplicator = NearDuplicateDetector()
+    ingest(tmp_path, vector_db, deduplicator=deduplicator)
+    old_text = vector_db.get_text(f"{tmp_path / 'a.txt'}#0")
+
+    (tmp_path / "a.txt").write_text(("A completely rewritten opening paragraph. " * 10)[:400] + TEXT[400:])
+    stats = ingest(tmp_path, vector_db, deduplicator=deduplicator)
+    assert stats["promoted"] == 1
+    b_first = f"{tmp_path / 'b.txt'}#0"
+    assert vector_db.get_text(b_first) == old_text
+    assert vector_db.get_metadata(b_first)["source"] == str(tmp_path / "b.txt")
+    assert b_first in vector_db.ids_matching({"source": str(tmp_path / "b.txt")})
+    assert vector_db.search_by_text(old_text, 1, return_ids=True)[0][0] == b_first
@@ -0,0 +1,60 @@
+import json
+import pytest
+from aimakerspace import metrics
+
+
+def test_disabled_metrics_are_no_ops():
+    assert metrics.get_collector() is None
+    with metrics.span("ignored") as span:
+        span.set("key", "value")
+    metrics.increment("ignored")
+    metrics.observe("ignored", 1.0)
+
+
+def test_collector_aggregates_counters_summaries_and_nested_spans():
+    with metrics.collecting() as collector:
+        metrics.increment("tokens", 3, model="m")
+        metrics.increment("tokens", 4, model="m")
+        for value in (1.0, 5.0, 3.0):
+            metrics.observe("batch", value)
+        with metrics.span("outer"):
+            with pytest.raises(KeyError):
+                with metrics.span("inner", step=1):
+                    raise KeyError("boom")
+    assert metrics.get_collector() is None
+
+    snapshot = collector.snapshot()
+    assert snapshot["counters"]["tokens"] == [{"labels": {"model": "m"}, "value": 7}]
+    assert snapshot["summaries"]["batch"] == [
+        {"labels": {}, "count": 3, "sum": 9.0, "min": 1.0, "max": 5.0, "mean": 3.0}
+    ]
+    inner, outer = snapshot["spans"]
+    assert inner["parent"] == "outer" and outer["parent"] is None
+    assert inner["labels"] == {"step": 1, "error": "KeyError"}
+    assert snapshot["summaries"]["inner.seconds"][0]["labels"] == {"error": "KeyError", "step": "1"}
+
+
+def test_json_export_omits_spans_unless_asked():
+    with metrics.collecting() as collector:
+        with metrics.span("work"):
+            metrics.increment("items")
+    exported = json.loads(collector.to_json())
+    assert set(exported) == {"counters", "summaries"}
+    assert len(json.loads(collector.to_json(include_spans=True))["spans"]) == 1
+
+
+def test_prometheus_export_uses_valid_names_and_escaped_labels():
+    collector = metrics.InMemoryCollector(prefix="app")
+    collector.increment("cache.hits", 2, {"source": 'say "hi"\n'})
+    collector.observe("search.seconds", 0.5, {})
+    collector.observe("search.seconds", 1.5, {})
+
+    assert collector.to_prometheus().splitlines() == [
+        "# TYPE app_cache_hits_total counter",
+        'app_cache_hits_total{source="say \\"hi\\"\\n"} 2',
+        "# TYPE app_search_seconds summary",
+        "app_search_seconds_count 2",
+        "app_search_seconds_sum 2.0",
+        "# TYPE app_search_seconds_max gauge",
+        "app_search_seconds_max 1.5",
+    ]
@@ -0,0 +1,35 @@
+import pytest
+from aimakerspace.openai_utils.prompts import BasePrompt, ConditionalPrompt, PromptValidationError
+
+
+def test_base_prompt_format_many_matches_format_prompt():
+    prompt = BasePrompt("Context: {context}\nQuestion: {question} ({context})", defaults={"question": "why?"})
+    contexts = [{"context": "a"}, {"context": "b", "question": "how?"}, {}]
+
+    assert prompt.format_many(contexts) == [prompt.format_prompt(**context) for context in contexts]
+    assert prompt.format_many(contexts)[1] == "Context: b\nQuestion: how? (b)"
+    assert prompt.format_many([]) == []
+    assert prompt.format_many(iter(contexts[:1])) == ["Context: a\nQuestion: why? (a)"]
+
+
+def test_strict_base_prompt_rejects_a_context_missing_a_variable():
+    prompt = BasePrompt("{context} {question}", strict=True, defaults={"question": "q"})
+    assert prompt.format_many([{"context": "c"}]) == ["c q"]
+    with pytest.raises(PromptValidationError, match="context"):
+        prompt.format_many([{"context": "c"}, {"question": "only"}])
+
+
+def test_conditional_prompt_format_many_evaluates_conditions_per_context():
+    prompt = ConditionalPrompt(
+        "{if score > 5}High {name}{else}Low {name}{/if}: {note}", defaults={"note": "n/a"}
+    )
+    contexts = [{"score": 9, "name": "a"}, {"score": 1, "name": "b", "note": "retry"}, {"name": "c"}]
+
+    assert prompt.format_many(contexts) == ["High a: n/a", "Low b: retry", "Low c: n/a"]
+    assert prompt.format_many(contexts) == [prompt.format_prompt(**context) for context in contexts]
+
+
+def test_substituted_values_are_not_parsed_as_template_syntax():
+    prompt = ConditionalPrompt("{if show}{text}{/if}")
+    assert prompt.format_many([{"show": True, "text": "{if x}{other}{/if}"}]) == ["{if x}{other}{/if}"]
+    assert BasePrompt("{text}").format_many([{"text": "{braces}"}]) == ["{braces}"]
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+from aimakerspace.ann import recall_at_k
+from aimakerspace.quantization import ProductQuantizer, ScalarQuantizer, TruncatedQuantizer, quantizer_from_config
+from aimakerspace.vectordatabase import VectorDatabase
+
+
+@pytest.fixture
+def vectors():
+    vectors = np.random.default_rng(0).standard_normal((500, 16)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_scalar_codes_are_within_half_a_step(vectors):
+    quantizer = ScalarQuantizer()
+    quantizer.train(vectors)
+    codes = quantizer.encode(vectors)
+
+    assert codes.dtype == np.int8 and codes.shape == vectors.shape
+    assert np.all(np.abs(quantizer.decode(codes) - vectors) <= quantizer.scale / 2 + 1e-6)
+    np.testing.assert_allclose(quantizer.scores(vectors[0], codes), quantizer.decode(codes) @ vectors[0], atol=1e-4)
+
+
+def test_product_quantizer_scores_match_its_reconstruction(vectors):
+    quantizer = ProductQuantizer(n_subvectors=4, n_centroids=16, n_iter=5)
+    quantizer.train(vectors)
+    codes = quantizer.encode(vectors)
+
+    assert codes.dtype == np.uint8 and codes.shape == (500, 4) and quantizer.code_size(16) == 4
+    np.testing.assert_allclose(
+        quantizer.scores(vectors[0], codes, chunk_size=64), quantizer.decode(codes) @ vectors[0], atol=1e-4
+    )
+    with pytest.raises(ValueError, match="not divisible"):
+        quantizer.encode(vectors[:, :15])
+    with pytest.raises(ValueError):
+        ProductQuantizer(n_centroids=257)
+
+
+def test_truncated_codes_are_normalized_prefixes(vectors):
+    quantizer = TruncatedQuantizer(dim=4, dtype="float16")
+    codes = quantizer.encode(vectors)
+
+    assert codes.dtype == np.float16 and quantizer.input_dim == 16 and quantizer.code_size(16) == 8
+    np.testing.assert_allclose(np.linalg.norm(codes.astype(np.float32), axis=1), 1.0, atol=1e-3)
+    assert quantizer.decode(codes).shape == vectors.shape
+    with pytest.raises(ValueError):
+        TruncatedQuantizer(dtype="int8")
+
+
+@pytest.mark.parametrize(
+    "quantizer", [ScalarQuantizer(), ProductQuantizer(n_subvectors=4, n_centroids=8), TruncatedQuantizer(dim=8)]
+)
+def test_quantizers_rebuild_from_their_config(quantizer):
+    rebuilt = quantizer_from_config(quantizer.config())
+    assert type(rebuilt) is type(quantizer) and rebuilt.config() == quantizer.config()
+
+
+def test_unknown_quantizer_kind_is_rejected():
+    with pytest.raises(ValueError, match="Unknown quantizer kind"):
+        quantizer_from_config({"kind": "binary"})
+
+
+@pytest.mark.parametrize("quantizer", [ScalarQuantizer(), ProductQuantizer(n_subvectors=4, n_centroids=16)])
+def test_rescored_quantized_search_recalls_the_exact_neighbours(embedding_model, vectors, quantizer):
+    database = VectorDatabase(embedding_model, quantizer=quantizer, rescore_factor=8)
+    database.upsert([str(i) for i in range(500)], vectors)
+    database.train_quantizer()
+
+    recalls = []
+    for query in vectors[:20]:
+        exact = [key for key, _ in database.search(query, 5, exact=True, return_ids=True)]
+        approximate = [key for key, _ in database.search(query, 5, return_ids=True)]
+        assert approximate[0] == exact[0]
+        recalls.append(recall_at_k(approximate, exact))
+    assert np.mean(recalls) >= 0.9
@@ -0,0 +1,71 @@
+import asyncio
+import pytest
+from aimakerspace.rag import QueryBatcher
+from aimakerspace.vectordatabase import VectorDatabase
+
+TEXTS = ["cats purr softly", "dogs bark loudly", "birds sing at dawn", "fish swim in schools"]
+
+
+@pytest.fixture
+def database(embedding_model):
+    database = VectorDatabase(embedding_model)
+    asyncio.run(database.abuild_from_list(TEXTS))
+    return database
+
+
+def _count_embedding_calls(database, monkeypatch):
+    calls = []
+    embed = database.embedding_model.async_get_embeddings
+
+    async def counting(texts):
+        calls.append(list(texts))
+        return await embed(texts)
+
+    monkeypatch.setattr(database.embedding_model, "async_get_embeddings", counting)
+    return calls
+
+
+def test_concurrent_queries_share_one_batch(database, monkeypatch):
+    calls = _count_embedding_calls(database, monkeypatch)
+    batcher = QueryBatcher(database, batch_window=0.05)
+
+    async def ask():
+        return await asyncio.gather(*(batcher.search(text, k) for k, text in enumerate(TEXTS, start=1)))
+
+    results = asyncio.run(ask())
+    assert calls == [TEXTS] and batcher.batches == 1 and batcher.mean_batch_size == 4
+    for k, (text, contexts) in enumerate(zip(TEXTS, results), start=1):
+        expected = database.search_by_text(text, k)
+        assert [label for label, _ in contexts] == [label for label, _ in expected]
+        assert [score for _, score in contexts] == pytest.approx([score for _, score in expected], abs=1e-5)
+
+
+def test_a_full_batch_is_sent_without_waiting(database, monkeypatch):
+    calls = _count_embedding_calls(database, monkeypatch)
+    batcher = QueryBatcher(database, batch_window=60.0, max_batch_size=2)
+
+    async def ask():
+        return await asyncio.wait_for(asyncio.gather(*(batcher.search(text, 1) for text in TEXTS)), timeout=5)
+
+    results = asyncio.run(ask())
+    assert [len(call) for call in calls] == [2, 2] and [contexts[0][0] for contexts in results] == TEXTS
+
+
+def test_a_failed_batch_fails_every_query_in_it(database, monkeypatch):
+    async def failing(texts):
+        raise RuntimeError("embedding service down")
+
+    monkeypatch.setattr(database.embedding_model, "async_get_embeddings", failing)
+    batcher = QueryBatcher(database)
+
+    async def ask():
+        return await asyncio.gather(*(batcher.search(text, 1) for text in TEXTS[:3]), return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in asyncio.run(ask()))
+
+
+def test_invalid_settings_are_rejected(database):
+    with pytest.raises(ValueError):
+        QueryBatcher(database, batch_window=-1)
+    with pytest.raises(ValueError):
+        QueryBatcher(database, max_batch_size=0)
@@ -0,0 +1,59 @@
+import asyncio
+import json
+import threading
+from aimakerspace.cache import QueryCache
+from aimakerspace.retrieval_server import RetrievalServer
+from aimakerspace.snapshots import SnapshotVectorDatabase
+from aimakerspace.vectordatabase import VectorDatabase
+
+
+def test_search_by_text_uses_the_query_cache(embedding_model):
+    database = VectorDatabase(embedding_model, query_cache=QueryCache())
+    asyncio.run(database.abuild_from_list(["cats purr", "dogs bark", "birds sing"]))
+    server = RetrievalServer(database)
+    request = json.dumps({"id": 1, "method": "search_by_text", "params": {"query_text": "cats", "k": 2}})
+
+    async def ask_twice():
+        return [await server._respond(request.encode("utf-8")) for _ in range(2)]
+
+    first, second = asyncio.run(ask_twice())
+    assert first["result"] == second["result"] == [list(pair) for pair in database.search_by_text("cats", 2)]
+    stats = database.query_cache.stats()
+    assert stats["embeddings"]["misses"] == 1 and stats["results"]["hits"] == 2
+
+
+def test_ping_serves_a_snapshot_database(embedding_model):
+    database = SnapshotVectorDatabase(VectorDatabase(embedding_model, query_cache=QueryCache()))
+    asyncio.run(database.abuild_from_list(["cats purr", "dogs bark"]))
+    response = asyncio.run(RetrievalServer(database)._respond(b'{"id": 1, "method": "ping"}'))
+    assert response["result"]["size"] == 2 and response["result"]["query_cache"]["results"]["hits"] == 0
+
+
+def test_scans_run_off_the_event_loop_thread(embedding_model, monkeypatch):
+    database = VectorDatabase(embedding_model)
+    asyncio.run(database.abuild_from_list(["cats purr", "dogs bark"]))
+    server = RetrievalServer(database)
+    threads = []
+    for name in ("search", "lexical_search", "search_many", "_hybrid"):
+        method = getattr(database, name)
+
+        def recording(*args, _method=method, **kwargs):
+            threads.append(threading.get_ident())
+            return _method(*args, **kwargs)
+
+        monkeypatch.setattr(database, name, recording)
+
+    async def ask():
+        requests = [
+            {"method": "search", "params": {"query_vector": [1.0] * 8, "k": 1}},
+            {"method": "search_by_text", "params": {"query_text": "cats", "k": 1}},
+            {"method": "search_by_texts", "params": {"query_texts": ["cats"], "k": 1}},
+            {"method": "lexical_search", "params": {"query_text": "cats", "k": 1}},
+            {"method": "hybrid_search", "params": {"query_text": "cats", "k": 1}},
+        ]
+        responses = [await server._respond(json.dumps(request).encode("utf-8")) for request in requests]
+        return threading.get_ident(), responses
+
+    loop_thread, responses = asyncio.run(ask())
+    assert all("result" in response for response in responses)
+    assert len(threads) == 5 and loop_thread not in threads
@@ -0,0 +1,53 @@
+import time
+import numpy as np
+from aimakerspace.semantic_cache import SemanticCache
+from aimakerspace.vectordatabase import VectorDatabase
+
+
+def _vector(*components) -> np.ndarray:
+    vector = np.zeros(8, dtype=np.float32)
+    vector[: len(components)] = components
+    return vector
+
+
+def test_an_expired_nearest_entry_falls_back_to_a_live_neighbour(embedding_model):
+    cache = SemanticCache(embedding_model, threshold=0.9, ttl=0.05)
+    cache.store("closest", "stale answer", query_vector=_vector(1.0))
+    time.sleep(0.1)
+    cache.store("neighbour", "fresh answer", query_vector=_vector(1.0, 0.1))
+
+    assert cache.lookup("q", _vector(1.0)) == "fresh answer"
+    assert cache.stats()["expirations"] == 1 and len(cache.queries) == 1
+
+
+def test_answers_expire_after_the_ttl(embedding_model):
+    cache = SemanticCache(embedding_model, threshold=0.9, ttl=0.05)
+    cache.store("q", "answer", query_vector=_vector(1.0))
+    assert cache.lookup("q", _vector(1.0)) == "answer"
+    time.sleep(0.1)
+    assert cache.lookup("q", _vector(1.0)) is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_the_least_recently_used_answer_is_evicted(embedding_model):
+    cache = SemanticCache(embedding_model, threshold=0.99, max_entries=2)
+    cache.store("a", "A", query_vector=_vector(1.0))
+    cache.store("b", "B", query_vector=_vector(0.0, 1.0))
+    assert cache.lookup("a", _vector(1.0)) == "A"
+    cache.store("c", "C", query_vector=_vector(0.0, 0.0, 1.0))
+
+    assert cache.lookup("b", _vector(0.0, 1.0)) is None
+    assert cache.lookup("a", _vector(1.0)) == "A" and cache.lookup("c", _vector(0.0, 0.0, 1.0)) == "C"
+    assert cache.stats()["evictions"] == 1 and len(cache.queries) == 2
+
+
+def test_a_document_index_change_drops_every_answer(embedding_model):
+    documents = VectorDatabase(embedding_model)
+    cache = SemanticCache(embedding_model, threshold=0.9, document_index=documents)
+    cache.store("q", "answer", query_vector=_vector(1.0))
+    assert cache.lookup("q", _vector(1.0)) == "answer"
+
+    documents.upsert(["doc"], _vector(1.0)[None, :])
+
+    assert cache.lookup("q", _vector(1.0)) is None
+    assert len(cache) == 0 and cache.stats()["invalidations"] == 1
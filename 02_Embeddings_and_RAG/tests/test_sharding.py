@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+from aimakerspace.sharding import ShardedVectorDatabase
+from aimakerspace.vectordatabase import VectorDatabase
+
+
+@pytest.fixture
+def database(embedding_model):
+    rng = np.random.default_rng(0)
+    database = VectorDatabase(embedding_model)
+    database.upsert(
+        [f"doc-{i}" for i in range(300)],
+        rng.standard_normal((300, 8)).astype(np.float32),
+        [f"text {i}" for i in range(300)],
+        [{"group": i % 3, "late": i >= 250} for i in range(300)],
+    )
+    database.delete([f"doc-{i}" for i in range(0, 300, 7)])
+    return database
+
+
+def _same(sharded, exact):
+    assert [key for key, _ in sharded] == [key for key, _ in exact]
+    np.testing.assert_allclose([score for _, score in sharded], [score for _, score in exact], atol=1e-5)
+
+
+def test_sharded_search_matches_exact_search(database):
+    queries = np.random.default_rng(1).standard_normal((12, 8)).astype(np.float32)
+    with ShardedVectorDatabase(database, n_shards=3) as sharded:
+        assert len(sharded) == len(database)
+        results = sharded.search_many(queries, 10, return_ids=True, query_batch_size=5)
+        for query, result in zip(queries, results):
+            _same(result, database.search(query, 10, exact=True, return_ids=True))
+        for filter in ({"group": 1}, {"late": True}, {"group": {"$in": [0, 2]}, "late": False}):
+            _same(
+                sharded.search(queries[0], 10, return_ids=True, filter=filter),
+                database.search(queries[0], 10, exact=True, return_ids=True, filter=filter),
+            )
+        # Only the last shard holds "late" rows; empty shards are skipped.
+        assert sharded.search(queries[0], 5, filter={"group": 99}) == []
+        assert len(sharded.search(queries[0], 1000)) == len(database)
+        _same(sharded.search(queries[0], 3), database.search(queries[0], 3, exact=True))
+
+
+def test_more_shards_than_rows(embedding_model):
+    database = VectorDatabase(embedding_model)
+    database.upsert(["a", "b"], np.eye(2, 8, dtype=np.float32))
+    with ShardedVectorDatabase(database, n_shards=4) as sharded:
+        assert sharded.search(np.eye(8)[1], 5, return_ids=True)[0][0] == "b"
+        assert sharded.search(np.eye(8)[1], 0) == []
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from aimakerspace.ann import IVFIndex
+from aimakerspace.snapshots import SnapshotVectorDatabase
+from aimakerspace.vectordatabase import VectorDatabase
+
+
+def test_filtered_search_does_not_modify_a_published_version(embedding_model):
+    database = SnapshotVectorDatabase(VectorDatabase(embedding_model))
+    database.upsert(["a", "b"], np.eye(2, 8, dtype=np.float32), metadatas=[{"tag": "x"}, {"tag": "y"}])
+    snapshot = database.snapshot()
+    posting_arrays = dict(snapshot.metadata_index._posting_arrays)
+
+    assert database.search(np.eye(8)[0], 2, return_ids=True, filter={"tag": "x"})[0][0] == "a"
+    assert database.search(np.eye(8)[0], 2, filter={"tag": {"$in": ["y", "missing"]}})
+    assert snapshot.metadata_index._posting_arrays == posting_arrays
+    assert database.lexical_search("a", 1) and snapshot.lexical_index.n_rows == 2
+
+
+def test_readers_keep_their_version_while_a_writer_publishes(embedding_model):
+    database = SnapshotVectorDatabase(VectorDatabase(embedding_model))
+    database.upsert(["a"], np.ones((1, 8), dtype=np.float32))
+    before = database.snapshot()
+    version = database.upsert(["b"], np.ones((1, 8), dtype=np.float32))
+    assert version > before.version and "b" in database and "b" not in before
+
+
+def test_writes_to_a_fork_leave_the_shared_indexes_of_its_parent_alone(embedding_model):
+    vectors = np.random.default_rng(0).standard_normal((64, 8)).astype(np.float32)
+    base = VectorDatabase(embedding_model, index=IVFIndex(n_lists=4, nprobe=4))
+    base.upsert(
+        [f"doc-{i}" for i in range(64)],
+        vectors,
+        [f"apple {i}" for i in range(64)],
+        [{"tag": "x", "year": 2000 + i % 4} for i in range(64)],
+    )
+    base.build_index()
+    database = SnapshotVectorDatabase(base)
+    parent = database.snapshot()
+
+    def observe(snapshot):
+        return (
+            snapshot.search(vectors[0], 5, return_ids=True, filter={"tag": "x", "year": {"$gte": 2002}}),
+            snapshot.lexical_search("apple", 100),
+            snapshot.index._assignments[:64].tolist(),
+        )
+
+    seen = observe(parent)
+    with pytest.raises(RuntimeError):
+        with database.writer() as draft:
+            draft.upsert(["doc-0", "new"], vectors[:2], ["apple pie", "pie"], [{"tag": "pie", "year": 1999}] * 2)
+            raise RuntimeError("discard the draft")
+    database.upsert(["doc-1", "other"], vectors[:2], ["apple tart", "apple"], [{"tag": "x", "year": 2003}] * 2)
+    assert not database.search(vectors[0], 5, filter={"tag": "pie"}) and not database.lexical_search("pie", 5)
+    assert not database.search(vectors[0], 5, filter={"year": {"$lt": 2000}})
+    database.compact()
+
+    assert observe(parent) == seen
+    assert not database.search(vectors[0], 5, filter={"tag": "pie"}) and not database.lexical_search("pie", 5)
+    assert database.snapshot() is not parent and "other" in database and "new" not in database
@@ -0,0 +1,57 @@
+import pytest
+from aimakerspace.text_utils import CharacterTextSplitter, RecursiveTextSplitter
+
+PARAGRAPHS = "\n\n".join(
+    " ".join(f"Sentence {p}.{s} has a few words in it." for s in range(6)) for p in range(8)
+)
+
+
+def _check_cover(text, spans, splitter):
+    """Spans start at 0, end at the end, leave no gaps and respect the size limits."""
+    assert spans[0][0] == 0 and spans[-1][1] == len(text)
+    for (start, end), (next_start, next_end) in zip(spans, spans[1:]):
+        assert start < next_start <= end and end - next_start <= splitter.chunk_overlap
+    assert all(end - start <= splitter.chunk_size for start, end in spans)
+
+
+def test_character_splitter_steps_by_size_minus_overlap():
+    splitter = CharacterTextSplitter(chunk_size=10, chunk_overlap=3)
+    text = "abcdefghijklmnopqrstuvwxyz"
+    spans = list(splitter.iter_spans(text))
+    assert spans == [(0, 10), (7, 17), (14, 24), (21, 26)]
+    assert splitter.split(text) == [text[start:end] for start, end in spans]
+    with pytest.raises(AssertionError):
+        CharacterTextSplitter(chunk_size=5, chunk_overlap=5)
+
+
+@pytest.mark.parametrize("chunk_overlap", [0, 40])
+def test_recursive_splitter_prefers_paragraph_breaks(chunk_overlap):
+    splitter = RecursiveTextSplitter(chunk_size=300, chunk_overlap=chunk_overlap)
+    spans = list(splitter.iter_spans(PARAGRAPHS))
+    _check_cover(PARAGRAPHS, spans, splitter)
+    # Each paragraph is ~250 characters, so every chunk but the last ends on a paragraph break.
+    assert all(PARAGRAPHS[:end].endswith("\n\n") for _, end in spans[:-1])
+    assert all(end - start >= splitter.min_chunk_size for start, end in spans[:-1])
+
+
+def test_recursive_overlap_starts_on_a_word():
+    text = " ".join(f"word{i}" for i in range(200))
+    splitter = RecursiveTextSplitter(chunk_size=100, chunk_overlap=30)
+    spans = list(splitter.iter_spans(text))
+    _check_cover(text, spans, splitter)
+    assert all(text[start - 1] == " " for start, _ in spans[1:])
+    assert all(text[end - 1] == " " for _, end in spans[:-1])
+
+
+def test_recursive_splitter_cuts_text_without_boundaries_at_the_size_limit():
+    text = "x" * 250
+    splitter = RecursiveTextSplitter(chunk_size=100, chunk_overlap=10)
+    assert list(splitter.iter_spans(text)) == [(0, 100), (90, 190), (180, 250)]
+
+
+def test_document_spans_match_the_split_strings():
+    texts = [PARAGRAPHS, "", "short text"]
+    splitter = RecursiveTextSplitter(chunk_size=200, chunk_overlap=20)
+    chunks = [texts[doc_id][start:end] for doc_id, start, end in splitter.iter_document_spans(texts)]
+    assert chunks == splitter.split_texts(texts)
+    assert chunks[-1] == "short text"
@@ -0,0 +1,74 @@
+import datetime
+import os
+import numpy as np
+import pytest
+from aimakerspace.ann import IVFIndex
+from aimakerspace.quantization import ProductQuantizer
+from aimakerspace.vectordatabase import VectorDatabase
+
+
+def test_date_metadata_round_trips_through_save_and_load(tmp_path, embedding_model):
+    database = VectorDatabase(embedding_model)
+    published = [datetime.date(2023, 1, 1), datetime.date(2024, 6, 1), datetime.datetime(2025, 3, 1, 12, 30)]
+    ids = ["a", "b", "c"]
+    database.upsert(ids, np.eye(3, 8, dtype=np.float32), metadatas=[{"published": day} for day in published])
+    database.save(str(tmp_path))
+
+    loaded = VectorDatabase.load(str(tmp_path), embedding_model)
+    assert [loaded.get_metadata(key)["published"] for key in ids] == published
+    recent = loaded.search(np.ones(8), 3, return_ids=True, filter={"published": {"$gte": datetime.date(2024, 1, 1)}})
+    assert sorted(key for key, _ in recent) == ["b", "c"]
+
+
+def test_save_replaces_an_existing_index(tmp_path, embedding_model):
+    path = str(tmp_path / "index")
+    first = VectorDatabase(embedding_model)
+    first.upsert(["a", "b", "c"], np.eye(3, 8, dtype=np.float32))
+    first.save(path)
+    mapped = VectorDatabase.load(path, embedding_model)
+
+    second = VectorDatabase(embedding_model)
+    second.upsert(["x"], np.ones((1, 8), dtype=np.float32))
+    second.save(path)
+    assert VectorDatabase.load(path, embedding_model).keys == ["x"]
+    assert sorted(os.listdir(tmp_path)) == ["index"]
+    # A database mapped from the previous files still reads them.
+    assert mapped.search(np.eye(8)[0], 1, return_ids=True)[0][0] == "a"
+
+
+def test_load_rejects_a_dimension_mismatch(tmp_path, embedding_model):
+    database = VectorDatabase(embedding_model)
+    database.upsert(["a"], np.ones((1, 8), dtype=np.float32))
+    database.save(str(tmp_path))
+    embedding_model.dimensions = 4
+    with pytest.raises(ValueError, match="8-dimensional"):
+        VectorDatabase.load(str(tmp_path), embedding_model)
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+@pytest.mark.parametrize("keep_full_vectors", [True, False])
+def test_quantized_and_indexed_databases_round_trip(tmp_path, embedding_model, mmap, keep_full_vectors):
+    vectors = np.random.default_rng(0).standard_normal((200, 8)).astype(np.float32)
+    database = VectorDatabase(
+        embedding_model,
+        index=IVFIndex(n_lists=8, nprobe=2),
+        quantizer=ProductQuantizer(n_subvectors=4, n_centroids=16, n_iter=5),
+        keep_full_vectors=keep_full_vectors,
+    )
+    database.upsert([str(i) for i in range(200)], vectors, metadatas=[{"even": i % 2 == 0} for i in range(200)])
+    database.delete(["0", "1"])
+    database.build_index()
+    database.train_quantizer()
+    database.save(str(tmp_path))
+
+    loaded = VectorDatabase.load(str(tmp_path), embedding_model, mmap=mmap)
+    assert loaded.is_quantized and loaded.index.is_trained and loaded.keys == database.keys
+    assert loaded.quantizer.config() == database.quantizer.config()
+    np.testing.assert_array_equal(loaded.quantizer.codebooks, database.quantizer.codebooks)
+    for query in vectors[:5]:
+        for filter in (None, {"even": True}):
+            assert loaded.search(query, 5, return_ids=True, filter=filter) == database.search(
+                query, 5, return_ids=True, filter=filter
+            )
+    loaded.upsert(["new"], vectors[:1])
+    assert loaded.search(vectors[0], 1, return_ids=True)[0][0] == "new"